@@ -0,0 +1,186 @@
+import base64
+import threading
+from datetime import date
+
+# Attendance marks, one bit per student per period per day.
+#
+# Each student has two bitmaps (bytearrays): one with a bit set for every period they were
+# present, one for every period they were absent. A period with neither bit set was not marked.
+# Each day takes ceil(periods / 8) bytes of each bitmap, so with 8 periods a student's year is
+# 2 x 366 bytes of marks, under 1 KB with the bytearrays' own overhead. Days are counted from
+# the first day marked, and bitmaps grow as later days are marked. The marked days may span at
+# most MAX_DAYS, so a mistyped year is refused rather than padding every bitmap by decades.
+#
+# Rates are counted with popcounts over the bytes of a date range, so a student's rate over a
+# term reads 2 x ~100 bytes and a class's rate is the sum over its students.
+
+DEFAULT_PERIODS = 8
+DEFAULT_THRESHOLD = 75.0  # Percent attendance below which a student is reported
+GROWTH_DAYS = 32
+MAX_DAYS = 2 * 366  # Longest span from the first to the last day marked
+
+_HAS_BIT_COUNT = hasattr(int, "bit_count")
+
+
+def popcount(data):
+    value = int.from_bytes(data, "little")
+    return value.bit_count() if _HAS_BIT_COUNT else bin(value).count("1")
+
+
+def parse_date(value):
+    # Accepts a date or a YYYY-MM-DD string; raises ValueError for anything else
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip())
+
+
+class AttendanceBook:
+    def __init__(self, periods=DEFAULT_PERIODS):
+        self.periods = periods
+        self.day_bytes = (periods + 7) // 8
+        # Every period of a day set, e.g. b"\xff" for 8 periods or b"\xff\x03" for 10
+        self.full_day = ((1 << periods) - 1).to_bytes(self.day_bytes, "little")
+        self.start = None  # Ordinal of the first day the bitmaps cover
+        self.days = 0  # Number of days the bitmaps cover
+        self.present = {}  # Dict with entry_number as key and bitmap of periods present as value
+        self.absent = {}  # Dict with entry_number as key and bitmap of periods absent as value
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.present)
+
+    def _day(self, day):
+        # Index of day in the bitmaps, making room for it if needed. Raises ValueError, before
+        # changing anything, if the marked days would then span more than MAX_DAYS.
+        ordinal = parse_date(day).toordinal()
+        if self.start is not None and max(self.start + self.days - 1, ordinal) - min(self.start, ordinal) >= MAX_DAYS:
+            raise ValueError(f"Date is more than {MAX_DAYS} days from the other attendance marks")
+        if self.start is None:
+            self.start = ordinal
+        elif ordinal < self.start:
+            # Marks for a day before the first one: shift every bitmap later. This is rare (a
+            # late correction at the start of term), so bitmaps are not kept with spare room.
+            padding = bytes((self.start - ordinal) * self.day_bytes)
+            for bitmaps in (self.present, self.absent):
+                for entry_number, bitmap in bitmaps.items():
+                    bitmaps[entry_number] = bytearray(padding) + bitmap
+            self.days += self.start - ordinal
+            self.start = ordinal
+        index = ordinal - self.start
+        self.days = max(self.days, index + 1)
+        return index
+
+    def _bitmap(self, bitmaps, entry_number, size):
+        # Bitmaps grow GROWTH_DAYS at a time into a new bytearray of exactly that size, since
+        # bytearray.extend would keep an eighth more in reserve
+        bitmap = bitmaps.get(entry_number)
+        if bitmap is None or len(bitmap) < size:
+            chunk = GROWTH_DAYS * self.day_bytes
+            size = -(-size // chunk) * chunk
+            bitmap = bitmaps[entry_number] = bytearray(size) if bitmap is None else bitmap + bytes(size - len(bitmap))
+        return bitmap
+
+    def mark(self, entry_numbers, day, period=None, absent=()):
+        # Marks the students at the period (0-based), or at every period of the day when period
+        # is None: those in absent as absent, the others as present. One call marks a whole class.
+        # Raises ValueError for a day too far from the others (see _day); nothing is marked then.
+        absent = set(absent)
+        with self.lock:
+            index = self._day(day)
+            size = (index + 1) * self.day_bytes
+            if period is None:
+                start, stop = index * self.day_bytes, size
+                full, empty = self.full_day, bytes(self.day_bytes)
+                for entry_number in entry_numbers:
+                    marked, cleared = (self.absent, self.present) if entry_number in absent else (self.present,
+                                                                                                 self.absent)
+                    self._bitmap(marked, entry_number, size)[start:stop] = full
+                    self._bitmap(cleared, entry_number, size)[start:stop] = empty
+            else:
+                offset = index * self.day_bytes + period // 8
+                bit = 1 << period % 8
+                for entry_number in entry_numbers:
+                    marked, cleared = (self.absent, self.present) if entry_number in absent else (self.present,
+                                                                                                 self.absent)
+                    self._bitmap(marked, entry_number, size)[offset] |= bit
+                    self._bitmap(cleared, entry_number, size)[offset] &= ~bit
+
+    def remove_student(self, entry_number):
+        with self.lock:
+            self.present.pop(entry_number, None)
+            self.absent.pop(entry_number, None)
+
+    def _range(self, first, last):
+        # Byte range of the days from first to last, inclusive (default: every day marked)
+        if self.start is None:
+            return 0, 0
+        start = 0 if first is None else max(0, parse_date(first).toordinal() - self.start)
+        stop = self.days if last is None else min(self.days, parse_date(last).toordinal() - self.start + 1)
+        return start * self.day_bytes, max(start, stop) * self.day_bytes
+
+    # Queries. first and last are dates (or YYYY-MM-DD strings), inclusive; None means no limit.
+
+    def counts(self, entry_number, first=None, last=None):
+        # Returns (periods present, periods marked) for one student
+        with self.lock:
+            start, stop = self._range(first, last)
+            present = popcount(self.present.get(entry_number, b"")[start:stop])
+            return present, present + popcount(self.absent.get(entry_number, b"")[start:stop])
+
+    def totals(self, entry_numbers, first=None, last=None):
+        # Returns (periods present, periods marked) summed over the students
+        with self.lock:
+            start, stop = self._range(first, last)
+            present_bitmaps, absent_bitmaps = self.present, self.absent
+            present = marked = 0
+            for entry_number in entry_numbers:
+                bitmap = present_bitmaps.get(entry_number)
+                if bitmap is not None:
+                    count = popcount(bitmap[start:stop])
+                    present += count
+                    marked += count + popcount(absent_bitmaps[entry_number][start:stop])
+            return present, marked
+
+    def below(self, entry_numbers, threshold=DEFAULT_THRESHOLD, first=None, last=None):
+        # Returns [(entry_number, rate)] for the students marked at least once whose attendance
+        # rate is below threshold percent, lowest first
+        with self.lock:
+            start, stop = self._range(first, last)
+            present_bitmaps, absent_bitmaps = self.present, self.absent
+            results = []
+            for entry_number in entry_numbers:
+                bitmap = present_bitmaps.get(entry_number)
+                if bitmap is None:
+                    continue
+                present = popcount(bitmap[start:stop])
+                marked = present + popcount(absent_bitmaps[entry_number][start:stop])
+                if marked and present * 100.0 < threshold * marked:
+                    results.append((entry_number, present * 100.0 / marked))
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results
+
+    def nbytes(self):
+        # Bytes held in the bitmaps themselves
+        return sum(len(bitmap) for bitmaps in (self.present, self.absent) for bitmap in bitmaps.values())
+
+    def to_record(self):
+        with self.lock:
+            return {
+                "periods": self.periods,
+                "start": date.fromordinal(self.start).isoformat() if self.start is not None else None,
+                "days": self.days,
+                "students": [[entry_number, base64.b64encode(bitmap).decode("ascii"),
+                              base64.b64encode(self.absent[entry_number]).decode("ascii")]
+                             for entry_number, bitmap in self.present.items()],
+            }
+
+    @classmethod
+    def from_record(cls, record):
+        book = cls(record["periods"])
+        if record["start"]:
+            book.start = parse_date(record["start"]).toordinal()
+        book.days = record["days"]
+        for entry_number, present, absent in record["students"]:
+            book.present[entry_number] = bytearray(base64.b64decode(present))
+            book.absent[entry_number] = bytearray(base64.b64decode(absent))
+        return book
@@ -0,0 +1,836 @@
+import argparse
+import asyncio
+import csv
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left, bisect_right
+from concurrent.futures import wait
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak process memory is then left out
+    resource = None
+
+import credentials
+import events
+import gradebook
+import ledger
+import ranks
+import reports
+import timetable
+from main import Admin, Classroom, School, Student, Teacher
+from importer import import_grades, import_students
+from server import Client, SchoolServer
+
+SUBJECTS = ["Math", "English", "Science", "History", "Geography", "Art", "Music", "Physics"]
+
+
+def build_school(num_classes=100, students_per_class=500, subjects_per_student=5, num_teachers=50,
+                 password="pass", seed=0):
+    # Builds a synthetic school. Everyone shares one password hash so setup stays fast at any hash cost.
+    rng = random.Random(seed)
+    encoded = credentials.hash_password(password)
+    school = School()
+    admin = Admin("admin", "", school, encoded=encoded)
+    entry_number = 1
+    for c in range(num_classes):
+        classroom = Classroom(f"C{c}", f"Incharge {c}")
+        school.add_class(classroom)
+        students = []
+        for _ in range(students_per_class):
+            student = Student(f"Student {entry_number}", classroom.class_no, entry_number, encoded=encoded)
+            student.add_subjects((subject, rng.randint(0, 100))
+                                 for subject in rng.sample(SUBJECTS, subjects_per_student))
+            students.append(student)
+            entry_number += 1
+        classroom.add_students(students)
+    for t in range(num_teachers):
+        classes = [f"C{c}" for c in range(t % num_classes, num_classes, num_teachers)] if num_classes else []
+        teacher = Teacher(f"Teacher {t + 1}", SUBJECTS[t % len(SUBJECTS)], classes, encoded=encoded)
+        teacher.teacher_id = t + 1
+        school.add_teacher(teacher)
+    return school, admin
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    ordered = sorted(samples)
+    if not ordered:
+        return {p: 0.0 for p in points}
+    return {p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+
+def write_student_csv(path, num_classes, students_per_class, subjects_per_student, password="pass", seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["class_no", "name", "entry_number", "password", "subjects"])
+        entry_number = 1
+        for c in range(num_classes):
+            for _ in range(students_per_class):
+                subjects = ";".join(f"{subject}={rng.randint(0, 100)}"
+                                    for subject in rng.sample(SUBJECTS, subjects_per_student))
+                writer.writerow([f"C{c}", f"Student {entry_number}", entry_number, password, subjects])
+                entry_number += 1
+    return entry_number - 1
+
+
+def write_grade_csv(path, num_students, rows, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["entry_number", "subject", "grade"])
+        for _ in range(rows):
+            writer.writerow([rng.randint(1, num_students), rng.choice(SUBJECTS), rng.randint(0, 100)])
+
+
+def bench_import(num_classes=100, students_per_class=500, subjects_per_student=5, batch_size=1000):
+    school = School()
+    for c in range(num_classes):
+        school.add_class(Classroom(f"C{c}", f"Incharge {c}"))
+    with tempfile.TemporaryDirectory() as directory:
+        students_path = os.path.join(directory, "students.csv")
+        grades_path = os.path.join(directory, "grades.csv")
+        # Rows carry one shared pre-hashed password, as build_school does; plaintext rows would each
+        # pay a full PBKDF2 hash and the benchmark would time the KDF rather than the importer
+        num_students = write_student_csv(students_path, num_classes, students_per_class, subjects_per_student,
+                                         credentials.hash_password("pass"))
+        write_grade_csv(grades_path, num_students, num_students * 2)
+        print(import_students(school, students_path, batch_size=batch_size).summary())
+        print(import_grades(school, grades_path, batch_size=batch_size).summary())
+
+
+def bench_logins(users=200, logins=2000, iterations=None):
+    iterations = iterations or credentials.DEFAULT_ITERATIONS
+    students = [Student(f"Student {n}", "C0", n, encoded=credentials.hash_password(f"pass{n}", iterations))
+                for n in range(users)]
+    rng = random.Random(0)
+    attempts = [rng.randrange(users) for _ in range(logins)]
+
+    credentials.verified_cache.clear()
+    start = time.perf_counter()
+    futures = [students[n].authenticate_async(f"pass{n}") for n in range(users)]
+    wait(futures)
+    cold = users / (time.perf_counter() - start)
+    assert all(future.result() for future in futures)
+
+    start = time.perf_counter()
+    for n in attempts:
+        students[n].authenticate(f"pass{n}")
+    warm = logins / (time.perf_counter() - start)
+    print(f"pbkdf2_sha256 at {iterations} iterations: {cold:.1f} cold logins/s on the thread pool, "
+          f"{warm:.0f} cached logins/s")
+
+
+def bench_stress(writers=8, readers=2, seconds=3.0, num_classes=32, students_per_class=100):
+    school, _ = build_school(num_classes, students_per_class, num_teachers=0)
+    stop = threading.Event()
+    counts = []
+    errors = []
+    next_entry = [num_classes * students_per_class]
+    encoded = credentials.hash_password("pass")
+
+    def writer(index):
+        rng = random.Random(index)
+        classes = [school.classes[f"C{c}"] for c in range(index, num_classes, writers)]
+        done = 0
+        try:
+            while not stop.is_set():
+                classroom = rng.choice(classes)
+                roll = rng.random()
+                if roll < 0.9:
+                    student = classroom.get_student(rng.choice(classroom.roster))
+                    if student:
+                        student.add_subject(rng.choice(SUBJECTS), rng.randint(0, 100))
+                elif roll < 0.95:
+                    with classroom.lock:
+                        next_entry[0] += 1
+                        entry_number = next_entry[0]
+                    classroom.add_student(Student("New", classroom.class_no, entry_number, encoded=encoded))
+                elif len(classroom.roster) > 1:
+                    classroom.remove_student(rng.choice(classroom.roster))
+                done += 1
+        except Exception as e:
+            errors.append(repr(e))
+        counts.append(done)
+
+    def reader():
+        done = 0
+        try:
+            while not stop.is_set():
+                total = 0
+                for classroom in school.classes.values():
+                    for student in classroom.students.values():
+                        total += student.fees
+                        student.subjects
+                school.school_stats()
+                done += 1
+        except Exception as e:
+            errors.append(repr(e))
+        counts.append(-done)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    problems = school.check_index() + errors
+    for classroom in school.classes.values():
+        expected = sum(student.gpa for student in classroom.students.values())
+        if abs(classroom.gpa_total - expected) > 1e-6:
+            problems.append(f"Class {classroom.class_no} GPA total drifted")
+        for student in classroom.students.values():
+            if abs(student.gpa - student.calculate_gpa()) > 1e-9:
+                problems.append(f"Student {student.entry_number} GPA is stale")
+    count, mean, _, _ = school.school_stats()
+    if count != len(school.student_index):
+        problems.append("School stats count is stale")
+    writes = sum(c for c in counts if c > 0)
+    scans = -sum(c for c in counts if c < 0)
+    print(f"{writers} writers, {readers} readers: {writes / elapsed:.0f} writes/s, "
+          f"{scans / elapsed:.1f} full scans/s, {len(problems)} consistency problems")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+
+
+async def _teacher_session(port, teacher, requests, latencies, rng):
+    client = await Client.connect(port=port)
+    await client.request("login", role="teacher", teacher_id=teacher.teacher_id, password="pass")
+    classes = sorted(teacher.classes_to_teach)
+    for _ in range(requests):
+        class_no = rng.choice(classes)
+        start = time.perf_counter()
+        if rng.random() < 0.7:
+            roster = teacher.school.classes[class_no].roster
+            await client.call("update_grade", class_no=class_no, entry_number=rng.choice(roster),
+                              grade=rng.randint(0, 100))
+        else:
+            await client.call("class_students", class_no=class_no, limit=50)
+        latencies.append(time.perf_counter() - start)
+    await client.close()
+
+
+async def _load(school, admin, sessions, requests):
+    server = await SchoolServer(school, admin).start(port=0)
+    port = server.sockets[0].getsockname()[1]
+    teachers = [teacher for teacher in school.teachers.values() if teacher.classes_to_teach]
+    latencies = []
+    rng = random.Random(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(_teacher_session(port, teachers[i % len(teachers)], requests, latencies,
+                                            random.Random(rng.random())) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    return latencies, elapsed
+
+
+def bench_server(sessions=200, requests=50, num_classes=50, students_per_class=40):
+    school, admin = build_school(num_classes, students_per_class, num_teachers=max(1, sessions // 2))
+    latencies, elapsed = asyncio.run(_load(school, admin, sessions, requests))
+    p = percentiles(latencies)
+    print(f"{sessions} sessions x {requests} requests: {len(latencies) / elapsed:.0f} requests/s, "
+          f"p50 {p[50] * 1000:.2f}ms, p90 {p[90] * 1000:.2f}ms, p99 {p[99] * 1000:.2f}ms")
+
+
+def _matches(a, b):
+    # Compares query results, allowing for float rounding between NumPy and plain Python sums
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_matches(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+        return len(a) == len(b) and all(_matches(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return abs(a - b) <= 1e-9 * max(1.0, abs(a), abs(b))
+    return a == b
+
+
+def bench_gradebook(num_classes=200, students_per_class=1000, subjects_per_student=5, repeat=5):
+    school, admin = build_school(num_classes, students_per_class, subjects_per_student, num_teachers=1)
+    start = time.perf_counter()
+    book = gradebook.Gradebook.attach(school)
+    print(f"Attached {len(book)} grade rows in {time.perf_counter() - start:.2f}s "
+          f"({'NumPy' if gradebook.np is not None else 'pure Python, NumPy not installed'})")
+
+    # Churn some grades through the normal Student methods so the check covers the sync hooks too
+    rng = random.Random(1)
+    classroom = school.classes["C0"]
+    for student in list(classroom.students.values())[:100]:
+        subject = rng.choice(SUBJECTS)
+        if student.has_subject(subject):
+            student.remove_subject(subject)
+        else:
+            student.add_subject(subject, rng.randint(0, 100))
+    classroom.set_grades(SUBJECTS[0], [(entry_number, 35) for entry_number in classroom.roster[:50]])
+    classroom.remove_student(classroom.roster[-1])
+
+    queries = [
+        ("subject_stats", lambda: book.subject_stats(SUBJECTS[0]),
+         lambda: gradebook.reference_subject_stats(school, SUBJECTS[0])),
+        ("class_distribution", lambda: book.class_distribution("C0"),
+         lambda: gradebook.reference_class_distribution(school, "C0")),
+        ("top_students", lambda: book.top_students(10), lambda: gradebook.reference_top_students(school, 10)),
+        ("failing_students", lambda: book.failing_students(), lambda: gradebook.reference_failing_students(school)),
+    ]
+    for name, query, reference in queries:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = query()
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        expected = reference()
+        reference_time = time.perf_counter() - start
+        status = "ok" if _matches(result, expected) else "MISMATCH"
+        print(f"{name}: {min(timings) * 1000:.1f}ms (reference {reference_time * 1000:.1f}ms) {status}")
+
+
+def bench_fees(num_classes=100, students_per_class=500, payments=20000, queries=200, seed=0):
+    school, admin = build_school(num_classes, students_per_class, num_teachers=1)
+    students = num_classes * students_per_class
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    school.post_term_fee(1500, "Term 1 fee")
+    elapsed = time.perf_counter() - start
+    print(f"Term fee posted to {students} students in {elapsed * 1000:.1f}ms")
+
+    start = time.perf_counter()
+    for _ in range(payments):
+        entry_number = rng.randint(1, students)
+        kind = rng.choice((ledger.PAYMENT, ledger.PAYMENT, ledger.PAYMENT, ledger.WAIVER, ledger.CHARGE))
+        school.post_fee(entry_number, kind, rng.randint(1, 25) * 100)
+    elapsed = time.perf_counter() - start
+    print(f"{payments} single transactions: {payments / elapsed:.0f}/s")
+
+    reports = [
+        ("owing_more_than 2000", lambda: school.ledger.owing_more_than(2000, 50),
+         lambda: ledger.reference_owing_more_than(school, 2000, 50)),
+        ("top_debtors 10", lambda: school.ledger.top_debtors(10), lambda: ledger.reference_top_debtors(school, 10)),
+        ("count_owing_more_than 0", lambda: school.ledger.count_owing_more_than(0),
+         lambda: len(ledger.reference_owing_more_than(school, 0))),
+    ]
+    for name, report, reference in reports:
+        latencies = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            result = report()
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        expected = reference()
+        reference_time = time.perf_counter() - start
+        p = percentiles(latencies)
+        status = "ok" if result == expected else "MISMATCH"
+        print(f"{name}: p50 {p[50] * 1000:.3f}ms, p99 {p[99] * 1000:.3f}ms "
+              f"(full scan {reference_time * 1000:.1f}ms) {status}")
+
+
+def reference_rank(school, student, classroom=None):
+    # Rank and percentile found by sorting every GPA, used to check the rank index
+    students = classroom.students.values() if classroom else (entry[0] for entry in school.student_index.values())
+    keys = sorted(ranks.gpa_key(other.gpa) for other in students)
+    key = ranks.gpa_key(student.gpa)
+    better = bisect_left(keys, key)
+    equal = bisect_right(keys, key) - better
+    return better + 1, 100.0 * (len(keys) - better - equal / 2) / len(keys)
+
+
+def bench_ranks(num_classes=100, students_per_class=500, updates=50000, queries=20000, checks=200, seed=0):
+    # Grade updates with the rank index kept up to date, rank/percentile/top-K queries, and a check
+    # of the answers against sorting every GPA
+    start = time.perf_counter()
+    school, admin = build_school(num_classes, students_per_class, num_teachers=1)
+    print(f"Built {num_classes * students_per_class} students in {time.perf_counter() - start:.2f}s")
+    rng = random.Random(seed)
+    entry_numbers = list(school.student_index)
+    students = [school.find_student(rng.choice(entry_numbers)) for _ in range(updates)]
+    grades = [(rng.choice(SUBJECTS), rng.randint(0, 100)) for _ in range(updates)]
+    gc.collect()
+    start = time.perf_counter()
+    for student, (subject, grade) in zip(students, grades):
+        student.add_subject(subject, grade)
+    elapsed = time.perf_counter() - start
+    print(f"{updates} grade updates with ranks kept: {updates / elapsed:.0f}/s")
+
+    classroom = school.classes[next(iter(school.classes))]
+    start = time.perf_counter()
+    classroom.set_grades("Math", [(entry_number, rng.randint(0, 100)) for entry_number in classroom.roster])
+    print(f"Class-wide grade update of {len(classroom.roster)} students: "
+          f"{(time.perf_counter() - start) * 1000:.2f}ms")
+
+    sample = [school.find_student(rng.choice(entry_numbers)) for _ in range(queries)]
+    cases = [
+        ("class rank", lambda student: student.classroom.rank_of(student)),
+        ("school rank", lambda student: school.school_rank(student)),
+        ("class top 10", lambda student: student.classroom.top_students(10)),
+        ("school top 10", lambda student: school.top_students(10)),
+    ]
+    for name, query in cases:
+        latencies = []
+        for student in sample:
+            start = time.perf_counter()
+            query(student)
+            latencies.append(time.perf_counter() - start)
+        p = percentiles(latencies)
+        print(f"{name}: p50 {p[50] * 1e6:.1f}us, p99 {p[99] * 1e6:.1f}us")
+
+    mismatches = 0
+    start = time.perf_counter()
+    for student in sample[:checks]:
+        for classroom, (rank, _, percentile) in ((student.classroom, student.classroom.rank_of(student)),
+                                                 (None, school.school_rank(student))):
+            expected_rank, expected_percentile = reference_rank(school, student, classroom)
+            if rank != expected_rank or abs(percentile - expected_percentile) > 1e-9:
+                mismatches += 1
+    reference_time = (time.perf_counter() - start) / checks
+    everyone = sorted((entry[0] for entry in school.student_index.values()),
+                      key=lambda student: (ranks.gpa_key(student.gpa), student.entry_number))
+    if [student for student, _ in school.top_students(10)] != everyone[:10]:
+        mismatches += 1
+    mismatches += len(school.check_index())
+    print(f"Sorting every GPA instead: {reference_time * 1000:.1f}ms per student. "
+          + ("ok" if not mismatches else f"{mismatches} MISMATCHES"))
+
+
+def bench_timetable(num_classes=100, students_per_class=40, subjects=8, lessons_per_week=4, classes_per_teacher=6,
+                    days=5, periods=8, seed=0):
+    # Timetable generation for a school where each class has one teacher per subject and there
+    # are a quarter more rooms than classes, a fifth of them too small for a class
+    school, admin = build_school(num_classes, students_per_class, num_teachers=0)
+    class_nos = list(school.classes)
+    teacher_id = 1
+    for subject in SUBJECTS[:subjects]:
+        for i in range(0, num_classes, classes_per_teacher):
+            teacher = Teacher(f"Teacher {teacher_id}", subject, class_nos[i:i + classes_per_teacher])
+            teacher.teacher_id = teacher_id
+            school.add_teacher(teacher)
+            teacher_id += 1
+    rng = random.Random(seed)
+    rooms = [(f"R{r}", students_per_class - 5 if rng.random() < 0.2 else students_per_class + rng.randint(0, 20))
+             for r in range(num_classes + num_classes // 4)]
+    for passes in (0, 2):
+        table, elapsed = timetable.build_timetable(school, days, periods, lessons_per_week, rooms, passes, seed)
+        counts = table.penalties()
+        problems = table.check()
+        print(f"{len(table.lessons)} lessons, {len(school.teachers)} teachers, {len(rooms)} rooms, "
+              f"{passes} improvement passes: {elapsed:.2f}s, {len(table.unplaced)} unplaced, "
+              f"{counts['subject repeats']} subject repeats, {counts['teacher gaps']} teacher gaps, "
+              + ("ok" if not problems else f"{len(problems)} CONFLICTS"))
+
+
+def bench_attendance(num_classes=100, students_per_class=500, school_days=200, seed=0):
+    # A school year of attendance: every class marked for every period of each school day, one
+    # bulk call per class and period. Reports marking throughput, memory per student-year and
+    # query latency, and checks the counts against ones kept per mark.
+    school, admin = build_school(num_classes, students_per_class, num_teachers=0)
+    rng = random.Random(seed)
+    book = school.attendance
+    periods = book.periods
+    students = num_classes * students_per_class
+    first = datetime.date(2026, 1, 5)
+    calendar = (first + datetime.timedelta(days=d) for d in range(366))
+    days = [day for day in calendar if day.weekday() < 5][:school_days]
+    # Each student has their own chance of missing a period, so some fall below 75%
+    chance = {entry_number: rng.choice((0.02, 0.05, 0.1, 0.3)) for entry_number in school.student_index}
+    sample = set(rng.sample(sorted(school.student_index), min(200, students)))
+    expected = {entry_number: [0, 0] for entry_number in sample}
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    elapsed = 0.0
+    for day in days:
+        for classroom in school.classes.values():
+            for period in range(periods):
+                absent = [entry_number for entry_number in classroom.roster if rng.random() < chance[entry_number]]
+                start = time.perf_counter()
+                classroom.mark_attendance(day, period, absent)
+                elapsed += time.perf_counter() - start
+                for entry_number in sample.intersection(classroom.roster):
+                    expected[entry_number][0] += entry_number not in absent
+                    expected[entry_number][1] += 1
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    marks = students * len(days) * periods
+    calls = num_classes * len(days) * periods
+    print(f"{marks} marks in {calls} class calls: {marks / elapsed:.0f} marks/s, "
+          f"{elapsed / calls * 1000:.3f}ms per call")
+    # The bitmaps grow with the days covered; the objects holding them do not
+    bitmaps = book.nbytes()
+    per_year = ((used - bitmaps) + bitmaps * 366 / book.days) / students
+    print(f"Memory: {used / students:.0f} bytes per student for {book.days} days ({bitmaps / students:.0f} bytes "
+          f"of bitmaps, {periods} periods a day), about {per_year:.0f} bytes per student-year")
+
+    term = (days[0], days[min(len(days), 60) - 1])
+    classroom = school.classes[next(iter(school.classes))]
+    entry_numbers = sorted(sample)
+    queries = [
+        ("student rate, whole year", 2000, lambda n: school.attendance_rate(entry_numbers[n % len(entry_numbers)])),
+        ("student rate, one term", 2000,
+         lambda n: school.attendance_rate(entry_numbers[n % len(entry_numbers)], *term)),
+        ("class rate, whole year", 200, lambda n: school.class_attendance(classroom.class_no)),
+        ("students below 75%, whole school", 5, lambda n: school.low_attendance(75.0)),
+    ]
+    for name, count, query in queries:
+        latencies = []
+        for n in range(count):
+            start = time.perf_counter()
+            query(n)
+            latencies.append(time.perf_counter() - start)
+        p = percentiles(latencies)
+        print(f"{name}: p50 {p[50] * 1000:.3f}ms, p99 {p[99] * 1000:.3f}ms")
+    mismatches = sum(school.attendance_rate(entry_number) != tuple(counts) for entry_number, counts in expected.items())
+    low = {student.entry_number for student, _ in school.low_attendance(75.0)}
+    mismatches += sum((entry_number in low) != (counts[0] * 100 < 75 * counts[1])
+                      for entry_number, counts in expected.items())
+    print(f"{len(low)} students below 75%. " + ("ok" if not mismatches else f"{mismatches} MISMATCHES"))
+
+
+def bench_events(num_classes=100, students_per_class=500, updates=100000, seed=0):
+    # Grade update throughput with no subscribers, one plain subscriber and one batching subscriber
+    school, admin = build_school(num_classes, students_per_class, num_teachers=1)
+    rng = random.Random(seed)
+    students = [school.find_student(rng.choice(list(school.student_index))) for _ in range(updates)]
+    grades = [(rng.choice(SUBJECTS), rng.randint(0, 100)) for _ in range(updates)]
+    seen = []
+    batches = []
+    batch = events.Batch(lambda changed: batches.append(len(changed)), max_size=10000)
+    setups = [
+        ("no subscribers", None),
+        ("plain subscriber", lambda event: seen.append(event)),
+        ("batching subscriber", batch),
+    ]
+    baseline = None
+    for name, subscriber in setups:
+        if subscriber:
+            school.events.subscribe(subscriber, events.GradeChanged)
+        gc.collect()
+        start = time.perf_counter()
+        for student, (subject, grade) in zip(students, grades):
+            student.add_subject(subject, grade)
+        elapsed = time.perf_counter() - start
+        if subscriber:
+            school.events.unsubscribe(subscriber)
+        baseline = baseline or elapsed
+        print(f"{name}: {updates / elapsed:.0f} grade updates/s, "
+              f"{(elapsed - baseline) / updates * 1e6:+.2f}us per update")
+    batch.flush()
+    print(f"Batching subscriber: {batch.received} events coalesced into {batch.delivered} in {len(batches)} batches")
+
+
+def bench_reports(num_classes=100, students_per_class=500, subjects_per_student=5, fmt="text", max_workers=None):
+    # Report card generation with 1, 2, 4, ... worker processes up to max_workers (default: CPU count)
+    school, admin = build_school(num_classes, students_per_class, subjects_per_student)
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+    print(f"{num_classes * students_per_class} students in {num_classes} classes, {fmt} format, "
+          f"{os.cpu_count()} CPUs")
+    baseline = None
+    for workers in counts:
+        with tempfile.TemporaryDirectory() as directory:
+            students, characters, elapsed = reports.generate_reports(school, directory, fmt, workers)
+        baseline = baseline or elapsed
+        print(f"{workers} workers: {elapsed:.2f}s, {students / elapsed:.0f} report cards/s, "
+              f"{characters / elapsed / 2 ** 20:.1f} MB/s, speedup {baseline / elapsed:.2f}x")
+
+
+def bench_memory(num_classes=100, students_per_class=500, subjects_per_student=5):
+    # Measures what the in-memory School costs per student, teachers and classes included
+    credentials.hash_password("pass")  # Warm up hashlib so its one-off allocations are not counted
+    tracemalloc.start()
+    school, admin = build_school(num_classes, students_per_class, subjects_per_student)
+    built = tracemalloc.get_traced_memory()[0]
+    snapshot = json.loads(json.dumps(school.to_snapshot()))
+    del school, admin
+    gc.collect()  # Classes and students point back at each other, so only the collector frees them
+    # A school loaded from disk, where every record brings its own copy of each string
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    restored_school = School()
+    restored_school.restore(snapshot)
+    restored = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    students = num_classes * students_per_class
+    print(f"{students} students, {subjects_per_student} subjects each")
+    print(f"built in memory: {built / students:.0f} bytes per student ({built / 2 ** 20:.1f} MB)")
+    print(f"restored from a snapshot: {restored / students:.0f} bytes per student ({restored / 2 ** 20:.1f} MB)")
+
+
+def name_pool(rng, first_names=3000, last_names=8000):
+    # Builds a name generator over fixed first and last name lists, like a real school's mix of
+    # common and rare names
+    syllables = ["a", "ra", "vi", "sha", "ma", "ku", "an", "ja", "ne", "li", "so", "ta", "mi", "ro", "de", "el",
+                 "pri", "ya", "sun", "dar", "kar", "van", "mo", "han", "ger", "ton", "ber", "lo", "wen", "chi",
+                 "na", "ri", "ko", "tha", "ben", "es", "or", "zu", "pe", "di"]
+
+    def word(low, high):
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(low, high))).title()
+
+    firsts = [word(2, 3) for _ in range(first_names)]
+    lasts = [word(2, 4) for _ in range(last_names)]
+    return lambda: f"{rng.choice(firsts)} {rng.choice(lasts)}"
+
+
+def bench_search(num_names=100000, queries=2000, seed=0):
+    rng = random.Random(seed)
+    encoded = credentials.hash_password("pass")
+    school = School()
+    classroom = Classroom("C0", "Incharge")
+    school.add_class(classroom)
+    random_name = name_pool(rng)
+    names = [random_name() for _ in range(num_names)]
+    start = time.perf_counter()
+    classroom.add_students([Student(name, "C0", n + 1, encoded=encoded) for n, name in enumerate(names)])
+    print(f"Indexed {num_names} names in {time.perf_counter() - start:.2f}s")
+
+    def typo(word):
+        i = rng.randrange(len(word) - 1)
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+    kinds = {
+        "token": lambda first, last: first,
+        "prefix": lambda first, last: first[:3],
+        "full name": lambda first, last: f"{first} {last}",
+        "two prefixes": lambda first, last: f"{first[:2]} {last[:3]}",
+        "typo": lambda first, last: typo(last),
+    }
+    for kind, make_query in kinds.items():
+        latencies = []
+        for _ in range(queries):
+            first, last = rng.choice(names).lower().split()
+            query = make_query(first, last)
+            start = time.perf_counter()
+            school.search_students(query)
+            latencies.append(time.perf_counter() - start)
+        p = percentiles(latencies)
+        print(f"{kind}: p50 {p[50] * 1000:.3f}ms, p90 {p[90] * 1000:.3f}ms, p99 {p[99] * 1000:.3f}ms")
+
+
+# The suite: timed scenarios over a synthetic school, saved as JSON so two runs can be compared
+
+WARMUP_FRACTION = 10  # One operation in ten is run untimed first, to warm caches and the allocator
+MEMORY_OPS = 100  # Operations run again under tracemalloc to find each scenario's peak memory
+MIN_P99_CHANGE_MS = 0.005  # p99 changes smaller than this are timer noise, not regressions
+
+
+def suite_scenarios(school, admin, ops, seed=0, repeat=3):
+    # Returns [(name, number of timed operations, operation)]. operation(i) runs the i-th operation;
+    # every scenario has arguments prepared for its warm-up, timed and memory runs so none is repeated.
+    rng = random.Random(seed)
+    encoded = credentials.hash_password("pass")
+    classes = list(school.classes.values())
+    entries = list(school.student_index)
+    total = ops * (repeat + 1) + MEMORY_OPS
+    picked = [school.find_student(rng.choice(entries)) for _ in range(total)]
+    lookups = [rng.choice(entries) for _ in range(total)]
+    grades = [(rng.choice(SUBJECTS), rng.randint(0, 100)) for _ in range(total)]
+    first_new = max(entries, default=0) + 1
+    reports = max(10, ops // 100)
+
+    def enroll(i):
+        classroom = classes[i % len(classes)]
+        classroom.add_student(Student(f"New {i}", classroom.class_no, first_new + i, encoded=encoded))
+
+    def grade_then_stats(i):
+        picked[i].add_subject(*grades[i])
+        school.school_stats()
+
+    return [
+        ("find_student", ops, lambda i: school.find_student(lookups[i])),
+        ("enroll", ops, enroll),
+        ("grade_update", ops, lambda i: picked[i].add_subject(*grades[i])),
+        ("calculate_gpa", ops, lambda i: picked[i].calculate_gpa()),
+        ("class_average", ops, lambda i: classes[i % len(classes)].class_average()),
+        ("school_stats_after_update", ops, grade_then_stats),
+        ("report_class_details", reports, lambda i: classes[i % len(classes)].detail_lines()),
+        ("report_school_details", reports, lambda i: admin.school_detail_lines()),
+        ("report_all_students", reports, lambda i: school.all_student_lines()),
+        ("report_fee_records", reports, lambda i: admin.fee_record_lines()),
+    ]
+
+
+def run_scenario(count, operation, repeat=3):
+    # Warms up, times count operations one by one `repeat` times and keeps the fastest pass, since a
+    # busy machine only ever makes a pass slower. A few more operations then run under tracemalloc
+    # for the peak memory.
+    warmup = count // WARMUP_FRACTION
+    for i in range(warmup):
+        operation(i)
+    clock = time.perf_counter
+    best = None
+    first = warmup
+    for _ in range(repeat):
+        gc.collect()
+        latencies = []
+        start = clock()
+        for i in range(first, first + count):
+            began = clock()
+            operation(i)
+            latencies.append(clock() - began)
+        elapsed = clock() - start
+        first += count
+        if best is None or elapsed < best[0]:
+            best = (elapsed, latencies)
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(first, first + min(count, MEMORY_OPS)):
+        operation(i)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    elapsed, latencies = best
+    p = percentiles(latencies, (50, 90, 99))
+    return {"ops": count, "seconds": round(elapsed, 6), "ops_per_second": round(count / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(p[50] * 1000, 4), "p90_ms": round(p[90] * 1000, 4), "p99_ms": round(p[99] * 1000, 4),
+            "peak_kb": round(peak / 1024, 1)}
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)  # Bytes on macOS, KB elsewhere
+
+
+def bench_suite(num_classes=100, students_per_class=500, subjects_per_student=5, num_teachers=50, ops=2000,
+                seed=0, repeat=3, only=None, json_path=None):
+    config = {"classes": num_classes, "students_per_class": students_per_class, "subjects": subjects_per_student,
+              "teachers": num_teachers, "ops": ops, "seed": seed, "repeat": repeat}
+    start = time.perf_counter()
+    school, admin = build_school(num_classes, students_per_class, subjects_per_student, num_teachers, seed=seed)
+    build_seconds = time.perf_counter() - start
+    print(f"Built {num_classes * students_per_class} students in {num_classes} classes in {build_seconds:.2f}s")
+
+    results = {}
+    for name, count, operation in suite_scenarios(school, admin, ops, seed, repeat):
+        if only and name not in only:
+            continue
+        result = results[name] = run_scenario(count, operation, repeat)
+        print(f"{name}: {result['ops_per_second']:.0f} ops/s, p50 {result['p50_ms']:.4f}ms, "
+              f"p90 {result['p90_ms']:.4f}ms, p99 {result['p99_ms']:.4f}ms, peak {result['peak_kb']:.1f} KB")
+
+    run = {"version": 1, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+           "platform": platform.platform(), "config": config, "build_seconds": round(build_seconds, 3),
+           "max_rss_mb": max_rss_mb(), "scenarios": results}
+    if run["max_rss_mb"] is not None:
+        print(f"Peak process memory: {run['max_rss_mb']:.1f} MB")
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+        print(f"Results written to {json_path}")
+    return run
+
+
+def compare_runs(base_path, new_path, threshold=10.0):
+    # Prints each scenario's change between two suite runs; returns the names that got slower
+    # by more than threshold percent in throughput or p99 latency
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    if base["config"] != new["config"]:
+        print(f"Warning: the runs used different settings ({base['config']} vs {new['config']})")
+
+    def change(old, value):
+        return (value - old) / old * 100 if old else 0.0
+
+    regressions = []
+    for name, result in new["scenarios"].items():
+        old = base["scenarios"].get(name)
+        if not old:
+            print(f"{name}: new scenario, {result['ops_per_second']:.0f} ops/s")
+            continue
+        throughput = change(old["ops_per_second"], result["ops_per_second"])
+        p99 = change(old["p99_ms"], result["p99_ms"])
+        slower = throughput < -threshold or (p99 > threshold and result["p99_ms"] - old["p99_ms"] > MIN_P99_CHANGE_MS)
+        if slower:
+            regressions.append(name)
+        print(f"{name}: {old['ops_per_second']:.0f} -> {result['ops_per_second']:.0f} ops/s ({throughput:+.1f}%), "
+              f"p99 {old['p99_ms']:.4f} -> {result['p99_ms']:.4f}ms ({p99:+.1f}%)" + ("  REGRESSION" if slower else ""))
+    for name in base["scenarios"]:
+        if name not in new["scenarios"]:
+            print(f"{name}: missing from the new run")
+    print(f"{len(regressions)} regressions beyond {threshold:g}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ScholarSync benchmarks.")
+    parser.add_argument("scenario", choices=["suite", "compare", "import", "logins", "server", "stress", "gradebook",
+                                             "memory", "search", "fees", "events", "reports", "ranks",
+                                             "timetable", "attendance"])
+    parser.add_argument("files", nargs="*", help="compare: the baseline and new JSON results")
+    parser.add_argument("--classes", type=int, default=100)
+    parser.add_argument("--students-per-class", type=int, default=500)
+    parser.add_argument("--subjects", type=int, default=5)
+    parser.add_argument("--teachers", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=2000, help="suite: operations timed per scenario")
+    parser.add_argument("--only", nargs="+", help="suite: run only these scenarios")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="suite: timed passes per scenario, the fastest is kept")
+    parser.add_argument("--json", help="suite: write the results to this file")
+    parser.add_argument("--format", choices=sorted(reports.FORMATS), default="text", help="reports: output format")
+    parser.add_argument("--workers", type=int, help="reports: most worker processes to try (default: CPU count)")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="compare: percent change in throughput or p99 counted as a regression")
+    parser.add_argument("--days", type=int, default=200, help="attendance: school days marked")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--hash-iterations", type=int, help="Password hashing cost (default: credentials.DEFAULT_ITERATIONS)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    if args.hash_iterations:
+        credentials.DEFAULT_ITERATIONS = args.hash_iterations
+
+    if args.scenario == "suite":
+        bench_suite(args.classes, args.students_per_class, args.subjects, args.teachers, args.ops, args.seed,
+                    args.repeat, args.only, args.json)
+    elif args.scenario == "compare":
+        if len(args.files) != 2:
+            parser.error("compare needs a baseline and a new results file")
+        if compare_runs(args.files[0], args.files[1], args.threshold):
+            sys.exit(1)
+    elif args.scenario == "import":
+        bench_import(args.classes, args.students_per_class, args.subjects, args.batch_size)
+    elif args.scenario == "logins":
+        bench_logins(args.users, iterations=args.hash_iterations)
+    elif args.scenario == "server":
+        bench_server(args.sessions, args.requests)
+    elif args.scenario == "stress":
+        bench_stress()
+    elif args.scenario == "gradebook":
+        bench_gradebook(args.classes, args.students_per_class, args.subjects)
+    elif args.scenario == "memory":
+        bench_memory(args.classes, args.students_per_class, args.subjects)
+    elif args.scenario == "search":
+        bench_search(args.classes * args.students_per_class)
+    elif args.scenario == "fees":
+        bench_fees(args.classes, args.students_per_class)
+    elif args.scenario == "events":
+        bench_events(args.classes, args.students_per_class)
+    elif args.scenario == "reports":
+        bench_reports(args.classes, args.students_per_class, args.subjects, args.format, args.workers)
+    elif args.scenario == "ranks":
+        bench_ranks(args.classes, args.students_per_class)
+    elif args.scenario == "timetable":
+        bench_timetable(args.classes, args.students_per_class, args.subjects)
+    elif args.scenario == "attendance":
+        bench_attendance(args.classes, args.students_per_class, args.days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import shlex
+import sys
+import time
+
+import operations
+from main import Interface
+from operations import OperationError
+
+# Non-interactive command mode. Every admin, teacher and student menu action is a subcommand:
+#
+#   python commands.py add-class 10A "Mrs Sharma"
+#   python commands.py update-fee 42 1500
+#   python commands.py post-fee 42 payment 500 "Cash"
+#   python commands.py update-grade 7 10A 42 91        (teacher 7 gives student 42 a 91)
+#   python commands.py --file nightly.txt              (one command per line, "-" for stdin)
+#
+# Each command prints one JSON line with its result and how long it took, then a summary line
+# is printed at the end. A line that fails, for any reason, is reported and the batch goes on.
+#
+# Commands run as the admin or the named teacher or student without asking for their password,
+# since whoever can run this already has the data directory. The change-*-password commands are
+# the exception: they take the current password, as the menus do. The data directory holds only
+# hashes, so it does not tell anyone a password, and without this check anyone could set one and
+# then log in to the menus or the server as that user.
+
+
+class CommandParser(argparse.ArgumentParser):
+    # Reports bad command lines as OperationError instead of exiting, so a batch keeps going
+    def error(self, message):
+        raise OperationError(message)
+
+    def exit(self, status=0, message=None):
+        raise OperationError(message.strip() if message else "Command line stopped the parser.")
+
+
+def _teacher(school, teacher_id):
+    try:
+        teacher = school.teachers.get(int(teacher_id))
+    except ValueError:
+        raise OperationError("Invalid ID.")
+    if not teacher:
+        raise OperationError("Teacher not found.")
+    return teacher
+
+
+def _student(school, entry_number):
+    try:
+        student = school.find_student(int(entry_number))
+    except ValueError:
+        raise OperationError("Invalid entry number.")
+    if not student:
+        raise OperationError("Student not found.")
+    return student
+
+
+def _pairs(items, key_name):
+    # Turns ["Math=90", ...] into [("Math", "90"), ...]
+    pairs = []
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise OperationError(f"Expected {key_name}=grade, got '{item}'.")
+        pairs.append((key, value))
+    return pairs
+
+
+def build_parser():
+    parser = CommandParser(prog="commands.py", add_help=False)
+    commands = parser.add_subparsers(dest="command", required=True, parser_class=CommandParser)
+
+    def command(name, handler, *arguments):
+        sub = commands.add_parser(name, add_help=False)
+        for argument in arguments:
+            if isinstance(argument, tuple):
+                sub.add_argument(argument[0], **argument[1])
+            else:
+                sub.add_argument(argument)
+        sub.set_defaults(handler=handler)
+
+    many = {"nargs": "*"}
+    integer = {"type": int}
+
+    # Admin commands
+    command("school-details", lambda i, a: operations.school_details(i.school))
+    command("add-teacher", lambda i, a: operations.add_teacher(i.school, i.admin, a.teacher_id, a.name, a.subject,
+                                                                a.classes, a.password),
+            "teacher_id", "name", "subject", "password", ("classes", many))
+    command("remove-teacher", lambda i, a: operations.remove_teacher(i.school, i.admin, a.teacher_id), "teacher_id")
+    command("list-teachers", lambda i, a: operations.list_teachers(i.school))
+    command("add-class", lambda i, a: operations.add_class(i.school, i.admin, a.class_no, a.incharge),
+            "class_no", "incharge")
+    command("remove-class", lambda i, a: operations.remove_class(i.school, i.admin, a.class_no), "class_no")
+    command("class-details", lambda i, a: operations.class_details(i.school, a.class_no, a.offset, a.limit),
+            "class_no", ("--offset", {"type": int, "default": 0}), ("--limit", integer))
+    command("add-student", lambda i, a: operations.add_student(i.school, a.class_no, a.name, a.entry_number,
+                                                                a.password, _pairs(a.subjects, "subject")),
+            "class_no", "name", "entry_number", "password", ("subjects", many))
+    command("list-students", lambda i, a: operations.list_students(i.school))
+    command("fee-records", lambda i, a: operations.fee_records(i.school))
+    command("update-fee", lambda i, a: operations.update_fee(i.school, i.admin, a.entry_number, a.fee),
+            "entry_number", "fee")
+    command("post-fee", lambda i, a: operations.post_fee(i.school, a.entry_number, a.kind, a.amount, a.memo),
+            "entry_number", ("kind", {"choices": ["charge", "payment", "waiver"]}), "amount",
+            ("memo", {"nargs": "?", "default": ""}))
+    command("post-term-fee", lambda i, a: operations.post_term_fee(i.school, a.amount, a.memo, a.classes),
+            "amount", ("memo", {"nargs": "?", "default": ""}), ("--classes", {"nargs": "+"}))
+    command("outstanding-dues", lambda i, a: operations.outstanding_dues(i.school, a.more_than, a.limit),
+            ("--more-than", {"type": int, "default": 0}), ("--limit", {"type": int, "default": 50}))
+    command("top-students", lambda i, a: operations.top_students(i.school, a.limit, a.class_no),
+            ("--class", {"dest": "class_no"}), ("--limit", {"type": int, "default": 10}))
+    command("attendance-report", lambda i, a: operations.attendance_report(i.school, a.class_no, a.below, a.first,
+                                                                            a.last),
+            ("--class", {"dest": "class_no"}), ("--below", {"type": float, "default": 75.0}),
+            ("--from", {"dest": "first"}), ("--to", {"dest": "last"}))
+    command("search", lambda i, a: operations.search_names(i.school, " ".join(a.query), a.limit),
+            ("query", {"nargs": "+"}), ("--limit", {"type": int, "default": 20}))
+    command("change-admin-password", lambda i, a: operations.change_admin_password(i.admin, a.current, a.new),
+            "current", "new")
+
+    # Teacher commands, each naming the teacher it runs as
+    command("teacher-details", lambda i, a: operations.teacher_details(_teacher(i.school, a.teacher_id)),
+            "teacher_id")
+    command("teacher-classes", lambda i, a: operations.teacher_classes(i.school, _teacher(i.school, a.teacher_id)),
+            "teacher_id")
+    command("class-students", lambda i, a: operations.class_students(i.school, _teacher(i.school, a.teacher_id),
+                                                                      a.class_no, a.offset, a.limit),
+            "teacher_id", "class_no", ("--offset", {"type": int, "default": 0}), ("--limit", integer))
+    command("update-grade", lambda i, a: operations.update_grade(i.school, _teacher(i.school, a.teacher_id),
+                                                                  a.class_no, a.entry_number, a.grade),
+            "teacher_id", "class_no", "entry_number", "grade")
+    command("update-grades", lambda i, a: operations.update_grades(i.school, _teacher(i.school, a.teacher_id),
+                                                                    a.class_no, _pairs(a.grades, "entry_number")),
+            "teacher_id", "class_no", ("grades", {"nargs": "+"}))
+    command("mark-attendance", lambda i, a: operations.mark_attendance(i.school, _teacher(i.school, a.teacher_id),
+                                                                        a.class_no, a.absent, a.date, a.period),
+            "teacher_id", "class_no", ("absent", many), ("--date", {}), ("--period", integer))
+    command("change-teacher-password", lambda i, a: operations.change_password(_teacher(i.school, a.teacher_id),
+                                                                                a.current, a.new),
+            "teacher_id", "current", "new")
+
+    # Student commands, each naming the student it runs as
+    command("student-info", lambda i, a: operations.student_info(_student(i.school, a.entry_number)),
+            "entry_number")
+    command("fee-status", lambda i, a: operations.fee_status(_student(i.school, a.entry_number)), "entry_number")
+    command("fee-statement", lambda i, a: operations.fee_statement(i.school, _student(i.school, a.entry_number)),
+            "entry_number")
+    command("change-student-password", lambda i, a: operations.change_password(_student(i.school, a.entry_number),
+                                                                                a.current, a.new),
+            "entry_number", "current", "new")
+    parser.command_names = list(commands.choices)
+    return parser
+
+
+def run(interface, parser, argv):
+    # Runs one command line; returns (ok, result or error message)
+    try:
+        args = parser.parse_args(argv)
+        return True, args.handler(interface, args)
+    except OperationError as e:
+        return False, str(e)
+    except Exception as e:
+        # A bug or a bad value deep in an operation fails only this line
+        return False, f"{type(e).__name__}: {e}"
+
+
+def read_commands(source):
+    # Yields (line number, argv) for each non-empty, non-comment line
+    for line_no, line in enumerate(source, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            try:
+                yield line_no, shlex.split(line)
+            except ValueError as e:
+                yield line_no, e
+
+
+def run_batch(interface, lines, out, stop_on_error=False):
+    parser = build_parser()
+    succeeded = failed = 0
+    start = time.perf_counter()
+    for line_no, argv in lines:
+        began = time.perf_counter()
+        if isinstance(argv, ValueError):
+            ok, result = False, f"Invalid command line: {argv}"
+        else:
+            ok, result = run(interface, parser, argv)
+        response = {"line": line_no, "command": argv[0] if isinstance(argv, list) and argv else None, "ok": ok,
+                    "ms": round((time.perf_counter() - began) * 1000, 3)}
+        response["result" if ok else "error"] = result
+        out.write(json.dumps(response, separators=(",", ":")) + "\n")
+        if ok:
+            succeeded += 1
+        else:
+            failed += 1
+            if stop_on_error:
+                break
+    elapsed = time.perf_counter() - start
+    summary = {"commands": succeeded + failed, "ok": succeeded, "failed": failed, "seconds": round(elapsed, 3),
+               "per_second": round((succeeded + failed) / elapsed, 1) if elapsed else 0.0}
+    out.write(json.dumps({"summary": summary}, separators=(",", ":")) + "\n")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run ScholarSync operations without the menus.",
+        epilog="Commands: " + ", ".join(build_parser().command_names))
+    parser.add_argument("--file", help="Read one command per line from this file ('-' for standard input)")
+    parser.add_argument("--stop-on-error", action="store_true", help="Stop at the first command that fails")
+    parser.add_argument("--data-dir", default=os.environ.get("SCHOLARSYNC_DATA", "scholarsync_data"))
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="A single command and its arguments")
+    args = parser.parse_args()
+    if not args.file and not args.command:
+        parser.error("give a command or --file")
+
+    interface = Interface(args.data_dir)
+    try:
+        if args.file == "-":
+            failed = run_batch(interface, read_commands(sys.stdin), sys.stdout, args.stop_on_error)
+        elif args.file:
+            with open(args.file, encoding="utf-8") as f:
+                failed = run_batch(interface, read_commands(f), sys.stdout, args.stop_on_error)
+        else:
+            failed = run_batch(interface, [(1, args.command)], sys.stdout, args.stop_on_error)
+    finally:
+        interface.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Salted password hashing shared by Student, Teacher and Admin.
+#
+# Passwords are stored as "pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>". Checking one is
+# deliberately slow, so recent successful checks are remembered for a short time, and
+# verify_async runs the KDF on a thread pool so one login never holds up other sessions.
+
+ALGORITHM = "pbkdf2_sha256"
+DEFAULT_ITERATIONS = int(os.environ.get("SCHOLARSYNC_HASH_ITERATIONS", 200000))
+SALT_BYTES = 16
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(2, os.cpu_count() or 1),
+                                           thread_name_prefix="credentials")
+        return _executor
+
+
+def hash_password(password, iterations=None):
+    iterations = iterations or DEFAULT_ITERATIONS
+    salt = secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def hash_many(passwords, iterations=None):
+    # Hashes a batch of passwords on the thread pool, keeping their order; existing hashes pass through
+    return list(_pool().map(lambda password: password if is_hash(password) else hash_password(password, iterations),
+                            passwords))
+
+
+def is_hash(value):
+    return isinstance(value, str) and value.startswith(ALGORITHM + "$") and value.count("$") == 3
+
+
+def check_hash(password, encoded):
+    try:
+        _, iterations, salt, expected = encoded.split("$")
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+class VerifiedCache:
+    # Bounded, short-lived memory of (stored hash, password) pairs that verified successfully.
+    # Keys are keyed HMACs, so no password is kept in memory in the clear.
+
+    def __init__(self, max_size=4096, ttl=300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # Dict with key as key and expiry time as value
+        self.secret = secrets.token_bytes(32)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, encoded, password):
+        message = encoded.encode("utf-8") + b"\0" + password.encode("utf-8")
+        return hmac.new(self.secret, message, hashlib.sha256).digest()
+
+    def contains(self, encoded, password):
+        key = self._key(encoded, password)
+        with self.lock:
+            expiry = self.entries.get(key)
+            if expiry is not None and expiry > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True
+            if expiry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return False
+
+    def add(self, encoded, password):
+        key = self._key(encoded, password)
+        with self.lock:
+            self.entries[key] = time.monotonic() + self.ttl
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+verified_cache = VerifiedCache()
+
+
+class Credential:
+    __slots__ = ("_encoded",)
+
+    def __init__(self, password="", iterations=None):
+        # Always hashes password, even one shaped like a hash; stored hashes go through from_hash.
+        # The empty default is only hashed when first saved, since most objects made without a
+        # password get one straight away or are built to be restored from a record.
+        self._encoded = hash_password(password, iterations) if password else None
+
+    @classmethod
+    def from_hash(cls, encoded):
+        # For a hash saved by this module, e.g. in a journal record or a bulk import file
+        if not is_hash(encoded):
+            raise ValueError("Not a password hash")
+        credential = cls.__new__(cls)
+        credential._encoded = encoded
+        return credential
+
+    @property
+    def encoded(self):
+        if self._encoded is None:
+            self._encoded = hash_password("")
+        return self._encoded
+
+    def verify(self, password):
+        if self._encoded is None:
+            return password == ""
+        if verified_cache.contains(self._encoded, password):
+            return True
+        if check_hash(password, self._encoded):
+            verified_cache.add(self._encoded, password)
+            return True
+        return False
+
+    def verify_async(self, password):
+        # Returns a concurrent.futures.Future; wrap it with asyncio.wrap_future in async code
+        return _pool().submit(self.verify, password)
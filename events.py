@@ -0,0 +1,233 @@
+import logging
+import threading
+import time
+
+# In-process change events for the School.
+#
+# The School publishes an event after each change: a grade set or removed, a student enrolled or
+# removed, a fee posted, a class or teacher added or removed. Subscribers are called right away,
+# on the thread that made the change and while its class lock is still held, so they see changes
+# to one class in the order they happened. Subscribers must be quick and must not wait on other
+# threads. An exception from a subscriber is logged and goes no further: the change still stands,
+# is still journaled, and the other subscribers still get the event. Wrapping a subscriber in
+# Batch collects its events and delivers them in groups.
+#
+# Publishers check `EventType in bus.subscribers` before making an event, so a change nobody
+# listens for costs one dict lookup.
+
+log = logging.getLogger("scholarsync.events")
+
+class Event:
+    __slots__ = ()
+
+    def key(self):
+        # Events with the same key describe the same thing, so Batch keeps only the latest one.
+        # None means the event is never merged with another.
+        return None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class GradeChanged(Event):
+    __slots__ = ("entry_number", "class_no", "subject", "grade")  # grade is None when the subject was removed
+
+    def __init__(self, entry_number, class_no, subject, grade):
+        self.entry_number = entry_number
+        self.class_no = class_no
+        self.subject = subject
+        self.grade = grade
+
+    def key(self):
+        return ("grade", self.entry_number, self.subject)
+
+
+class StudentEnrolled(Event):
+    __slots__ = ("entry_number", "class_no", "student")
+
+    def __init__(self, entry_number, class_no, student):
+        self.entry_number = entry_number
+        self.class_no = class_no
+        self.student = student
+
+    def key(self):
+        return ("student", self.entry_number)
+
+
+class StudentRemoved(Event):
+    __slots__ = ("entry_number", "class_no")
+
+    def __init__(self, entry_number, class_no):
+        self.entry_number = entry_number
+        self.class_no = class_no
+
+    def key(self):
+        return ("student", self.entry_number)
+
+
+class FeeUpdated(Event):
+    __slots__ = ("entry_number", "balance", "posting_id")
+
+    def __init__(self, entry_number, balance, posting_id):
+        self.entry_number = entry_number
+        self.balance = balance
+        self.posting_id = posting_id
+
+    def key(self):
+        return ("fee", self.entry_number)
+
+
+class ClassAdded(Event):
+    __slots__ = ("class_no",)
+
+    def __init__(self, class_no):
+        self.class_no = class_no
+
+    def key(self):
+        return ("class", self.class_no)
+
+
+class ClassRemoved(Event):
+    __slots__ = ("class_no",)
+
+    def __init__(self, class_no):
+        self.class_no = class_no
+
+    def key(self):
+        return ("class", self.class_no)
+
+
+class TeacherAdded(Event):
+    __slots__ = ("teacher_id", "teacher")
+
+    def __init__(self, teacher_id, teacher):
+        self.teacher_id = teacher_id
+        self.teacher = teacher
+
+    def key(self):
+        return ("teacher", self.teacher_id)
+
+
+class TeacherRemoved(Event):
+    __slots__ = ("teacher_id",)
+
+    def __init__(self, teacher_id):
+        self.teacher_id = teacher_id
+
+    def key(self):
+        return ("teacher", self.teacher_id)
+
+
+class TeacherAssigned(Event):
+    __slots__ = ("teacher_id", "class_no", "teaching")  # teaching is False when the class was taken away
+
+    def __init__(self, teacher_id, class_no, teaching):
+        self.teacher_id = teacher_id
+        self.class_no = class_no
+        self.teaching = teaching
+
+    def key(self):
+        return ("assignment", self.teacher_id, self.class_no)
+
+
+class SchoolReset(Event):
+    # The whole school was replaced from a snapshot; events for the new contents follow
+    __slots__ = ()
+
+
+EVENT_TYPES = (GradeChanged, StudentEnrolled, StudentRemoved, FeeUpdated, ClassAdded, ClassRemoved, TeacherAdded,
+               TeacherRemoved, TeacherAssigned, SchoolReset)
+
+
+class EventBus:
+    def __init__(self):
+        # Dict with event type as key and tuple of callbacks as value. Copy-on-write, so publish
+        # reads it without a lock.
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback, *event_types):
+        # Calls callback(event) for each event of the given types (default: every type)
+        with self.lock:
+            subscribers = dict(self.subscribers)
+            for event_type in event_types or EVENT_TYPES:
+                subscribers[event_type] = subscribers.get(event_type, ()) + (callback,)
+            self.subscribers = subscribers
+        return callback
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            subscribers = {}
+            for event_type, callbacks in self.subscribers.items():
+                callbacks = tuple(c for c in callbacks if c is not callback)
+                if callbacks:
+                    subscribers[event_type] = callbacks
+            self.subscribers = subscribers
+
+    def publish(self, event):
+        for callback in self.subscribers.get(type(event), ()):
+            try:
+                callback(event)
+            except Exception:
+                log.exception("Subscriber %r failed on %r", callback, event)
+
+
+class Batch:
+    # Subscriber that collects events and passes them to handler(events) as a list: once max_size
+    # are waiting, once the oldest has waited max_delay seconds, or when flush() is called. A batch
+    # that is due by max_delay is delivered by a timer thread if no later event arrives first.
+    # With coalesce on, an event replaces any waiting event with the same key, and the list is in
+    # order of each key's latest change.
+    def __init__(self, handler, max_size=1000, max_delay=None, coalesce=True):
+        self.handler = handler
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.coalesce = coalesce
+        self.pending = {}  # Dict with event key (or a sequence number) as key and event as value
+        self.sequence = 0
+        self.oldest = None  # When the oldest waiting event arrived
+        self.timer = None  # Delivers the waiting events max_delay after the oldest arrived
+        self.received = 0
+        self.delivered = 0
+        # Held while handler runs too, so batches are delivered one at a time and in order
+        self.lock = threading.RLock()
+
+    def __call__(self, event):
+        with self.lock:
+            self.received += 1
+            key = event.key() if self.coalesce else None
+            if key is None:
+                self.sequence += 1
+                key = self.sequence
+            else:
+                self.pending.pop(key, None)
+            self.pending[key] = event
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+                if self.max_delay is not None:
+                    self.timer = threading.Timer(self.max_delay, self._expire, (self.oldest,))
+                    self.timer.daemon = True
+                    self.timer.start()
+            if len(self.pending) >= self.max_size or (
+                    self.max_delay is not None and time.monotonic() - self.oldest >= self.max_delay):
+                self.flush()
+
+    def _expire(self, oldest):
+        with self.lock:
+            # The batch this timer was started for may have gone already
+            if self.oldest == oldest:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            if not self.pending:
+                return
+            events = list(self.pending.values())
+            self.pending = {}
+            self.oldest = None
+            self.delivered += len(events)
+            self.handler(events)
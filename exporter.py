@@ -0,0 +1,120 @@
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+
+from main import Interface
+
+# Streaming export of fee records, rosters and gradebooks to CSV or JSONL.
+# Rows come from generators and are written in fixed-size chunks, so memory use does not
+# grow with the size of the school.
+
+CHUNK_SIZE = 64 * 1024
+
+FIELDS = {
+    "fees": ["class_no", "entry_number", "name", "fees"],
+    "roster": ["class_no", "entry_number", "name", "gpa"],
+    "gradebook": ["class_no", "entry_number", "name", "subject", "grade"],
+}
+
+
+def iter_fee_records(school):
+    for class_no, classroom in school.classes.items():
+        for entry_number, student in classroom.students.items():
+            yield {"class_no": class_no, "entry_number": entry_number, "name": student.name, "fees": student.fees}
+
+
+def iter_roster(school):
+    for class_no, classroom in school.classes.items():
+        for student in classroom.iter_students():
+            yield {"class_no": class_no, "entry_number": student.entry_number, "name": student.name,
+                   "gpa": round(student.gpa, 2)}
+
+
+def iter_gradebook(school):
+    for class_no, classroom in school.classes.items():
+        for entry_number, student in classroom.students.items():
+            for subject, grade in student.subjects:
+                yield {"class_no": class_no, "entry_number": entry_number, "name": student.name,
+                       "subject": subject, "grade": grade}
+
+
+EXPORTS = {
+    "fees": iter_fee_records,
+    "roster": iter_roster,
+    "gradebook": iter_gradebook,
+}
+
+
+def open_output(destination, compress=False):
+    # Returns (binary file object, whether we opened it and must close it)
+    if destination == "-":
+        out = sys.stdout.buffer
+        return (gzip.GzipFile(fileobj=out, mode="wb") if compress else out), compress
+    if not isinstance(destination, (str, os.PathLike)):
+        return (gzip.GzipFile(fileobj=destination, mode="wb") if compress else destination), compress
+    if compress or str(destination).endswith(".gz"):
+        return gzip.open(destination, "wb"), True
+    return open(destination, "wb"), True
+
+
+def write_rows(rows, out, fmt, fieldnames, chunk_size=CHUNK_SIZE):
+    # Writes rows to a binary file object in chunks of about chunk_size bytes and returns the row count
+    buffer = io.StringIO()
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps(row, separators=(",", ":")))
+            buffer.write("\n")
+
+    for row in rows:
+        write(row)
+        count += 1
+        if buffer.tell() >= chunk_size:
+            out.write(buffer.getvalue().encode("utf-8"))
+            buffer.seek(0)
+            buffer.truncate()
+    out.write(buffer.getvalue().encode("utf-8"))
+    out.flush()
+    return count
+
+
+def export(school, kind, destination, fmt=None, compress=False, chunk_size=CHUNK_SIZE):
+    if fmt is None:
+        name = str(destination)
+        if name.endswith(".gz"):
+            name = name[:-3]
+        fmt = "jsonl" if name.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+    out, owned = open_output(destination, compress)
+    try:
+        return write_rows(EXPORTS[kind](school), out, fmt, FIELDS[kind], chunk_size)
+    finally:
+        if owned:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ScholarSync records to CSV or JSONL.")
+    parser.add_argument("kind", choices=sorted(EXPORTS))
+    parser.add_argument("destination", help="Output file, or - for standard output")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument("--gzip", action="store_true", help="Compress the output (implied by a .gz name)")
+    parser.add_argument("--data-dir", default=os.environ.get("SCHOLARSYNC_DATA", "scholarsync_data"))
+    args = parser.parse_args()
+
+    interface = Interface(args.data_dir)
+    count = export(interface.school, args.kind, args.destination, args.format, args.gzip)
+    interface.close()
+    if args.destination != "-":
+        print(f"Exported {count} rows to {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
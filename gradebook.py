@@ -0,0 +1,285 @@
+import threading
+from array import array
+
+from events import GradeChanged, SchoolReset, StudentEnrolled, StudentRemoved
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; queries fall back to plain Python
+    np = None
+
+# Optional columnar copy of every grade in a school, for fast school-wide statistics.
+#
+# Each grade is one row in three parallel arrays: student index, subject id and grade. Once
+# attach() has been called it follows the School's grade and roster change events. Queries read
+# the arrays as NumPy views when NumPy is installed.
+
+
+class Gradebook:
+    def __init__(self):
+        self.student_ids = {}  # Dict with entry_number as key and student index as value
+        self.entry_numbers = array("q")  # entry_number of each student index
+        self.student_class = array("i")  # Class id of each student index, -1 once removed
+        self.class_ids = {}  # Dict with class_no as key and class id as value
+        self.subject_ids = {}  # Dict with subject as key and subject id as value
+        self.subjects = []  # Subject name of each subject id
+        self.row_student = array("i")
+        self.row_subject = array("i")
+        self.row_grade = array("d")
+        self.rows = {}  # Dict with (student index, subject id) as key and row number as value
+        # Writers from different classes can arrive at once, and NumPy views of the arrays must
+        # not be alive while they grow, so changes and queries both take this lock
+        self.lock = threading.Lock()
+
+    @classmethod
+    def attach(cls, school):
+        gradebook = cls()
+        # Subscribe first so a change made while loading is applied again afterwards, not missed
+        school.events.subscribe(gradebook.on_event, GradeChanged, StudentEnrolled, StudentRemoved, SchoolReset)
+        for class_no, classroom in school.classes.items():
+            for student in classroom.students.values():
+                gradebook.add_student(student, class_no)
+        school.gradebook = gradebook
+        return gradebook
+
+    def on_event(self, event):
+        kind = type(event)
+        if kind is GradeChanged:
+            if event.grade is None:
+                self.remove_grade(event.entry_number, event.subject)
+            else:
+                self.set_grade(event.entry_number, event.subject, event.grade)
+        elif kind is StudentEnrolled:
+            self.add_student(event.student, event.class_no)
+        elif kind is StudentRemoved:
+            self.remove_student(event.entry_number)
+        elif kind is SchoolReset:
+            self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.student_ids = {}
+            self.entry_numbers = array("q")
+            self.student_class = array("i")
+            self.class_ids = {}
+            self.subject_ids = {}
+            self.subjects = []
+            self.row_student = array("i")
+            self.row_subject = array("i")
+            self.row_grade = array("d")
+            self.rows = {}
+
+    def __len__(self):
+        return len(self.row_grade)
+
+    def _class_id(self, class_no):
+        class_id = self.class_ids.get(class_no)
+        if class_id is None:
+            class_id = self.class_ids[class_no] = len(self.class_ids)
+        return class_id
+
+    def _subject_id(self, subject):
+        subject_id = self.subject_ids.get(subject)
+        if subject_id is None:
+            subject_id = self.subject_ids[subject] = len(self.subjects)
+            self.subjects.append(subject)
+        return subject_id
+
+    def _student_id(self, entry_number, class_no):
+        student_id = self.student_ids.get(entry_number)
+        if student_id is None:
+            student_id = self.student_ids[entry_number] = len(self.entry_numbers)
+            self.entry_numbers.append(entry_number)
+            self.student_class.append(self._class_id(class_no))
+        else:
+            self.student_class[student_id] = self._class_id(class_no)
+        return student_id
+
+    def add_student(self, student, class_no):
+        with self.lock:
+            student_id = self._student_id(student.entry_number, class_no)
+            for subject, grade in student.subjects:
+                self._set_grade(student_id, subject, grade)
+
+    def remove_student(self, entry_number):
+        with self.lock:
+            student_id = self.student_ids.get(entry_number)
+            if student_id is None:
+                return
+            for subject_id in range(len(self.subjects)):
+                row = self.rows.pop((student_id, subject_id), None)
+                if row is not None:
+                    self._remove_row(row)
+            self.student_class[student_id] = -1
+
+    def set_grade(self, entry_number, subject, grade):
+        with self.lock:
+            student_id = self.student_ids.get(entry_number)
+            if student_id is not None:
+                self._set_grade(student_id, subject, grade)
+
+    def _set_grade(self, student_id, subject, grade):
+        key = (student_id, self._subject_id(subject))
+        row = self.rows.get(key)
+        if row is None:
+            self.rows[key] = len(self.row_grade)
+            self.row_student.append(key[0])
+            self.row_subject.append(key[1])
+            self.row_grade.append(grade)
+        else:
+            self.row_grade[row] = grade
+
+    def remove_grade(self, entry_number, subject):
+        with self.lock:
+            student_id = self.student_ids.get(entry_number)
+            subject_id = self.subject_ids.get(subject)
+            if student_id is None or subject_id is None:
+                return
+            row = self.rows.pop((student_id, subject_id), None)
+            if row is not None:
+                self._remove_row(row)
+
+    def _remove_row(self, row):
+        # Moves the last row into the hole so the columns stay dense
+        last = len(self.row_grade) - 1
+        if row != last:
+            self.row_student[row] = self.row_student[last]
+            self.row_subject[row] = self.row_subject[last]
+            self.row_grade[row] = self.row_grade[last]
+            self.rows[(self.row_student[row], self.row_subject[row])] = row
+        self.row_student.pop()
+        self.row_subject.pop()
+        self.row_grade.pop()
+
+    # Queries. Each one holds the lock while it reads, so a grade change waits for it to finish.
+
+    def _columns(self):
+        # Zero-copy NumPy views of the columns, only valid while the lock is held
+        if not len(self.row_grade):
+            return np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(0)
+        return (np.frombuffer(self.row_student, dtype=np.int32),
+                np.frombuffer(self.row_subject, dtype=np.int32),
+                np.frombuffer(self.row_grade, dtype=np.float64))
+
+    def subject_stats(self, subject, percentiles=(25, 50, 75, 90)):
+        # Returns {"count", "mean", "median", "percentiles": {p: value}} for one subject, or None
+        with self.lock:
+            subject_id = self.subject_ids.get(subject)
+            if subject_id is None:
+                return None
+            if np is None:
+                grades = sorted(g for s, g in zip(self.row_subject, self.row_grade) if s == subject_id)
+                return _stats(grades, percentiles)
+            _, subjects, grades = self._columns()
+            grades = grades[subjects == subject_id]
+            if not len(grades):
+                return None
+            values = np.percentile(grades, [50, *percentiles])
+            return {"count": int(len(grades)), "mean": float(grades.mean()), "median": float(values[0]),
+                    "percentiles": {p: float(v) for p, v in zip(percentiles, values[1:])}}
+
+    def class_distribution(self, class_no, bins=10):
+        # Returns how many of the class's grades fall in each of `bins` equal ranges over 0-100
+        with self.lock:
+            class_id = self.class_ids.get(class_no)
+            if class_id is None:
+                return [0] * bins
+            if np is None:
+                counts = [0] * bins
+                for student_id, grade in zip(self.row_student, self.row_grade):
+                    if self.student_class[student_id] == class_id:
+                        counts[min(bins - 1, int(grade * bins / 100))] += 1
+                return counts
+            students, _, grades = self._columns()
+            classes = np.frombuffer(self.student_class, dtype=np.int32)
+            grades = grades[classes[students] == class_id]
+            buckets = np.minimum((grades * bins / 100).astype(np.int64), bins - 1)
+            return np.bincount(buckets, minlength=bins).tolist()
+
+    def _averages(self):
+        # Returns (student indexes that have grades, their average grade)
+        if np is None:
+            totals = {}
+            for student_id, grade in zip(self.row_student, self.row_grade):
+                total, count = totals.get(student_id, (0.0, 0))
+                totals[student_id] = (total + grade, count + 1)
+            ids = list(totals)
+            return ids, [totals[i][0] / totals[i][1] for i in ids]
+        students, _, grades = self._columns()
+        sums = np.bincount(students, weights=grades, minlength=len(self.entry_numbers))
+        counts = np.bincount(students, minlength=len(self.entry_numbers))
+        ids = np.nonzero(counts)[0]
+        return ids, sums[ids] / counts[ids]
+
+    def top_students(self, n=10):
+        # Returns [(entry_number, average grade)] for the n best averages, best first
+        with self.lock:
+            ids, averages = self._averages()
+            if np is None:
+                ranked = sorted(zip(ids, averages), key=lambda item: (-item[1], self.entry_numbers[item[0]]))
+                return [(self.entry_numbers[i], average) for i, average in ranked[:n]]
+            n = min(n, len(ids))
+            if not n:
+                return []
+            # Keep every student level with the n-th best average, so ties at the cut-off are
+            # broken by entry number as in the plain Python ordering, not by argpartition
+            cutoff = -np.partition(-averages, n - 1)[n - 1]
+            best = np.nonzero(averages >= cutoff)[0]
+            entries = np.frombuffer(self.entry_numbers, dtype=np.int64)[ids[best]]
+            best = best[np.lexsort((entries, -averages[best]))][:n]
+            return [(self.entry_numbers[ids[i]], float(averages[i])) for i in best]
+
+    def failing_students(self, threshold=40.0):
+        # Returns the entry numbers whose average grade is below threshold, in entry number order
+        with self.lock:
+            ids, averages = self._averages()
+            if np is None:
+                return sorted(self.entry_numbers[i] for i, average in zip(ids, averages) if average < threshold)
+            entries = np.frombuffer(self.entry_numbers, dtype=np.int64)
+            return np.sort(entries[ids[averages < threshold]]).tolist()
+
+
+def _stats(ordered, percentiles):
+    if not ordered:
+        return None
+    return {"count": len(ordered), "mean": sum(ordered) / len(ordered), "median": percentile(ordered, 50),
+            "percentiles": {p: percentile(ordered, p) for p in percentiles}}
+
+
+def percentile(ordered, p):
+    # Linear interpolation between closest ranks, the same method as numpy.percentile's default
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * p / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+# Pure-Python reference versions that walk the School objects directly, used to check the gradebook
+
+def reference_subject_stats(school, subject, percentiles=(25, 50, 75, 90)):
+    grades = sorted(student.grades[subject] for classroom in school.classes.values()
+                    for student in classroom.students.values() if subject in student.grades)
+    return _stats(grades, percentiles)
+
+
+def reference_class_distribution(school, class_no, bins=10):
+    counts = [0] * bins
+    classroom = school.classes.get(class_no)
+    if classroom:
+        for student in classroom.students.values():
+            for grade in student.grades.values():
+                counts[min(bins - 1, int(grade * bins / 100))] += 1
+    return counts
+
+
+def reference_top_students(school, n=10):
+    averages = [(student.entry_number, student.gpa) for classroom in school.classes.values()
+                for student in classroom.students.values() if student.grades]
+    return sorted(averages, key=lambda item: (-item[1], item[0]))[:n]
+
+
+def reference_failing_students(school, threshold=40.0):
+    return sorted(student.entry_number for classroom in school.classes.values()
+                  for student in classroom.students.values() if student.grades and student.gpa < threshold)
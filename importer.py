@@ -0,0 +1,310 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+from credentials import hash_many
+from main import Classroom, Interface, Student, Teacher
+from ranks import valid_entry_number
+
+# Non-interactive bulk import of classes, students, teachers and grades from CSV or JSONL files.
+#
+# classes:  class_no, incharge
+# students: class_no, name, entry_number, password, subjects ("Math=90;English=85" in CSV,
+#           an object {"Math": 90} in JSONL)
+# teachers: teacher_id, name, subject, classes (space-separated in CSV, a list in JSONL), password
+# grades:   entry_number, subject, grade
+#
+# A password may be given in the clear or already hashed by credentials.hash_password. Plaintext
+# passwords are hashed row by row at the full PBKDF2 cost (about 36ms each at the default 200,000
+# iterations, spread over the credential thread pool), so for large files hash them beforehand.
+#
+# Rows are read lazily and applied in batches. A bad row is reported and skipped; the rest
+# of the file is still imported.
+
+
+class ImportReport:
+    def __init__(self, kind):
+        self.kind = kind
+        self.imported = 0
+        self.errors = []  # List of (line number, message) tuples
+        self.elapsed = 0.0
+
+    def add_error(self, line_no, message):
+        self.errors.append((line_no, message))
+
+    def rows_per_second(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"Imported {self.imported} {self.kind} with {len(self.errors)} errors "
+                f"in {self.elapsed:.2f}s ({self.rows_per_second():.0f} rows/s)")
+
+
+def detect_format(path):
+    return "jsonl" if path.endswith((".jsonl", ".json", ".ndjson")) else "csv"
+
+
+def read_rows(path, fmt=None):
+    # Yields (line number, row dict, error message) without loading the whole file
+    fmt = fmt or detect_format(path)
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row, None
+        else:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield line_no, None, "Invalid JSON"
+                    continue
+                if not isinstance(row, dict):
+                    yield line_no, None, "Expected a JSON object"
+                    continue
+                yield line_no, row, None
+
+
+def batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _field(row, name, required=True, types=(str,)):
+    # JSONL rows can hold any JSON value, so the type is checked here before anything uses it
+    value = row.get(name)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, types)):
+        raise ValueError(f"Invalid {name}")
+    if isinstance(value, str):
+        value = value.strip()
+    if required and value in (None, ""):
+        raise ValueError(f"Missing {name}")
+    return value
+
+
+def _int_field(row, name):
+    value = _field(row, name, types=(str, int))
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}")
+
+
+def parse_grade(value, subject):
+    try:
+        grade = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid grade for {subject}")
+    if grade < 0 or grade > 100:
+        raise ValueError(f"Invalid grade for {subject}")
+    return grade
+
+
+def parse_subjects(value):
+    if value in (None, ""):
+        return []
+    if isinstance(value, dict):
+        pairs = value.items()
+    elif isinstance(value, list):
+        pairs = value
+        if not all(isinstance(pair, list) and len(pair) == 2 for pair in pairs):
+            raise ValueError("Invalid subjects")
+    elif isinstance(value, str):
+        pairs = []
+        for item in str(value).split(";"):
+            if not item.strip():
+                continue
+            subject, sep, grade = item.partition("=")
+            if not sep:
+                raise ValueError(f"Invalid subject entry '{item.strip()}'")
+            pairs.append((subject.strip(), grade.strip()))
+    else:
+        raise ValueError("Invalid subjects")
+    for subject, _ in pairs:
+        if not isinstance(subject, str) or not subject:
+            raise ValueError("Invalid subjects")
+    return [(subject, parse_grade(grade, subject)) for subject, grade in pairs]
+
+
+def import_classes(school, path, fmt=None, batch_size=1000):
+    report = ImportReport("classes")
+    start = time.perf_counter()
+    for batch in batches(read_rows(path, fmt), batch_size):
+        for line_no, row, error in batch:
+            if error:
+                report.add_error(line_no, error)
+                continue
+            try:
+                class_no = _field(row, "class_no")
+                if class_no in school.classes:
+                    raise ValueError(f"Class {class_no} already exists")
+                classroom = Classroom(class_no, _field(row, "incharge", required=False) or "")
+            except ValueError as e:
+                report.add_error(line_no, str(e))
+                continue
+            school.add_class(classroom)
+            report.imported += 1
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def import_students(school, path, fmt=None, batch_size=1000):
+    report = ImportReport("students")
+    start = time.perf_counter()
+    for batch in batches(read_rows(path, fmt), batch_size):
+        valid_rows = []
+        batch_entries = set()
+        for line_no, row, error in batch:
+            if error:
+                report.add_error(line_no, error)
+                continue
+            try:
+                class_no = _field(row, "class_no")
+                if class_no not in school.classes:
+                    raise ValueError(f"Class {class_no} does not exist")
+                entry_number = _int_field(row, "entry_number")
+                if not valid_entry_number(entry_number):
+                    raise ValueError("Invalid entry_number")
+                if entry_number in batch_entries or school.find_student(entry_number):
+                    raise ValueError(f"Entry number {entry_number} already exists")
+                name = _field(row, "name")
+                password = _field(row, "password", required=False) or ""
+                subjects = parse_subjects(row.get("subjects"))
+            except ValueError as e:
+                report.add_error(line_no, str(e))
+                continue
+            batch_entries.add(entry_number)
+            valid_rows.append((class_no, name, entry_number, password, subjects))
+
+        # Hash the whole batch's passwords on the credential thread pool
+        passwords = hash_many([password for _, _, _, password, _ in valid_rows])
+        new_students = {}  # Dict with class_no as key and list of new students as value
+        for (class_no, name, entry_number, _, subjects), password in zip(valid_rows, passwords):
+            student = Student(name, class_no, entry_number, encoded=password)
+            if subjects:
+                student.add_subjects(subjects)
+            new_students.setdefault(class_no, []).append(student)
+
+        for class_no, students in new_students.items():
+            school.classes[class_no].add_students(students)
+            report.imported += len(students)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def import_teachers(school, path, fmt=None, batch_size=1000):
+    report = ImportReport("teachers")
+    start = time.perf_counter()
+    for batch in batches(read_rows(path, fmt), batch_size):
+        valid_rows = []
+        batch_ids = set()
+        for line_no, row, error in batch:
+            if error:
+                report.add_error(line_no, error)
+                continue
+            try:
+                teacher_id = _int_field(row, "teacher_id")
+                if teacher_id in batch_ids or teacher_id in school.teachers:
+                    raise ValueError(f"Teacher ID {teacher_id} already exists")
+                classes = _field(row, "classes", required=False, types=(str, list)) or []
+                if isinstance(classes, str):
+                    classes = classes.split()
+                for class_no in classes:
+                    if not isinstance(class_no, str):
+                        raise ValueError("Invalid classes")
+                    if class_no not in school.classes:
+                        raise ValueError(f"Class {class_no} does not exist")
+                name = _field(row, "name")
+                subject = _field(row, "subject")
+                password = _field(row, "password", required=False) or ""
+            except ValueError as e:
+                report.add_error(line_no, str(e))
+                continue
+            batch_ids.add(teacher_id)
+            valid_rows.append((teacher_id, name, subject, classes, password))
+
+        # Hash the whole batch's passwords on the credential thread pool, as for students
+        passwords = hash_many([password for _, _, _, _, password in valid_rows])
+        for (teacher_id, name, subject, classes, _), password in zip(valid_rows, passwords):
+            teacher = Teacher(name, subject, list(classes), encoded=password)
+            teacher.teacher_id = teacher_id
+            school.add_teacher(teacher)
+            report.imported += 1
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def import_grades(school, path, fmt=None, batch_size=1000):
+    report = ImportReport("grades")
+    start = time.perf_counter()
+    for batch in batches(read_rows(path, fmt), batch_size):
+        # Dict with (Classroom, subject) as key and list of (line number, entry_number, grade) as value,
+        # so each class gets one set_grades call, and one journal record, per subject
+        new_grades = {}
+        for line_no, row, error in batch:
+            if error:
+                report.add_error(line_no, error)
+                continue
+            try:
+                entry_number = _int_field(row, "entry_number")
+                classroom = school.find_student_class(entry_number)
+                if not classroom:
+                    raise ValueError(f"Student {entry_number} not found")
+                subject = _field(row, "subject")
+                grade = parse_grade(row.get("grade"), subject)
+            except ValueError as e:
+                report.add_error(line_no, str(e))
+                continue
+            new_grades.setdefault((classroom, subject), []).append((line_no, entry_number, grade))
+
+        for (classroom, subject), rows in new_grades.items():
+            errors = classroom.set_grades(subject, [(entry_number, grade) for _, entry_number, grade in rows])
+            if errors:
+                # set_grades applies all or nothing, so every row of the group is reported
+                message = "; ".join(message for _, message in errors)
+                for line_no, _, _ in rows:
+                    report.add_error(line_no, message)
+            else:
+                report.imported += len(rows)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+IMPORTERS = {
+    "classes": import_classes,
+    "students": import_students,
+    "teachers": import_teachers,
+    "grades": import_grades,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import records into ScholarSync.")
+    parser.add_argument("kind", choices=sorted(IMPORTERS))
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--data-dir", default=os.environ.get("SCHOLARSYNC_DATA", "scholarsync_data"))
+    args = parser.parse_args()
+
+    interface = Interface(args.data_dir)
+    report = IMPORTERS[args.kind](interface.school, args.path, args.format, args.batch_size)
+    interface.close()
+
+    for line_no, message in report.errors:
+        print(f"Line {line_no}: {message}")
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
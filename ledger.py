@@ -0,0 +1,263 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+# Fee ledger: every charge, payment, waiver and adjustment posted to a student's fee account.
+#
+# A posting is one (posting_id, kind, amount, memo, posted_at) tuple. A term fee charged to a
+# whole class is a single posting shared by every student it applies to, so history costs one
+# list slot per student. Each student's balance is kept up to date as postings are applied, and
+# a BalanceIndex keeps the balances in order so dues reports read only the students they return.
+# The School applies postings through post_fee/post_term_fee and keeps Student.fees equal to
+# the balance here.
+
+CHARGE, PAYMENT, WAIVER, ADJUSTMENT = "charge", "payment", "waiver", "adjustment"
+KINDS = (CHARGE, PAYMENT, WAIVER, ADJUSTMENT)
+
+BLOCK = 512  # Target length of each BalanceIndex block
+REBUILD_FRACTION = 4  # A batch moving more than 1/4 of the index rebuilds it with one sort instead
+
+
+def signed(kind, amount):
+    # Charges raise the balance, payments and waivers lower it, adjustments carry their own sign
+    return -amount if kind in (PAYMENT, WAIVER) else amount
+
+
+class BalanceIndex:
+    # (-balance, entry_number) pairs in sorted order, so the largest balance comes first and ties
+    # go by entry number. They are held as a list of short sorted blocks, so adding or removing
+    # one pair only shifts the pairs of one block rather than the whole list.
+    def __init__(self, items=()):
+        self.load(items)
+
+    def __len__(self):
+        return self.size
+
+    def load(self, items):
+        items = sorted(items)
+        self.blocks = [items[i:i + BLOCK] for i in range(0, len(items), BLOCK)]
+        self.maxes = [block[-1] for block in self.blocks]
+        self.size = len(items)
+
+    def add(self, item):
+        blocks = self.blocks
+        if not blocks:
+            blocks.append([item])
+            self.maxes.append(item)
+        else:
+            i = bisect_left(self.maxes, item)
+            if i == len(blocks):
+                i -= 1
+                blocks[i].append(item)
+                self.maxes[i] = item
+            else:
+                insort(blocks[i], item)
+            block = blocks[i]
+            if len(block) > 2 * BLOCK:
+                blocks[i:i + 1] = [block[:BLOCK], block[BLOCK:]]
+                self.maxes[i:i + 1] = [block[BLOCK - 1], block[-1]]
+        self.size += 1
+
+    def remove(self, item):
+        i = bisect_left(self.maxes, item)
+        block = self.blocks[i]
+        del block[bisect_left(block, item)]
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+        self.size -= 1
+
+    def head(self, stop_key=None):
+        # Yields the pairs in order, stopping before the first one that is not below stop_key
+        blocks = self.blocks
+        last = len(blocks) if stop_key is None else min(len(blocks), bisect_left(self.maxes, stop_key) + 1)
+        for i in range(last):
+            block = blocks[i]
+            if stop_key is None or i < last - 1:
+                yield from block
+            else:
+                yield from block[:bisect_left(block, stop_key)]
+
+    def count_below(self, key):
+        # Number of pairs that sort before key
+        i = bisect_left(self.maxes, key)
+        count = sum(len(block) for block in self.blocks[:i])
+        if i < len(self.blocks):
+            count += bisect_left(self.blocks[i], key)
+        return count
+
+
+class FeeLedger:
+    def __init__(self):
+        self.balances = {}  # Dict with entry_number as key and balance as value
+        self.index = BalanceIndex()
+        self.history = {}  # Dict with entry_number as key and list of postings as value, oldest first
+        self.postings = {}  # Dict with posting_id as key and posting as value, for postings in some history
+        self.refs = {}  # Dict with posting_id as key and number of histories holding the posting as value
+        self.next_id = 1
+        self.owed_total = 0  # Sum of the balances above zero
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.balances)
+
+    def add_student(self, entry_number, balance):
+        # Starts tracking a student whose account stands at balance; any earlier history is kept
+        with self.lock:
+            self._drop(entry_number)
+            self.balances[entry_number] = balance
+            self.index.add((-balance, entry_number))
+            self.owed_total += max(balance, 0)
+
+    def remove_student(self, entry_number):
+        with self.lock:
+            self._drop(entry_number)
+            for posting in self.history.pop(entry_number, ()):
+                self._release(posting[0])
+
+    def _release(self, posting_id):
+        # Forgets a posting once no student's history holds it
+        refs = self.refs[posting_id] - 1
+        if refs:
+            self.refs[posting_id] = refs
+        else:
+            del self.refs[posting_id]
+            del self.postings[posting_id]
+
+    def _drop(self, entry_number):
+        balance = self.balances.pop(entry_number, None)
+        if balance is not None:
+            self.index.remove((-balance, entry_number))
+            self.owed_total -= max(balance, 0)
+
+    def balance(self, entry_number):
+        return self.balances.get(entry_number)
+
+    def posting(self, kind, amount, memo="", posting_id=None, posted_at=None):
+        # Returns a new posting, or the one already applied under posting_id (when a journal is
+        # replayed). A posting is kept once apply has given it to a student.
+        if kind not in KINDS:
+            raise ValueError(f"Unknown fee transaction kind: {kind}")
+        with self.lock:
+            if posting_id is None:
+                posting_id = self.next_id
+            elif posting_id in self.postings:
+                return self.postings[posting_id]
+            self.next_id = max(self.next_id, posting_id + 1)
+            return posting_id, kind, amount, memo, time.time() if posted_at is None else posted_at
+
+    def apply(self, posting, entry_numbers):
+        # Applies a posting to each listed student and returns {entry_number: new balance}.
+        # Students the ledger does not track are skipped.
+        delta = signed(posting[1], posting[2])
+        with self.lock:
+            balances = self.balances
+            changed = {entry_number: balances[entry_number] + delta
+                       for entry_number in entry_numbers if entry_number in balances}
+            if len(changed) * REBUILD_FRACTION > len(balances):
+                for entry_number, balance in changed.items():
+                    self._move(entry_number, balance, False)
+                self.index.load((-balance, entry_number) for entry_number, balance in balances.items())
+            else:
+                for entry_number, balance in changed.items():
+                    self._move(entry_number, balance, True)
+            for entry_number in changed:
+                history = self.history.get(entry_number)
+                if history is None:
+                    self.history[entry_number] = [posting]
+                else:
+                    history.append(posting)
+            if changed:
+                posting_id = posting[0]
+                self.postings[posting_id] = posting
+                self.refs[posting_id] = self.refs.get(posting_id, 0) + len(changed)
+            return changed
+
+    def _move(self, entry_number, balance, reindex):
+        old = self.balances[entry_number]
+        self.balances[entry_number] = balance
+        self.owed_total += max(balance, 0) - max(old, 0)
+        if reindex:
+            self.index.remove((-old, entry_number))
+            self.index.add((-balance, entry_number))
+
+    # Reports. These read the balance index, so they cost the number of students returned.
+
+    def owing_more_than(self, amount, limit=None):
+        # Returns [(entry_number, balance)] for balances above amount, largest first
+        with self.lock:
+            results = []
+            for negative, entry_number in self.index.head((-amount, float("-inf"))):
+                if limit is not None and len(results) >= limit:
+                    break
+                results.append((entry_number, -negative))
+            return results
+
+    def count_owing_more_than(self, amount):
+        with self.lock:
+            return self.index.count_below((-amount, float("-inf")))
+
+    def top_debtors(self, n=10):
+        with self.lock:
+            results = []
+            for negative, entry_number in self.index.head():
+                if len(results) >= n or negative >= 0:
+                    break
+                results.append((entry_number, -negative))
+            return results
+
+    def statement(self, entry_number):
+        # Returns (opening balance, [(posting, balance after it)]) for one student, oldest first
+        with self.lock:
+            balance = self.balances.get(entry_number)
+            if balance is None:
+                return None
+            history = list(self.history.get(entry_number, ()))
+        opening = balance - sum(signed(posting[1], posting[2]) for posting in history)
+        lines = []
+        running = opening
+        for posting in history:
+            running += signed(posting[1], posting[2])
+            lines.append((posting, running))
+        return opening, lines
+
+    def to_record(self):
+        # Postings shared by many students are written once and referred to by id
+        with self.lock:
+            used = {}
+            entries = []
+            for entry_number, history in self.history.items():
+                for posting in history:
+                    used[posting[0]] = posting
+                entries.append([entry_number, [posting[0] for posting in history]])
+            return {"next_id": self.next_id, "postings": [list(posting) for posting in used.values()],
+                    "history": entries}
+
+    def restore(self, record):
+        # Loads the history written by to_record; balances come from the students themselves
+        with self.lock:
+            self.next_id = max(self.next_id, record["next_id"])
+            for posting in record["postings"]:
+                self.postings[posting[0]] = tuple(posting)
+            for entry_number, posting_ids in record["history"]:
+                if entry_number in self.balances:
+                    self.history[entry_number] = [self.postings[posting_id] for posting_id in posting_ids]
+                    for posting_id in posting_ids:
+                        self.refs[posting_id] = self.refs.get(posting_id, 0) + 1
+            for posting_id in [posting_id for posting_id in self.postings if posting_id not in self.refs]:
+                del self.postings[posting_id]
+
+
+# Pure-Python reference versions that walk every student, used to check the ledger
+
+def reference_owing_more_than(school, amount, limit=None):
+    owing = sorted(((student.entry_number, student.fees) for classroom in school.classes.values()
+                    for student in classroom.students.values() if student.fees > amount),
+                   key=lambda item: (-item[1], item[0]))
+    return owing if limit is None else owing[:limit]
+
+
+def reference_top_debtors(school, n=10):
+    return reference_owing_more_than(school, 0, n)
@@ -1,158 +1,895 @@
+import csv
 import os
 import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import Future
+from contextlib import nullcontext
+from datetime import date
+
+import render
+from attendance import DEFAULT_THRESHOLD, AttendanceBook, parse_date
+from credentials import Credential
+from events import (ClassAdded, ClassRemoved, EventBus, FeeUpdated, GradeChanged, SchoolReset, StudentEnrolled,
+                    StudentRemoved, TeacherAdded, TeacherAssigned, TeacherRemoved)
+from ledger import ADJUSTMENT, CHARGE, KINDS, FeeLedger
+from ranks import REBUILD_FRACTION, ClassRanks, SchoolRanks, top_of_classes, valid_entry_number
+from search import NameIndex
+from storage import open_storage
+
+
+class OperationError(Exception):
+    # A change rejected by its checks, with the menu's message; operations re-exports it
+    pass
+
+
+def _intern(value):
+    # Subject names and class numbers repeat across thousands of records, so keep one copy of each
+    return sys.intern(value) if type(value) is str else value
+
+
+def _check_entry_numbers(students):
+    # Checked before a class or school changes, since the ranks cannot hold any other entry number
+    for student in students:
+        if not valid_entry_number(student.entry_number):
+            raise OperationError(f"Invalid entry number: {student.entry_number!r}.")
+
 
 class Student:
-    def __init__(self, name="", class_="", entry_number=0, gpa=0.0, password=""):
+    # Slots instead of a per-instance __dict__, since a school holds many thousands of these
+    __slots__ = ("name", "class_", "entry_number", "_fees", "grades", "grade_total", "classroom", "_gpa",
+                 "__password")
+
+    def __init__(self, name="", class_="", entry_number=0, gpa=0.0, password="", encoded=None):
         self.name = name
-        self.class_ = class_
+        self.class_ = _intern(class_)
         self.entry_number = entry_number
-        self.fees = 1000
-        self.subjects = []  # List of (subject, grade) tuples
-        self.gpa = gpa
-        self.__password = password
+        self._fees = 1000
+        self.grades = {}  # Dict with subject as key and grade as value
+        self.grade_total = 0.0  # Running sum of the values in grades
+        self.classroom = None  # Set by Classroom.add_student
+        self._gpa = gpa
+        # password is hashed; encoded is an already hashed one, as saved in records
+        self.__password = Credential.from_hash(encoded) if encoded else Credential(password)
+
+    @property
+    def gpa(self):
+        return self._gpa
+
+    @gpa.setter
+    def gpa(self, gpa):
+        old_gpa = self._gpa
+        self._gpa = gpa
+        if self.classroom and old_gpa != gpa:
+            self.classroom._gpa_changed(self, old_gpa, gpa)
+
+    @property
+    def fees(self):
+        return self._fees
+
+    @fees.setter
+    def fees(self, fees):
+        # Once the student is in a school, setting the fee posts an adjustment to the fee ledger
+        school = self.classroom.school if self.classroom else None
+        if school:
+            if fees != self._fees:
+                school.post_fee(self.entry_number, ADJUSTMENT, fees - self._fees, f"Fee set to ${fees}")
+        else:
+            self._fees = fees
+
+    @property
+    def subjects(self):
+        return list(self.grades.items())
+
+    @subjects.setter
+    def subjects(self, subjects):
+        with self._lock():
+            old_subjects = list(self.grades)
+            self.grades = {}
+            self.grade_total = 0.0
+            for subject, grade in subjects:
+                self._store_grade(subject, grade)
+            self.gpa = self.calculate_gpa()
+            self._grades_changed(dict.fromkeys(old_subjects + list(self.grades)))
+            self._record("set_subjects", grades=dict(self.grades))
+
+    def _lock(self):
+        # Grade changes are serialised by the student's classroom, so different classes never contend
+        classroom = self.classroom
+        return classroom.lock if classroom else nullcontext()
+
+    def _record(self, op, **fields):
+        if self.classroom and self.classroom.school:
+            self.classroom.school._record(op, entry_number=self.entry_number, **fields)
+
+    def _grades_changed(self, subjects):
+        # Publishes GradeChanged for each subject once the GPA is up to date
+        classroom = self.classroom
+        school = classroom.school if classroom else None
+        if school and GradeChanged in school.events.subscribers:
+            for subject in subjects:
+                school.events.publish(GradeChanged(self.entry_number, classroom.class_no, subject,
+                                                   self.grades.get(subject)))
+
+    def has_subject(self, subject):
+        return subject in self.grades
+
+    def get_grade(self, subject):
+        return self.grades.get(subject)
+
+    def _store_grade(self, subject, grade):
+        subject = _intern(subject)
+        old_grade = self.grades.get(subject)
+        if old_grade is not None:
+            self.grade_total -= old_grade
+        self.grades[subject] = grade
+        self.grade_total += grade
 
     def add_subject(self, subject, grade):
-        self.subjects.append((subject, grade))
-        self.gpa = self.calculate_gpa()
+        with self._lock():
+            self._store_grade(subject, grade)
+            self.gpa = self.calculate_gpa()
+            self._grades_changed((subject,))
+            self._record("set_grade", subject=subject, grade=grade)
+
+    def add_subjects(self, grades):
+        # Sets many (subject, grade) pairs and recomputes the GPA once
+        grades = dict(grades)
+        with self._lock():
+            for subject, grade in grades.items():
+                self._store_grade(subject, grade)
+            self.gpa = self.calculate_gpa()
+            self._grades_changed(grades)
+            self._record("set_grades", grades=grades)
 
     def remove_subject(self, subject):
-        self.subjects = [(s, g) for s, g in self.subjects if s != subject]
-        self.gpa = self.calculate_gpa()
+        with self._lock():
+            if subject in self.grades:
+                self.grade_total -= self.grades.pop(subject)
+                if not self.grades:
+                    self.grade_total = 0.0
+                self.gpa = self.calculate_gpa()
+                self._grades_changed((subject,))
+                self._record("remove_subject", subject=subject)
 
     def calculate_gpa(self):
-        if not self.subjects:
+        if not self.grades:
             return 0.0
-        total = sum(grade for _, grade in self.subjects)
-        return total / len(self.subjects)
-
-    def view_subjects(self):
-        print("Subjects: ")
-        if not self.subjects:
-            print("  No subjects enrolled")
-            return
+        return self.grade_total / len(self.grades)
 
+    def subject_lines(self):
+        lines = ["Subjects: "]
+        if not self.grades:
+            lines.append("  No subjects enrolled")
         for subject, grade in self.subjects:
-            print(f"  {subject} - {grade:.2f}")
+            lines.append(f"  {subject} - {grade:.2f}")
+        return lines
+
+    def view_subjects(self):
+        render.page(self.subject_lines())
 
     def authenticate(self, password):
-        return self.__password == password
+        return self.__password.verify(password)
+
+    def authenticate_async(self, password):
+        return self.__password.verify_async(password)
+
+    def info_lines(self):
+        return [
+            "",
+            "========== STUDENT INFORMATION ==========",
+            f"Name: {self.name}",
+            f"Class: {self.class_}",
+            f"Entry Number: {self.entry_number}",
+            f"GPA: {self.gpa:.2f}",
+            *self.rank_lines(),
+            f"Fees: ${self.fees}",
+            *self.attendance_lines(),
+            *self.subject_lines(),
+            "========================================",
+            "",
+        ]
+
+    def rank_lines(self):
+        classroom = self.classroom
+        if not classroom:
+            return []
+        rank, count, percentile = classroom.rank_of(self)
+        lines = [f"Class Rank: {rank} of {count} (Percentile: {percentile:.1f})"]
+        if classroom.school:
+            rank, count, percentile = classroom.school.school_rank(self)
+            lines.append(f"School Rank: {rank} of {count} (Percentile: {percentile:.1f})")
+        return lines
+
+    def attendance_lines(self):
+        school = self.classroom.school if self.classroom else None
+        present, marked = school.attendance.counts(self.entry_number) if school else (0, 0)
+        if not marked:
+            return []
+        return [f"Attendance: {present * 100.0 / marked:.1f}% ({present} of {marked} periods)"]
 
     def display_info(self):
-        print("\n========== STUDENT INFORMATION ==========")
-        print(f"Name: {self.name}")
-        print(f"Class: {self.class_}")
-        print(f"Entry Number: {self.entry_number}")
-        print(f"GPA: {self.gpa:.2f}")
-        print(f"Fees: ${self.fees}")
-        self.view_subjects()
-        print("========================================\n")
+        render.page(self.info_lines())
+
+    def fee_lines(self):
+        lines = [
+            f"Name: {self.name}",
+            f"Class: {self.class_}",
+            f"Entry Number: {self.entry_number}",
+            f"Fee Amount: ${self.fees}",
+        ]
+        school = self.classroom.school if self.classroom else None
+        statement = school.ledger.statement(self.entry_number) if school else None
+        if statement and statement[1]:
+            opening, postings = statement
+            lines.extend(["", "Transactions:", f"  Opening balance: ${opening}"])
+            for (posting_id, kind, amount, memo, posted_at), balance in postings:
+                posted_on = time.strftime("%Y-%m-%d", time.localtime(posted_at))
+                lines.append(f"  {posted_on} #{posting_id} {kind.capitalize()} ${amount}"
+                             + (f" ({memo})" if memo else "") + f", Balance: ${balance}")
+        return lines
 
     def update_password(self, old_pass, new_pass):
         if self.authenticate(old_pass):
-            self.__password = new_pass
+            self.__password = Credential(new_pass)
+            self._record("set_student_password", password=self.__password.encoded)
             return True
         return False
 
+    def restore_password(self, password):
+        self.__password = Credential.from_hash(password)
+
+    def to_record(self):
+        return {
+            "name": self.name,
+            "class_": self.class_,
+            "entry_number": self.entry_number,
+            "fees": self._fees,
+            "gpa": self._gpa,
+            "grades": dict(self.grades),
+            "password": self.__password.encoded,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        student = cls(record["name"], record["class_"], record["entry_number"], record["gpa"],
+                      encoded=record["password"])
+        student._fees = record["fees"]
+        grades = record["grades"]
+        if grades:
+            student.grades = {_intern(subject): grade for subject, grade in grades.items()}
+            student.grade_total = sum(student.grades.values())
+            student._gpa = student.calculate_gpa()
+        return student
+
 
 class Teacher:
-    def __init__(self, name="", subject="", classes_to_teach=None, password=""):
+    __slots__ = ("teacher_id", "name", "subject", "classes_to_teach", "school", "__password")
+
+    def __init__(self, name="", subject="", classes_to_teach=None, password="", encoded=None):
         self.teacher_id = 0
         self.name = name
-        self.subject = subject
-        self.classes_to_teach = classes_to_teach if classes_to_teach else []
-        self.__password = password
+        self.subject = _intern(subject)
+        # Set of class numbers, copy-on-write like Classroom.students
+        self.classes_to_teach = {_intern(class_no) for class_no in classes_to_teach} if classes_to_teach else set()
+        self.school = None  # Set by School.add_teacher
+        self.__password = Credential.from_hash(encoded) if encoded else Credential(password)
+
+    def _record(self, op, **fields):
+        if self.school:
+            self.school._record(op, teacher_id=self.teacher_id, **fields)
 
     def authenticate(self, password):
-        return self.__password == password
+        return self.__password.verify(password)
+
+    def authenticate_async(self, password):
+        return self.__password.verify_async(password)
+
+    def detail_lines(self):
+        return [
+            "",
+            "========== TEACHER INFORMATION ==========",
+            f"ID: {self.teacher_id}",
+            f"Name: {self.name}",
+            f"Subject: {self.subject}",
+            "Classes to Teach: " + (", ".join(sorted(self.classes_to_teach)) or "None"),
+            "========================================",
+            "",
+        ]
 
     def view_teacher_details(self):
-        print("\n========== TEACHER INFORMATION ==========")
-        print(f"ID: {self.teacher_id}")
-        print(f"Name: {self.name}")
-        print(f"Subject: {self.subject}")
-        print(f"Classes to Teach: ", end="")
-        if not self.classes_to_teach:
-            print("None")
-        else:
-            print(", ".join(self.classes_to_teach))
-        print("========================================\n")
+        render.page(self.detail_lines())
 
     def update_password(self, old_pass, new_pass):
         if self.authenticate(old_pass):
-            self.__password = new_pass
+            self.__password = Credential(new_pass)
+            self._record("set_teacher_password", password=self.__password.encoded)
             return True
         return False
 
+    def restore_password(self, password):
+        self.__password = Credential.from_hash(password)
+
     def add_class_to_teach(self, class_no):
         if class_no not in self.classes_to_teach:
-            self.classes_to_teach.append(class_no)
+            class_no = _intern(class_no)
+            self.classes_to_teach = self.classes_to_teach | {class_no}
+            if self.school:
+                self.school._assign_teacher(self.teacher_id, class_no)
+                if TeacherAssigned in self.school.events.subscribers:
+                    self.school.events.publish(TeacherAssigned(self.teacher_id, class_no, True))
+            self._record("add_class_to_teach", class_no=class_no)
+
+    def update_grades(self, classroom, grades):
+        # Applies grades for this teacher's subject to many students of one class at once.
+        # Returns a list of (entry_number, message) errors; nothing is changed if there are any.
+        if classroom.class_no not in self.classes_to_teach:
+            return [(None, "You don't teach this class.")]
+        return classroom.set_grades(self.subject, grades)
 
     def remove_class_to_teach(self, class_no):
         if class_no in self.classes_to_teach:
-            self.classes_to_teach.remove(class_no)
+            self.classes_to_teach = self.classes_to_teach - {class_no}
+            if self.school:
+                self.school._unassign_teacher(self.teacher_id, class_no)
+                if TeacherAssigned in self.school.events.subscribers:
+                    self.school.events.publish(TeacherAssigned(self.teacher_id, class_no, False))
+            self._record("remove_class_to_teach", class_no=class_no)
+
+    def to_record(self):
+        return {
+            "teacher_id": self.teacher_id,
+            "name": self.name,
+            "subject": self.subject,
+            "classes_to_teach": sorted(self.classes_to_teach),
+            "password": self.__password.encoded,
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        teacher = cls(record["name"], record["subject"], record["classes_to_teach"], encoded=record["password"])
+        teacher.teacher_id = record["teacher_id"]
+        return teacher
 
 
 class Classroom:
+    __slots__ = ("class_no", "incharge", "students", "roster", "school", "gpa_total", "ranks", "lock")
+
     def __init__(self, class_no, incharge):
-        self.class_no = class_no
+        self.class_no = _intern(class_no)
         self.incharge = incharge
+        # students and roster are copy-on-write: writers build a new one under self.lock and swap
+        # it in, so readers can iterate the current one without taking any lock
         self.students = {}  
+        self.roster = []  # Entry numbers of the students, kept in sorted order
+        self.school = None  # Set by School.add_class
+        self.gpa_total = 0.0  # Running sum of the students' GPAs
+        self.ranks = ClassRanks()  # The students' GPAs in rank order
+        self.lock = threading.RLock()  # Guards changes to this class and its students
 
     def add_student(self, student):
-        self.students[student.entry_number] = student
+        # Copies students and roster, as readers rely on, so it costs time in the size of the class;
+        # add_students takes many at once for one copy
+        _check_entry_numbers((student,))
+        with self.lock:
+            if student.entry_number in self.students:
+                self.remove_student(student.entry_number)
+            students = dict(self.students)
+            students[student.entry_number] = student
+            roster = list(self.roster)
+            insort(roster, student.entry_number)
+            self.students = students
+            self.roster = roster
+            student.classroom = self
+            self.gpa_total += student.gpa
+            self.ranks.add(student.entry_number, student.gpa)
+            school = self.school
+            if school:
+                school._index_student(student, self)
+                school._mark_dirty(self.class_no)
+                if school.storage:
+                    school._record("add_student", class_no=self.class_no, student=student.to_record())
 
     def remove_student(self, entry_number):
-        if entry_number in self.students:
-            del self.students[entry_number]
+        with self.lock:
+            if entry_number in self.students:
+                roster = list(self.roster)
+                del roster[bisect_left(roster, entry_number)]
+                students = dict(self.students)
+                student = students.pop(entry_number)
+                self.roster = roster
+                self.students = students
+                student.classroom = None
+                self.gpa_total -= student.gpa
+                self.ranks.remove(entry_number, student.gpa)
+                if not students:
+                    self.gpa_total = 0.0
+                school = self.school
+                if school:
+                    school._unindex_student(entry_number, self)
+                    school._mark_dirty(self.class_no)
+                    school._record("remove_student", class_no=self.class_no, entry_number=entry_number)
+
+    def add_students(self, students):
+        # Adds many new students and updates the class totals once
+        _check_entry_numbers(students)
+        with self.lock:
+            for student in students:
+                if student.entry_number in self.students:
+                    self.remove_student(student.entry_number)
+            new_students = dict(self.students)
+            roster = list(self.roster)
+            for student in students:
+                new_students[student.entry_number] = student
+                roster.append(student.entry_number)
+                student.classroom = self
+                self.gpa_total += student.gpa
+            roster.sort()
+            self.students = new_students
+            self.roster = roster
+            if len(students) * REBUILD_FRACTION > len(self.ranks):
+                self.ranks = ClassRanks(new_students.values())
+            else:
+                for student in students:
+                    self.ranks.add(student.entry_number, student.gpa)
+            school = self.school
+            if school and students:
+                for student in students:
+                    school._index_student(student, self)
+                school._mark_dirty(self.class_no)
+                if school.storage:
+                    school._record("add_students", class_no=self.class_no,
+                                   students=[student.to_record() for student in students])
+
+    def set_grades(self, subject, grades):
+        # Sets one subject's grade for many students, all or nothing.
+        # grades is an iterable of (entry_number, grade); returns a list of (entry_number, message) errors.
+        with self.lock:
+            errors = []
+            updates = {}
+            for entry_number, grade in grades:
+                try:
+                    entry_number = int(entry_number)
+                except (TypeError, ValueError):
+                    errors.append((entry_number, "Invalid entry number."))
+                    continue
+                if entry_number not in self.students:
+                    errors.append((entry_number, "Student not found in this class."))
+                    continue
+                try:
+                    grade = float(grade)
+                except (TypeError, ValueError):
+                    errors.append((entry_number, "Invalid grade."))
+                    continue
+                if grade < 0 or grade > 100:
+                    errors.append((entry_number, "Invalid grade."))
+                    continue
+                updates[entry_number] = grade
+            if errors or not updates:
+                return errors
+
+            changes = []
+            for entry_number, grade in updates.items():
+                student = self.students[entry_number]
+                old_gpa = student._gpa
+                student._store_grade(subject, grade)
+                student._gpa = student.calculate_gpa()
+                changes.append((student, old_gpa, student._gpa))
+            self._gpas_changed(changes)
+            for student, _, _ in changes:
+                student._grades_changed((subject,))
+            if self.school:
+                self.school._record("set_class_grades", class_no=self.class_no, subject=subject,
+                                    grades=list(updates.items()))
+            return []
+
+    def mark_attendance(self, day, period=None, absent=()):
+        # Marks the whole class for one period (0-based) or, with period None, every period of the
+        # day; students listed in absent are marked absent, the rest present.
+        # Returns a list of (entry_number, message) errors; nothing is marked if there are any.
+        school = self.school
+        if not school:
+            return [(None, "Class is not part of a school.")]
+        try:
+            day = parse_date(day)
+        except (TypeError, ValueError):
+            return [(None, "Invalid date.")]
+        if period is not None and not (type(period) is int and 0 <= period < school.attendance.periods):
+            return [(None, "Invalid period.")]
+        with self.lock:
+            errors = []
+            absent_numbers = []
+            for entry_number in absent:
+                try:
+                    entry_number = int(entry_number)
+                except (TypeError, ValueError):
+                    errors.append((entry_number, "Invalid entry number."))
+                    continue
+                if entry_number not in self.students:
+                    errors.append((entry_number, "Student not found in this class."))
+                    continue
+                absent_numbers.append(entry_number)
+            if errors:
+                return errors
+            try:
+                school.attendance.mark(self.roster, day, period, absent_numbers)
+            except ValueError:
+                return [(None, "Date is too far from the other attendance marks.")]
+            school._record("mark_class_attendance", class_no=self.class_no, date=day.isoformat(), period=period,
+                           absent=absent_numbers)
+            return []
+
+    def _gpas_changed(self, changes):
+        # Applies a batch of (student, old_gpa, new_gpa) changes to the class totals and ranks at once
+        with self.lock:
+            self.gpa_total += sum(new_gpa - old_gpa for _, old_gpa, new_gpa in changes)
+            if len(changes) * REBUILD_FRACTION > len(self.ranks):
+                self.ranks = ClassRanks(self.students.values())
+            else:
+                for student, old_gpa, new_gpa in changes:
+                    self.ranks.move(student.entry_number, old_gpa, new_gpa)
+            school = self.school
+            if school:
+                for student, old_gpa, new_gpa in changes:
+                    school._rank_changed(student, old_gpa, new_gpa)
+                school._mark_dirty(self.class_no)
+
+    def _gpa_changed(self, student, old_gpa, new_gpa):
+        with self.lock:
+            self.gpa_total += new_gpa - old_gpa
+            self.ranks.move(student.entry_number, old_gpa, new_gpa)
+            school = self.school
+            if school:
+                school._rank_changed(student, old_gpa, new_gpa)
+                school._mark_dirty(self.class_no)
+
+    def rank_of(self, student):
+        # Returns (rank, class size, percentile) of the student's GPA within this class
+        ranks = self.ranks
+        return ranks.rank(student.gpa), len(ranks), ranks.percentile(student.gpa)
+
+    def top_students(self, k=10):
+        # Returns [(student, GPA)] for the k best GPAs of the class, best first
+        students = self.students
+        return [(students[entry_number], gpa) for entry_number, gpa in self.ranks.top(k) if entry_number in students]
+
+    def iter_students(self, offset=0, limit=None, after=None):
+        # Yields students in entry number order, starting after the cursor entry number if given
+        roster = self.roster
+        students = self.students
+        start = bisect_right(roster, after) if after is not None else 0
+        start += offset
+        stop = len(roster) if limit is None else min(len(roster), start + limit)
+        for i in range(start, stop):
+            student = students.get(roster[i])
+            if student:
+                yield student
+
+    def students_in_range(self, low, high):
+        # Returns the students whose entry numbers are between low and high, inclusive
+        roster = self.roster
+        students = self.students
+        start = bisect_left(roster, low)
+        stop = bisect_right(roster, high)
+        return [students[entry_number] for entry_number in roster[start:stop] if entry_number in students]
 
-    def view_students(self):
+    def student_lines(self, offset=0, limit=None):
         if not self.students:
-            print("  No students in this class.")
-            return
+            return ["  No students in this class."]
+        return [f"  Name: {student.name}, Entry Number: {student.entry_number}"
+                for student in self.iter_students(offset, limit)]
 
-        sorted_students = sorted([(entry_number, student.name) for entry_number, student in self.students.items()])
-        for entry_number, name in sorted_students:
-            print(f"  Name: {name}, Entry Number: {entry_number}")
+    def view_students(self, offset=0, limit=None):
+        render.page(self.student_lines(offset, limit))
 
     def class_average(self):
         if not self.students:
             return 0.0
-        total = sum(student.gpa for student in self.students.values())
-        return total / len(self.students)
+        return self.gpa_total / len(self.students)
+
+    def detail_lines(self):
+        lines = [
+            "",
+            "========== CLASS INFORMATION ==========",
+            f"Class Number: {self.class_no}",
+            f"Incharge: {self.incharge}",
+            f"Number of students: {len(self.students)}",
+        ]
+        if self.school:
+            teacher_ids = sorted(self.school.teachers_of(self.class_no))
+            names = [f"{self.school.teachers[teacher_id].name} ({self.school.teachers[teacher_id].subject})"
+                     for teacher_id in teacher_ids]
+            lines.append("Teachers: " + (", ".join(names) or "None"))
+        lines.append("Students:")
+        lines.extend(self.student_lines())
+        lines.append(f"Class Average GPA: {self.class_average():.2f}")
+        lines.extend(["======================================", ""])
+        return lines
 
     def view_class_details(self):
-        print("\n========== CLASS INFORMATION ==========")
-        print(f"Class Number: {self.class_no}")
-        print(f"Incharge: {self.incharge}")
-        print(f"Number of students: {len(self.students)}")
-        print("Students:")
-        self.view_students()
-        print(f"Class Average GPA: {self.class_average():.2f}")
-        print("======================================\n")
+        render.page(self.detail_lines())
 
     def get_student(self, entry_number):
         return self.students.get(entry_number)
 
+    def to_record(self):
+        return {
+            "class_no": self.class_no,
+            "incharge": self.incharge,
+            "students": [student.to_record() for student in self.students.values()],
+        }
+
+    @classmethod
+    def from_record(cls, record):
+        classroom = cls(record["class_no"], record["incharge"])
+        for student_record in record["students"]:
+            student = Student.from_record(student_record)
+            _check_entry_numbers((student,))
+            student.classroom = classroom
+            classroom.students[student.entry_number] = student
+            classroom.gpa_total += student.gpa
+        classroom.roster = sorted(classroom.students)
+        classroom.ranks = ClassRanks(classroom.students.values())
+        return classroom
+
 
 class School:
     def __init__(self, school_name="Sitender's School of Science and Technology"):
         self.school_name = school_name
+        # classes and teachers are copy-on-write like Classroom.students, so readers never need a lock.
+        # Lock order is Classroom.lock before School.lock; School never waits on a Classroom lock.
         self.classes = {}  # Dict with class_no as key and Classroom object as value
         self.teachers = {}  # Dict with teacher_id as key and Teacher object as value
+        self.student_index = {}  # Dict with entry_number as key and (Student, Classroom) as value
+        self.class_teachers = {}  # Dict with class_no as key and set of teacher_ids as value
+        self.name_index = NameIndex()  # Student and teacher names, for search_students/search_teachers
+        self.ledger = FeeLedger()  # Fee transactions and balances, for post_fee and the dues reports
+        self.ranks = SchoolRanks()  # GPAs of every indexed student, for school_rank
+        self.attendance = AttendanceBook()  # Attendance bitmaps, marked by Classroom.mark_attendance
+        self.class_stats_cache = {}  # Dict with class_no as key and (count, mean, min, max) as value
+        self.school_stats_cache = None  # (stats_version, stats)
+        self.stats_version = 0
+        self.dirty_classes = set()  # Classes whose cached stats are out of date
+        self.admin = None  # Set by Admin
+        self.storage = None  # Set by storage.open_storage to persist every change
+        self.events = EventBus()  # Change events for caches and indexes kept outside the School
+        self.gradebook = None  # Set by gradebook.Gradebook.attach, which keeps a columnar copy of the grades
+        self.lock = threading.RLock()  # Guards classes, teachers and student_index
+        self.record_lock = threading.Lock()  # Keeps journal records in the order they happened
+        self.sync_timer = None  # Syncs records the storage is still holding once sync_interval has passed
+
+    def _record(self, op, **fields):
+        if self.storage:
+            fields["op"] = op
+            with self.record_lock:
+                self.storage.append(fields)
+                if self.storage.unsynced and self.sync_timer is None:
+                    # The storage only looks at the clock when a record arrives, so without this the
+                    # last changes before a quiet spell would wait for the next one to reach the disk
+                    self.sync_timer = threading.Timer(self.storage.sync_interval, self._sync_storage)
+                    self.sync_timer.daemon = True
+                    self.sync_timer.start()
+                if self.storage.snapshot_due():
+                    self._try_snapshot()
+
+    def _sync_storage(self):
+        with self.record_lock:
+            self.sync_timer = None
+            if self.storage:
+                self.storage.sync()
+
+    def _try_snapshot(self):
+        # Writes a snapshot if no other writer is part-way through a change. Class and school changes
+        # are made and journaled under their Classroom.lock or School.lock, so with all of them held
+        # the state matches the journal up to its last record and no grades change while they are
+        # copied. (Teacher assignments and passwords are journaled without a lock, but replaying one
+        # twice changes nothing.) The locks are only tried, never waited on, since the caller may
+        # already hold some; if one is busy the snapshot stays due and is tried at the next record.
+        held = []
+        try:
+            if not self.lock.acquire(blocking=False):
+                return False
+            held.append(self.lock)
+            for classroom in self.classes.values():
+                if not classroom.lock.acquire(blocking=False):
+                    return False
+                held.append(classroom.lock)
+            self.storage.write_snapshot(self.to_snapshot())
+            return True
+        finally:
+            for lock in reversed(held):
+                lock.release()
 
     def add_class(self, classroom):
-        self.classes[classroom.class_no] = classroom
+        _check_entry_numbers(classroom.students.values())
+        old = self.classes.get(classroom.class_no)
+        # Class locks come before the school's. The new class's lock holds off grade changes until
+        # its students are in the school ranks; the one it replaces is held while it is removed.
+        with old.lock if old else nullcontext(), classroom.lock, self.lock:
+            if classroom.class_no in self.classes:
+                self.remove_class(classroom.class_no)
+            classes = dict(self.classes)
+            classes[classroom.class_no] = classroom
+            self.classes = classes
+            classroom.school = self
+            for student in classroom.students.values():
+                self._index_student(student, classroom, publish=False)
+            self._mark_dirty(classroom.class_no)
+            if self.storage:
+                self._record("add_class", classroom=classroom.to_record())
+            # Once the class and its students can all be looked up
+            if ClassAdded in self.events.subscribers:
+                self.events.publish(ClassAdded(classroom.class_no))
+            if StudentEnrolled in self.events.subscribers:
+                for student in classroom.students.values():
+                    self.events.publish(StudentEnrolled(student.entry_number, classroom.class_no, student))
 
     def remove_class(self, class_no):
-        if class_no in self.classes:
-            del self.classes[class_no]
+        classroom = self.classes.get(class_no)
+        if classroom is None:
+            return
+        # The class lock keeps its students' GPAs still while they leave the school ranks
+        with classroom.lock, self.lock:
+            if self.classes.get(class_no) is classroom:
+                classes = dict(self.classes)
+                classroom = classes.pop(class_no)
+                self.classes = classes
+                classroom.school = None
+                for entry_number in classroom.students:
+                    self._unindex_student(entry_number, classroom)
+                self.class_stats_cache.pop(class_no, None)
+                self.dirty_classes.discard(class_no)
+                self.stats_version += 1
+                # Teachers stop teaching the removed class; replaying remove_class repeats this
+                for teacher_id in self.class_teachers.pop(class_no, ()):
+                    teacher = self.teachers[teacher_id]
+                    teacher.classes_to_teach = teacher.classes_to_teach - {class_no}
+                    if TeacherAssigned in self.events.subscribers:
+                        self.events.publish(TeacherAssigned(teacher_id, class_no, False))
+                if ClassRemoved in self.events.subscribers:
+                    self.events.publish(ClassRemoved(class_no))
+                self._record("remove_class", class_no=class_no)
+
+    def _mark_dirty(self, class_no):
+        with self.lock:
+            self.dirty_classes.add(class_no)
+            self.stats_version += 1
+
+    def class_stats(self, class_no):
+        # Returns (count, mean, min, max) of student GPAs, recomputed only if the class changed
+        classroom = self.classes.get(class_no)
+        if classroom is None:
+            return None
+        if class_no in self.dirty_classes or class_no not in self.class_stats_cache:
+            # Clear the flag first so a change made while we compute marks the class dirty again
+            self.dirty_classes.discard(class_no)
+            gpas = [student.gpa for student in classroom.students.values()]
+            if gpas:
+                stats = (len(gpas), classroom.class_average(), min(gpas), max(gpas))
+            else:
+                stats = (0, 0.0, 0.0, 0.0)
+            self.class_stats_cache[class_no] = stats
+            return stats
+        return self.class_stats_cache[class_no]
+
+    def school_stats(self):
+        # Returns (count, mean, min, max) of student GPAs across every class
+        cached = self.school_stats_cache
+        if cached and cached[0] == self.stats_version:
+            return cached[1]
+        version = self.stats_version
+        count = 0
+        total = 0.0
+        lowest = None
+        highest = None
+        for class_no, classroom in self.classes.items():
+            class_count, _, class_min, class_max = self.class_stats(class_no)
+            if not class_count:
+                continue
+            count += class_count
+            total += classroom.gpa_total
+            lowest = class_min if lowest is None else min(lowest, class_min)
+            highest = class_max if highest is None else max(highest, class_max)
+        if count:
+            stats = (count, total / count, lowest, highest)
+        else:
+            stats = (0, 0.0, 0.0, 0.0)
+        self.school_stats_cache = (version, stats)
+        return stats
+
+    def _index_student(self, student, classroom, publish=True):
+        with self.lock:
+            if classroom.school is self:
+                old = self.student_index.get(student.entry_number)
+                if old:
+                    self.ranks.remove(old[0].gpa)
+                self.student_index[student.entry_number] = (student, classroom)
+                self.ranks.add(student.gpa)
+                self.name_index.add(("student", student.entry_number), student.name)
+                self.ledger.add_student(student.entry_number, student.fees)
+                if publish and StudentEnrolled in self.events.subscribers:
+                    self.events.publish(StudentEnrolled(student.entry_number, classroom.class_no, student))
+
+    def _unindex_student(self, entry_number, classroom):
+        with self.lock:
+            entry = self.student_index.get(entry_number)
+            if entry and entry[1] is classroom:
+                del self.student_index[entry_number]
+                self.ranks.remove(entry[0].gpa)
+                self.name_index.remove(("student", entry_number))
+                self.ledger.remove_student(entry_number)
+                self.attendance.remove_student(entry_number)
+                if StudentRemoved in self.events.subscribers:
+                    self.events.publish(StudentRemoved(entry_number, classroom.class_no))
+
+    def _rank_changed(self, student, old_gpa, new_gpa):
+        # Moves an indexed student's GPA in the school-wide ranks; called with its class lock held
+        with self.lock:
+            entry = self.student_index.get(student.entry_number)
+            if entry and entry[0] is student:
+                self.ranks.move(old_gpa, new_gpa)
+
+    def school_rank(self, student):
+        # Returns (rank, number of students, percentile) of the student's GPA across the school
+        ranks = self.ranks
+        return ranks.rank(student.gpa), len(ranks), ranks.percentile(student.gpa)
+
+    def top_students(self, k=10, class_no=None):
+        # Returns [(student, GPA)] for the k best GPAs of one class or the whole school, best first
+        if class_no is not None:
+            classroom = self.classes.get(class_no)
+            return classroom.top_students(k) if classroom else []
+        index = self.student_index
+        return [(index[entry_number][0], gpa) for entry_number, gpa in top_of_classes(self.classes.values(), k)
+                if entry_number in index]
+
+    def _assign_teacher(self, teacher_id, class_no):
+        # The sets in class_teachers are copy-on-write, so teachers_of can hand them out
+        with self.lock:
+            self.class_teachers[class_no] = self.class_teachers.get(class_no, frozenset()) | {teacher_id}
+
+    def _unassign_teacher(self, teacher_id, class_no):
+        with self.lock:
+            teacher_ids = self.class_teachers.get(class_no, frozenset()) - {teacher_id}
+            if teacher_ids:
+                self.class_teachers[class_no] = teacher_ids
+            else:
+                self.class_teachers.pop(class_no, None)
+
+    def teachers_of(self, class_no):
+        # Returns the IDs of the teachers who teach class_no
+        return self.class_teachers.get(class_no, frozenset())
 
     def add_teacher(self, teacher):
-        self.teachers[teacher.teacher_id] = teacher
+        with self.lock:
+            if teacher.teacher_id in self.teachers:
+                self.remove_teacher(teacher.teacher_id)
+            teachers = dict(self.teachers)
+            teachers[teacher.teacher_id] = teacher
+            self.teachers = teachers
+            teacher.school = self
+            for class_no in teacher.classes_to_teach:
+                self._assign_teacher(teacher.teacher_id, class_no)
+            self.name_index.add(("teacher", teacher.teacher_id), teacher.name)
+            if TeacherAdded in self.events.subscribers:
+                self.events.publish(TeacherAdded(teacher.teacher_id, teacher))
+            if self.storage:
+                self._record("add_teacher", teacher=teacher.to_record())
 
     def remove_teacher(self, teacher_id):
-        if teacher_id in self.teachers:
-            del self.teachers[teacher_id]
+        with self.lock:
+            if teacher_id in self.teachers:
+                teachers = dict(self.teachers)
+                teacher = teachers.pop(teacher_id)
+                teacher.school = None
+                self.teachers = teachers
+                for class_no in teacher.classes_to_teach:
+                    self._unassign_teacher(teacher_id, class_no)
+                self.name_index.remove(("teacher", teacher_id))
+                if TeacherRemoved in self.events.subscribers:
+                    self.events.publish(TeacherRemoved(teacher_id))
+                self._record("remove_teacher", teacher_id=teacher_id)
 
     def view_class_details(self, class_no):
         if class_no in self.classes:
@@ -167,56 +904,346 @@ class School:
             print("Teacher not found.")
 
     def find_student(self, entry_number):
+        entry = self.student_index.get(entry_number)
+        return entry[0] if entry else None
+
+    def search_students(self, query, limit=20):
+        # Returns the students whose names best match query; see search.NameIndex.search
+        keys = self.name_index.search(query, limit, kind="student")
+        return [self.student_index[key[1]][0] for key in keys if key[1] in self.student_index]
+
+    def search_teachers(self, query, limit=20):
+        keys = self.name_index.search(query, limit, kind="teacher")
+        return [self.teachers[key[1]] for key in keys if key[1] in self.teachers]
+
+    def post_fee(self, entry_number, kind, amount, memo="", posting_id=None, posted_at=None):
+        # Posts a charge, payment, waiver or adjustment to one student's fee account.
+        # Returns the new balance, or None if the student is not found.
+        student = self.find_student(entry_number)
+        if not student:
+            return None
+        with student._lock():
+            posting = self.ledger.posting(kind, amount, memo, posting_id, posted_at)
+            balance = self.ledger.apply(posting, [entry_number]).get(entry_number)
+            if balance is None:
+                return None
+            student._fees = balance
+            if FeeUpdated in self.events.subscribers:
+                self.events.publish(FeeUpdated(entry_number, balance, posting[0]))
+            self._record("post_fee", entry_number=entry_number, posting=list(posting))
+        return balance
+
+    def post_term_fee(self, amount, memo="", class_nos=None):
+        # Charges amount to every student of the given classes (default: all of them) as one
+        # posting, applied a class at a time. Returns (posting_id, number of students charged).
+        classes = self.classes
+        if class_nos is None:
+            class_nos = list(classes)
+        posting = self.ledger.posting(CHARGE, amount, memo)
+        charged = 0
+        for class_no in class_nos:
+            classroom = classes.get(class_no)
+            if classroom:
+                charged += self._apply_posting(classroom, posting, classroom.roster)
+        return posting[0], charged
+
+    def _apply_posting(self, classroom, posting, entry_numbers):
+        with classroom.lock:
+            students = classroom.students
+            balances = self.ledger.apply(posting, [entry_number for entry_number in entry_numbers
+                                                   if entry_number in students])
+            for entry_number, balance in balances.items():
+                students[entry_number]._fees = balance
+            if FeeUpdated in self.events.subscribers:
+                for entry_number, balance in balances.items():
+                    self.events.publish(FeeUpdated(entry_number, balance, posting[0]))
+            if balances:
+                self._record("post_class_fee", class_no=classroom.class_no, entry_numbers=list(balances),
+                             posting=list(posting))
+            return len(balances)
+
+    def mark_attendance(self, entry_number, day, period=None, present=True):
+        # Marks one student at one period (0-based) or, with period None, every period of the day,
+        # e.g. to correct a class-wide mark. Returns False if the student is not found and raises
+        # OperationError for an invalid date or period, or a date too far from the other marks.
+        student = self.find_student(entry_number)
+        if not student:
+            return False
+        try:
+            day = parse_date(day)
+        except (TypeError, ValueError):
+            raise OperationError("Invalid date.")
+        if period is not None and not (type(period) is int and 0 <= period < self.attendance.periods):
+            raise OperationError("Invalid period.")
+        with student._lock():
+            try:
+                self.attendance.mark([entry_number], day, period, () if present else (entry_number,))
+            except ValueError:
+                raise OperationError("Date is too far from the other attendance marks.")
+            self._record("mark_attendance", entry_number=entry_number, date=day.isoformat(), period=period,
+                         present=present)
+        return True
+
+    def attendance_rate(self, entry_number, first=None, last=None):
+        # Returns (periods present, periods marked) for one student between the first and last dates
+        return self.attendance.counts(entry_number, first, last)
+
+    def class_attendance(self, class_no, first=None, last=None):
+        # Returns (periods present, periods marked) summed over a class
+        classroom = self.classes.get(class_no)
+        return self.attendance.totals(classroom.roster, first, last) if classroom else (0, 0)
+
+    def low_attendance(self, threshold=DEFAULT_THRESHOLD, class_no=None, first=None, last=None):
+        # Returns [(student, rate)] for students of one class, or the whole school, whose
+        # attendance rate is below threshold percent, lowest first
+        if class_no is not None:
+            classroom = self.classes.get(class_no)
+            entry_numbers = classroom.roster if classroom else []
+        else:
+            entry_numbers = self.student_index
+        index = self.student_index
+        return [(index[entry_number][0], rate)
+                for entry_number, rate in self.attendance.below(entry_numbers, threshold, first, last)
+                if entry_number in index]
+
+    def outstanding_dues(self, more_than=0, limit=None):
+        # Returns [(student, balance)] for balances above more_than, largest first
+        owing = self.ledger.owing_more_than(more_than, limit)
+        index = self.student_index
+        return [(index[entry_number][0], balance) for entry_number, balance in owing if entry_number in index]
+
+    def find_student_class(self, entry_number):
+        entry = self.student_index.get(entry_number)
+        return entry[1] if entry else None
+
+    def check_index(self):
+        # Returns a list of problems found between the index and the classrooms
+        problems = []
+        expected = 0
         for class_no, classroom in self.classes.items():
-            student = classroom.get_student(entry_number)
-            if student:
-                return student
-        return None
+            if classroom.school is not self:
+                problems.append(f"Class {class_no} is not attached to this school")
+            if classroom.roster != sorted(classroom.students):
+                problems.append(f"Roster of class {class_no} is out of order or out of sync")
+            if classroom.ranks.order != ClassRanks(classroom.students.values()).order:
+                problems.append(f"Ranks of class {class_no} are out of sync with the students' GPAs")
+            for entry_number, student in classroom.students.items():
+                expected += 1
+                entry = self.student_index.get(entry_number)
+                if not entry:
+                    problems.append(f"Student {entry_number} of class {class_no} is not indexed")
+                elif entry[0] is not student or entry[1] is not classroom:
+                    problems.append(f"Student {entry_number} is indexed under the wrong record")
+        if len(self.student_index) != expected:
+            problems.append(f"Index holds {len(self.student_index)} students, classes hold {expected}")
+        if len(self.ranks) != len(self.student_index):
+            problems.append(f"School ranks hold {len(self.ranks)} students, index holds {len(self.student_index)}")
+        assignments = {}
+        for teacher_id, teacher in self.teachers.items():
+            for class_no in teacher.classes_to_teach:
+                assignments.setdefault(class_no, set()).add(teacher_id)
+        if assignments != self.class_teachers:
+            problems.append("Class to teacher index is out of sync with the teachers' classes")
+        return problems
+
+    def to_snapshot(self):
+        return {
+            "school_name": self.school_name,
+            "admin": self.admin.to_record() if self.admin else None,
+            "classes": [classroom.to_record() for classroom in self.classes.values()],
+            "teachers": [teacher.to_record() for teacher in self.teachers.values()],
+            "ledger": self.ledger.to_record(),
+            "attendance": self.attendance.to_record(),
+        }
+
+    def restore(self, snapshot):
+        # Replaces the whole state with a snapshot made by to_snapshot, without recording it
+        storage, self.storage = self.storage, None
+        self.school_name = snapshot["school_name"]
+        if self.admin and snapshot["admin"]:
+            self.admin.restore(snapshot["admin"])
+        self.classes = {}
+        self.teachers = {}
+        self.student_index = {}
+        self.class_teachers = {}
+        self.name_index = NameIndex()
+        self.ledger = FeeLedger()
+        self.ranks = SchoolRanks()
+        self.attendance = AttendanceBook()
+        self.class_stats_cache = {}
+        self.school_stats_cache = None
+        self.dirty_classes = set()
+        if SchoolReset in self.events.subscribers:
+            self.events.publish(SchoolReset())
+        for class_record in snapshot["classes"]:
+            self.add_class(Classroom.from_record(class_record))
+        for teacher_record in snapshot["teachers"]:
+            self.add_teacher(Teacher.from_record(teacher_record))
+        if snapshot.get("ledger"):
+            self.ledger.restore(snapshot["ledger"])
+        if snapshot.get("attendance"):
+            self.attendance = AttendanceBook.from_record(snapshot["attendance"])
+        self.storage = storage
+
+    def apply_all(self, records):
+        # Replays journal records in order, as apply does, but hands each run of add_student
+        # records for one class to a single add_students
+        run = []
+        run_entries = set()  # A run never holds one student twice
+        for record in records:
+            if run and (record["op"] != "add_student" or record["class_no"] != run[0]["class_no"]
+                        or record["student"]["entry_number"] in run_entries):
+                self._apply_run(run)
+                run = []
+                run_entries = set()
+            if record["op"] == "add_student":
+                run.append(record)
+                run_entries.add(record["student"]["entry_number"])
+            else:
+                self.apply(record)
+        if run:
+            self._apply_run(run)
+
+    def _apply_run(self, run):
+        if len(run) == 1:
+            self.apply(run[0])
+        else:
+            self.apply({"op": "add_students", "class_no": run[0]["class_no"],
+                        "students": [record["student"] for record in run]})
+
+    def apply(self, record):
+        # Replays one journal record written by _record, without recording it again
+        storage, self.storage = self.storage, None
+        try:
+            op = record["op"]
+            if op == "add_class":
+                self.add_class(Classroom.from_record(record["classroom"]))
+            elif op == "remove_class":
+                self.remove_class(record["class_no"])
+            elif op == "add_teacher":
+                self.add_teacher(Teacher.from_record(record["teacher"]))
+            elif op == "remove_teacher":
+                self.remove_teacher(record["teacher_id"])
+            elif op == "add_student":
+                self.classes[record["class_no"]].add_student(Student.from_record(record["student"]))
+            elif op == "add_students":
+                self.classes[record["class_no"]].add_students([Student.from_record(r) for r in record["students"]])
+            elif op == "remove_student":
+                self.classes[record["class_no"]].remove_student(record["entry_number"])
+            elif op == "set_class_grades":
+                self.classes[record["class_no"]].set_grades(record["subject"], record["grades"])
+            elif op == "post_fee":
+                posting_id, kind, amount, memo, posted_at = record["posting"]
+                self.post_fee(record["entry_number"], kind, amount, memo, posting_id, posted_at)
+            elif op == "post_class_fee":
+                posting_id, kind, amount, memo, posted_at = record["posting"]
+                posting = self.ledger.posting(kind, amount, memo, posting_id, posted_at)
+                self._apply_posting(self.classes[record["class_no"]], posting, record["entry_numbers"])
+            elif op == "mark_class_attendance":
+                self.classes[record["class_no"]].mark_attendance(record["date"], record["period"], record["absent"])
+            elif op == "mark_attendance":
+                # A record that fails the checks is skipped, as set_class_grades and
+                # mark_class_attendance skip one whose errors they return
+                try:
+                    self.mark_attendance(record["entry_number"], record["date"], record["period"], record["present"])
+                except OperationError:
+                    pass
+            elif op == "set_admin_password":
+                self.admin.restore_password(record["password"])
+            elif op in ("add_class_to_teach", "remove_class_to_teach", "set_teacher_password"):
+                teacher = self.teachers[record["teacher_id"]]
+                if op == "add_class_to_teach":
+                    teacher.add_class_to_teach(record["class_no"])
+                elif op == "remove_class_to_teach":
+                    teacher.remove_class_to_teach(record["class_no"])
+                else:
+                    teacher.restore_password(record["password"])
+            else:
+                student = self.find_student(record["entry_number"])
+                if op == "set_grade":
+                    student.add_subject(record["subject"], record["grade"])
+                elif op == "remove_subject":
+                    student.remove_subject(record["subject"])
+                elif op == "set_grades":
+                    student.add_subjects(record["grades"].items())
+                elif op == "set_subjects":
+                    student.subjects = record["grades"].items()
+                elif op == "set_fee":
+                    # No longer written, since fees are posted through the ledger; kept so journals
+                    # from before the ledger still load (as an adjustment to the recorded amount)
+                    student.fees = record["fees"]
+                elif op == "set_student_password":
+                    student.restore_password(record["password"])
+        finally:
+            self.storage = storage
 
     def get_all_class_numbers(self):
         return list(self.classes.keys())
 
-    def view_all_students(self):
-        print("\n========== ALL STUDENTS ==========")
+    def all_student_lines(self):
+        lines = ["", "========== ALL STUDENTS =========="]
         found = False
         for class_no, classroom in self.classes.items():
             if classroom.students:
                 found = True
-                print(f"Class {class_no}:")
-                classroom.view_students()
+                lines.append(f"Class {class_no}:")
+                lines.extend(classroom.student_lines())
         if not found:
-            print("No students enrolled in any class.")
-        print("================================\n")
+            lines.append("No students enrolled in any class.")
+        lines.extend(["================================", ""])
+        return lines
 
-    def view_all_teachers(self):
-        print("\n========== ALL TEACHERS ==========")
+    def view_all_students(self):
+        render.page(self.all_student_lines())
+
+    def all_teacher_lines(self):
+        lines = ["", "========== ALL TEACHERS =========="]
         if not self.teachers:
-            print("No teachers in the system.")
-        else:
-            for teacher_id, teacher in self.teachers.items():
-                print(f"ID: {teacher_id}, Name: {teacher.name}, Subject: {teacher.subject}")
-        print("================================\n")
+            lines.append("No teachers in the system.")
+        for teacher_id, teacher in self.teachers.items():
+            lines.append(f"ID: {teacher_id}, Name: {teacher.name}, Subject: {teacher.subject}")
+        lines.extend(["================================", ""])
+        return lines
+
+    def view_all_teachers(self):
+        render.page(self.all_teacher_lines())
 
 
 class Admin:
-    def __init__(self, username, password, school):
+    def __init__(self, username, password, school, encoded=None):
         self.__username = username
-        self.__password = password
+        self.__password = Credential.from_hash(encoded) if encoded else Credential(password)
         self.school = school
+        school.admin = self
 
     def authenticate(self, username, password):
-        return self.__username == username and self.__password == password
-
-    def view_school_details(self):
-        print("\n========== SCHOOL INFORMATION ==========")
-        print(f"School Name: {self.school.school_name}")
-        print(f"\nClasses ({len(self.school.classes)}):")
+        return self.__username == username and self.__password.verify(password)
+
+    def authenticate_async(self, username, password):
+        # Returns a future that resolves to whether the credentials are valid
+        if self.__username != username:
+            future = Future()
+            future.set_result(False)
+            return future
+        return self.__password.verify_async(password)
+
+    def school_detail_lines(self):
+        lines = ["", "========== SCHOOL INFORMATION ==========", f"School Name: {self.school.school_name}"]
+        lines.extend(["", f"Classes ({len(self.school.classes)}):"])
         for class_no, classroom in self.school.classes.items():
-            print(f"  Class Number: {class_no}, Incharge: {classroom.incharge}")
-        print(f"\nTeachers ({len(self.school.teachers)}):")
+            lines.append(f"  Class Number: {class_no}, Incharge: {classroom.incharge}")
+        lines.extend(["", f"Teachers ({len(self.school.teachers)}):"])
         for teacher_id, teacher in self.school.teachers.items():
-            print(f"  Teacher ID: {teacher_id}, Name: {teacher.name}, Subject: {teacher.subject}")
-        print("========================================\n")
+            lines.append(f"  Teacher ID: {teacher_id}, Name: {teacher.name}, Subject: {teacher.subject}")
+        count, mean, lowest, highest = self.school.school_stats()
+        lines.extend(["", f"Students: {count}"])
+        if count:
+            lines.append(f"GPA: Average {mean:.2f}, Lowest {lowest:.2f}, Highest {highest:.2f}")
+        lines.extend(["========================================", ""])
+        return lines
+
+    def view_school_details(self):
+        render.page(self.school_detail_lines())
 
     def add_teacher(self, teacher):
         self.school.add_teacher(teacher)
@@ -230,25 +1257,45 @@ class Admin:
     def remove_class(self, class_no):
         self.school.remove_class(class_no)
 
-    def view_fee_record(self):
-        print("\n========== FEE RECORDS ==========")
+    def fee_record_lines(self):
+        lines = ["", "========== FEE RECORDS =========="]
         found = False
         for class_no, classroom in self.school.classes.items():
             if classroom.students:
                 found = True
-                print(f"Class {class_no}:")
+                lines.append(f"Class {class_no}:")
                 for entry_number, student in classroom.students.items():
-                    print(f"  Student ID: {entry_number}, Name: {student.name}, Fees: ${student.fees}")
+                    lines.append(f"  Student ID: {entry_number}, Name: {student.name}, Fees: ${student.fees}")
         if not found:
-            print("No students enrolled in any class.")
-        print("================================\n")
+            lines.append("No students enrolled in any class.")
+        lines.extend(["================================", ""])
+        return lines
+
+    def view_fee_record(self):
+        render.page(self.fee_record_lines())
+
+    def dues_lines(self, more_than=0, limit=50):
+        ledger = self.school.ledger
+        lines = ["", "========== OUTSTANDING DUES =========="]
+        count = ledger.count_owing_more_than(more_than)
+        lines.append(f"Students owing more than ${more_than}: {count}")
+        lines.append(f"Total owed by all students: ${ledger.owed_total}")
+        for student, balance in self.school.outstanding_dues(more_than, limit):
+            lines.append(f"  Student ID: {student.entry_number}, Name: {student.name}, Class: {student.class_}, "
+                         f"Owes: ${balance}")
+        if count > limit:
+            lines.append(f"  ... and {count - limit} more")
+        lines.extend(["======================================", ""])
+        return lines
+
+    def view_dues(self, more_than=0, limit=50):
+        render.page(self.dues_lines(more_than, limit))
 
     def update_student_fee(self, entry_number, new_fee):
-        for class_no, classroom in self.school.classes.items():
-            student = classroom.get_student(entry_number)
-            if student:
-                student.fees = new_fee
-                return True
+        student = self.school.find_student(entry_number)
+        if student:
+            student.fees = new_fee
+            return True
         return False
 
     def update_teacher_password(self, teacher_id, old_pass, new_pass):
@@ -257,16 +1304,36 @@ class Admin:
         return False
 
     def update_password(self, new_pass):
-        self.__password = new_pass
+        self.__password = Credential(new_pass)
+        self.school._record("set_admin_password", password=self.__password.encoded)
+
+    def restore_password(self, password):
+        self.__password = Credential.from_hash(password)
+
+    def to_record(self):
+        return {"username": self.__username, "password": self.__password.encoded}
+
+    def restore(self, record):
+        self.__username = record["username"]
+        self.__password = Credential.from_hash(record["password"])
 
 
 class Interface:
-    def __init__(self):
+    def __init__(self, data_dir=None):
         self.school = School()
         self.admin = Admin("admin", "admin123", self.school)
+        self.storage = open_storage(self.school, data_dir) if data_dir else None
+
+    def close(self):
+        if self.storage:
+            self.storage.close()
 
     def clear_screen(self):
-        os.system('cls' if os.name == 'nt' else 'clear')
+        render.clear_screen()
+
+    def show_menu(self, lines):
+        # Clears the screen and draws the whole menu with one write
+        render.write(lines, clear=True)
 
     def clear_input_buffer(self):
         pass  # Python doesn't need this like C++
@@ -276,12 +1343,13 @@ class Interface:
 
     def main_menu(self):
         while True:
-            self.clear_screen()
-            print(f"===== {self.school.school_name} =====")
-            print("1. Admin Login")
-            print("2. Teacher Login")
-            print("3. Student Login")
-            print("4. Exit")
+            self.show_menu([
+                f"===== {self.school.school_name} =====",
+                "1. Admin Login",
+                "2. Teacher Login",
+                "3. Student Login",
+                "4. Exit",
+            ])
             choice = input("Enter your choice: ")
 
             try:
@@ -297,6 +1365,7 @@ class Interface:
                 self.student_login()
             elif choice == 4:
                 print("Thank you for using the system. Goodbye!")
+                self.close()
                 break
             else:
                 print("Invalid choice. Please try again.")
@@ -316,21 +1385,26 @@ class Interface:
 
     def admin_menu(self):
         while True:
-            self.clear_screen()
-            print("===== ADMIN MENU =====")
-            print("1. View School Details")
-            print("2. Add Teacher")
-            print("3. Remove Teacher")
-            print("4. View All Teachers")
-            print("5. Add Class")
-            print("6. Remove Class")
-            print("7. View Class Details")
-            print("8. Add Student")
-            print("9. View All Students")
-            print("10. View Fee Records")
-            print("11. Update Student Fee")
-            print("12. Change Admin Password")
-            print("13. Back to Main Menu")
+            self.show_menu([
+                "===== ADMIN MENU =====",
+                "1. View School Details",
+                "2. Add Teacher",
+                "3. Remove Teacher",
+                "4. View All Teachers",
+                "5. Add Class",
+                "6. Remove Class",
+                "7. View Class Details",
+                "8. Add Student",
+                "9. View All Students",
+                "10. View Fee Records",
+                "11. Update Student Fee",
+                "12. Change Admin Password",
+                "13. Search by Name",
+                "14. Record Fee Transaction",
+                "15. Post Term Fee",
+                "16. View Outstanding Dues",
+                "17. Back to Main Menu",
+            ])
 
             try:
                 admin_choice = int(input("Enter your choice: "))
@@ -366,6 +1440,14 @@ class Interface:
             elif admin_choice == 12:
                 self.change_admin_password()
             elif admin_choice == 13:
+                self.search_by_name()
+            elif admin_choice == 14:
+                self.record_fee_transaction()
+            elif admin_choice == 15:
+                self.post_term_fee()
+            elif admin_choice == 16:
+                self.view_outstanding_dues()
+            elif admin_choice == 17:
                 break
             else:
                 print("Invalid choice. Please try again.")
@@ -527,6 +1609,8 @@ class Interface:
         
         try:
             entry_number = int(input("Enter entry number: "))
+            if not valid_entry_number(entry_number):
+                raise ValueError
         except ValueError:
             print("Invalid entry number.")
             self.pause_screen()
@@ -603,6 +1687,113 @@ class Interface:
             print("Failed to update fee.")
         self.pause_screen()
 
+    def record_fee_transaction(self):
+        self.clear_screen()
+        print("===== RECORD FEE TRANSACTION =====")
+
+        try:
+            entry_number = int(input("Enter student entry number: "))
+        except ValueError:
+            print("Invalid entry number.")
+            self.pause_screen()
+            return
+
+        student = self.school.find_student(entry_number)
+        if not student:
+            print("Student not found.")
+            self.pause_screen()
+            return
+
+        print(f"Current balance: ${student.fees}")
+        kind = input("Transaction type (charge/payment/waiver): ").strip().lower()
+        if kind not in KINDS or kind == ADJUSTMENT:
+            print("Invalid transaction type.")
+            self.pause_screen()
+            return
+
+        try:
+            amount = int(input("Enter amount: $"))
+            if amount <= 0:
+                print("Invalid amount.")
+                self.pause_screen()
+                return
+        except ValueError:
+            print("Invalid amount.")
+            self.pause_screen()
+            return
+
+        memo = input("Enter a note (optional): ").strip()
+        balance = self.school.post_fee(entry_number, kind, amount, memo)
+        if balance is None:
+            print("Failed to record transaction.")
+        else:
+            print(f"Transaction recorded. New balance: ${balance}")
+        self.pause_screen()
+
+    def post_term_fee(self):
+        self.clear_screen()
+        print("===== POST TERM FEE =====")
+
+        try:
+            amount = int(input("Enter term fee amount: $"))
+            if amount <= 0:
+                print("Invalid amount.")
+                self.pause_screen()
+                return
+        except ValueError:
+            print("Invalid amount.")
+            self.pause_screen()
+            return
+
+        memo = input("Enter a note (e.g. Term 2 fee): ").strip()
+        class_nos = input("Enter class numbers (space-separated, blank for all classes): ").split()
+        for class_no in class_nos:
+            if class_no not in self.school.classes:
+                print(f"Class {class_no} does not exist. Term fee not posted.")
+                self.pause_screen()
+                return
+
+        _, charged = self.school.post_term_fee(amount, memo, class_nos or None)
+        print(f"Term fee of ${amount} charged to {charged} students.")
+        self.pause_screen()
+
+    def view_outstanding_dues(self):
+        self.clear_screen()
+        print("===== OUTSTANDING DUES =====")
+
+        try:
+            more_than = int(input("Show students owing more than: $") or 0)
+        except ValueError:
+            print("Invalid amount.")
+            self.pause_screen()
+            return
+
+        self.admin.view_dues(more_than)
+        self.pause_screen()
+
+    def search_by_name(self):
+        self.clear_screen()
+        print("===== SEARCH BY NAME =====")
+
+        query = input("Enter a name or part of one: ")
+        students = self.school.search_students(query)
+        teachers = self.school.search_teachers(query)
+
+        lines = []
+        if not students and not teachers:
+            lines.append("No matches found.")
+        if students:
+            lines.append("Students:")
+            for student in students:
+                lines.append(f"  Name: {student.name}, Entry Number: {student.entry_number}, "
+                             f"Class: {student.class_}")
+        if teachers:
+            lines.append("Teachers:")
+            for teacher in teachers:
+                lines.append(f"  Name: {teacher.name}, ID: {teacher.teacher_id}, Subject: {teacher.subject}")
+        render.page(lines)
+        self.pause_screen()
+
     def change_admin_password(self):
         self.clear_screen()
         print("===== CHANGE ADMIN PASSWORD =====")
@@ -652,15 +1843,18 @@ class Interface:
 
     def teacher_menu(self, teacher):
         while True:
-            self.clear_screen()
-            print("===== TEACHER MENU =====")
-            print(f"Welcome, {teacher.name}!")
-            print("1. View My Details")
-            print("2. View My Classes")
-            print("3. View Students in a Class")
-            print("4. Update Grade for a Student")
-            print("5. Change Password")
-            print("6. Back to Main Menu")
+            self.show_menu([
+                "===== TEACHER MENU =====",
+                f"Welcome, {teacher.name}!",
+                "1. View My Details",
+                "2. View My Classes",
+                "3. View Students in a Class",
+                "4. Update Grade for a Student",
+                "5. Update Grades from a File",
+                "6. Mark Attendance",
+                "7. Change Password",
+                "8. Back to Main Menu",
+            ])
 
             try:
                 choice = int(input("Enter your choice: "))
@@ -677,8 +1871,12 @@ class Interface:
             elif choice == 4:
                 self.update_student_grade(teacher)
             elif choice == 5:
-                self.change_teacher_password(teacher)
+                self.update_grades_from_file(teacher)
             elif choice == 6:
+                self.mark_attendance(teacher)
+            elif choice == 7:
+                self.change_teacher_password(teacher)
+            elif choice == 8:
                 break
             else:
                 print("Invalid choice. Please try again.")
@@ -686,19 +1884,23 @@ class Interface:
 
     def view_teacher_classes(self, teacher):
         self.clear_screen()
-        print("===== MY CLASSES =====")
+        lines = ["===== MY CLASSES ====="]
 
         if not teacher.classes_to_teach:
-            print("You are not assigned to any classes.")
+            lines.append("You are not assigned to any classes.")
         else:
-            print("You teach the following classes:")
-            for class_no in teacher.classes_to_teach:
+            lines.append("You teach the following classes:")
+            for class_no in sorted(teacher.classes_to_teach):
                 if class_no in self.school.classes:
                     cls = self.school.classes[class_no]
-                    print(f"Class: {class_no}, Incharge: {cls.incharge}")
-                    print(f"Number of students: {len(cls.students)}")
-                    print(f"Class Average GPA: {cls.class_average():.2f}")
-                    print()
+                    count, mean, lowest, highest = self.school.class_stats(class_no)
+                    lines.append(f"Class: {class_no}, Incharge: {cls.incharge}")
+                    lines.append(f"Number of students: {count}")
+                    lines.append(f"Class Average GPA: {mean:.2f}")
+                    if count:
+                        lines.append(f"Lowest GPA: {lowest:.2f}, Highest GPA: {highest:.2f}")
+                    lines.append("")
+        render.page(lines)
         self.pause_screen()
 
     def view_students_in_class(self, teacher):
@@ -710,7 +1912,7 @@ class Interface:
             self.pause_screen()
             return
 
-        print("Your classes: " + ", ".join(teacher.classes_to_teach))
+        print("Your classes: " + ", ".join(sorted(teacher.classes_to_teach)))
 
         class_no = input("Enter class number: ")
 
@@ -722,8 +1924,7 @@ class Interface:
         if class_no not in self.school.classes:
             print("Class not found.")
         else:
-            print(f"Students in class {class_no}:")
-            self.school.classes[class_no].view_students()
+            render.page([f"Students in class {class_no}:", *self.school.classes[class_no].student_lines()])
         self.pause_screen()
 
     def update_student_grade(self, teacher):
@@ -735,7 +1936,7 @@ class Interface:
             self.pause_screen()
             return
 
-        print("Your classes: " + ", ".join(teacher.classes_to_teach))
+        print("Your classes: " + ", ".join(sorted(teacher.classes_to_teach)))
 
         class_no = input("Enter class number: ")
 
@@ -756,8 +1957,7 @@ class Interface:
             self.pause_screen()
             return
 
-        print(f"Students in class {class_no}:")
-        classroom.view_students()
+        render.page([f"Students in class {class_no}:", *classroom.student_lines()])
 
         try:
             entry_number = int(input("Enter student entry number: "))
@@ -773,12 +1973,7 @@ class Interface:
             return
 
         subject = teacher.subject
-        
-        has_subject = False
-        for subj, _ in student.subjects:
-            if subj == subject:
-                has_subject = True
-                break
+        has_subject = student.has_subject(subject)
 
         if not has_subject:
             print(f"This student is not enrolled in {subject}.")
@@ -798,18 +1993,107 @@ class Interface:
             self.pause_screen()
             return
 
-        if has_subject:
-            for i, (subj, _) in enumerate(student.subjects):
-                if subj == subject:
-                    student.subjects[i] = (subject, grade)
-                    break
-            student.gpa = student.calculate_gpa()
-        else:
-            student.add_subject(subject, grade)
+        student.add_subject(subject, grade)
 
         print("Grade updated successfully.")
         self.pause_screen()
 
+    def update_grades_from_file(self, teacher):
+        self.clear_screen()
+        print("===== UPDATE GRADES FROM A FILE =====")
+
+        if not teacher.classes_to_teach:
+            print("You are not assigned to any classes.")
+            self.pause_screen()
+            return
+
+        print("Your classes: " + ", ".join(sorted(teacher.classes_to_teach)))
+
+        class_no = input("Enter class number: ")
+
+        if class_no not in teacher.classes_to_teach:
+            print("You don't teach this class.")
+            self.pause_screen()
+            return
+
+        if class_no not in self.school.classes:
+            print("Class not found.")
+            self.pause_screen()
+            return
+
+        print(f"The file should have one 'entry_number,grade' line per student for {teacher.subject}.")
+        path = input("Enter file path: ")
+
+        grades = []
+        try:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    if len(row) < 2 or row[0].strip().lower() == "entry_number":
+                        continue
+                    grades.append((row[0].strip(), row[1].strip()))
+        except OSError:
+            print("Could not read the file.")
+            self.pause_screen()
+            return
+
+        errors = teacher.update_grades(self.school.classes[class_no], grades)
+        if errors:
+            print("No grades were updated because of these errors:")
+            for entry_number, message in errors:
+                print(f"  Entry Number {entry_number}: {message}")
+        elif not grades:
+            print("The file has no grades.")
+        else:
+            # A student listed twice (as "7" and "07", say) is updated once, with the last grade
+            updated = len({int(entry_number) for entry_number, _ in grades})
+            print(f"{updated} grades updated successfully.")
+        self.pause_screen()
+
+    def mark_attendance(self, teacher):
+        self.clear_screen()
+        print("===== MARK ATTENDANCE =====")
+
+        if not teacher.classes_to_teach:
+            print("You are not assigned to any classes.")
+            self.pause_screen()
+            return
+
+        print("Your classes: " + ", ".join(sorted(teacher.classes_to_teach)))
+        class_no = input("Enter class number: ")
+
+        if class_no not in teacher.classes_to_teach:
+            print("You don't teach this class.")
+            self.pause_screen()
+            return
+
+        if class_no not in self.school.classes:
+            print("Class not found.")
+            self.pause_screen()
+            return
+
+        classroom = self.school.classes[class_no]
+        day = input("Enter date (YYYY-MM-DD, Enter for today): ").strip() or date.today()
+        period = input(f"Enter period (1-{self.school.attendance.periods}, Enter for the whole day): ").strip()
+        if period:
+            try:
+                period = int(period) - 1
+            except ValueError:
+                period = -1
+        else:
+            period = None
+        render.page([f"Students in class {class_no}:", *classroom.student_lines()])
+        absent = input("Enter entry numbers of absent students, separated by spaces: ").split()
+
+        errors = classroom.mark_attendance(day, period, absent)
+        if errors:
+            print("No attendance was marked because of these errors:")
+            for entry_number, message in errors:
+                print(f"  {message}" if entry_number is None else f"  Entry Number {entry_number}: {message}")
+        else:
+            absent = {int(entry_number) for entry_number in absent}
+            print(f"Attendance marked: {len(classroom.roster) - len(absent)} present, {len(absent)} absent.")
+        self.pause_screen()
+
     def change_teacher_password(self, teacher):
         self.clear_screen()
         print("===== CHANGE PASSWORD =====")
@@ -856,14 +2140,15 @@ class Interface:
 
     def student_menu(self, student):
         while True:
-            self.clear_screen()
-            print("===== STUDENT MENU =====")
-            print(f"Welcome, {student.name}!")
-            print("1. View My Information")
-            print("2. View My Subjects and Grades")
-            print("3. Check Fee Status")
-            print("4. Change Password")
-            print("5. Back to Main Menu")
+            self.show_menu([
+                "===== STUDENT MENU =====",
+                f"Welcome, {student.name}!",
+                "1. View My Information",
+                "2. View My Subjects and Grades",
+                "3. Check Fee Status",
+                "4. Change Password",
+                "5. Back to Main Menu",
+            ])
 
             try:
                 choice = int(input("Enter your choice: "))
@@ -887,18 +2172,12 @@ class Interface:
 
     def view_student_grades(self, student):
         self.clear_screen()
-        print("===== MY SUBJECTS AND GRADES =====")
-        student.view_subjects()
-        print(f"GPA: {student.gpa:.2f}")
+        render.page(["===== MY SUBJECTS AND GRADES =====", *student.subject_lines(), f"GPA: {student.gpa:.2f}"])
         self.pause_screen()
 
     def view_fee_status(self, student):
         self.clear_screen()
-        print("===== FEE STATUS =====")
-        print(f"Name: {student.name}")
-        print(f"Class: {student.class_}")
-        print(f"Entry Number: {student.entry_number}")
-        print(f"Fee Amount: ${student.fees}")
+        render.page(["===== FEE STATUS =====", *student.fee_lines()])
         self.pause_screen()
 
     def change_student_password(self, student):
@@ -922,5 +2201,5 @@ class Interface:
 
 
 if __name__ == "__main__":
-    interface = Interface()
+    interface = Interface(os.environ.get("SCHOLARSYNC_DATA", "scholarsync_data"))
     interface.main_menu()
\ No newline at end of file
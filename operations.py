@@ -0,0 +1,371 @@
+from datetime import date
+
+from attendance import DEFAULT_THRESHOLD, parse_date
+from ledger import ADJUSTMENT, KINDS
+from main import Classroom, OperationError, Student, Teacher
+from ranks import valid_entry_number
+
+# Admin, teacher and student operations without any prompts or printing, for callers
+# other than the interactive Interface. Each one checks its input with the same rules as
+# the menus, raises OperationError with the menu's message when a check fails, and returns
+# plain data that can be sent as JSON.
+
+
+def _class(school, class_no):
+    if class_no not in school.classes:
+        raise OperationError("Class does not exist.")
+    return school.classes[class_no]
+
+
+def _grade(grade):
+    try:
+        grade = float(grade)
+    except (TypeError, ValueError):
+        raise OperationError("Invalid grade.")
+    if grade < 0 or grade > 100:
+        raise OperationError("Invalid grade.")
+    return grade
+
+
+def _int(value, message):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise OperationError(message)
+
+
+def _date(value):
+    # None or "" means no date was given
+    if value is None or value == "":
+        return None
+    try:
+        return parse_date(value)
+    except (TypeError, ValueError):
+        raise OperationError("Invalid date.")
+
+
+def _rate(present, marked):
+    return {"present": present, "marked": marked, "rate": present * 100.0 / marked if marked else None}
+
+
+def student_summary(student):
+    return {"entry_number": student.entry_number, "name": student.name}
+
+
+def teacher_summary(teacher):
+    return {"teacher_id": teacher.teacher_id, "name": teacher.name, "subject": teacher.subject}
+
+
+# Admin operations
+
+def school_details(school):
+    count, mean, lowest, highest = school.school_stats()
+    return {
+        "school_name": school.school_name,
+        "classes": [{"class_no": class_no, "incharge": classroom.incharge}
+                    for class_no, classroom in school.classes.items()],
+        "teachers": [teacher_summary(teacher) for teacher in school.teachers.values()],
+        "students": count,
+        "average_gpa": mean,
+        "lowest_gpa": lowest,
+        "highest_gpa": highest,
+    }
+
+
+def add_teacher(school, admin, teacher_id, name, subject, classes, password):
+    teacher_id = _int(teacher_id, "Invalid ID. Teacher not added.")
+    if teacher_id in school.teachers:
+        raise OperationError("Teacher ID already exists.")
+    if isinstance(classes, str):
+        classes = classes.split()
+    missing = [class_no for class_no in classes if class_no not in school.classes]
+    if missing:
+        raise OperationError(f"Class {missing[0]} does not exist. Teacher not added.")
+    teacher = Teacher(name, subject, list(classes), password)
+    teacher.teacher_id = teacher_id
+    admin.add_teacher(teacher)
+    return teacher_summary(teacher)
+
+
+def remove_teacher(school, admin, teacher_id):
+    teacher_id = _int(teacher_id, "Invalid ID.")
+    if teacher_id not in school.teachers:
+        raise OperationError("Teacher not found.")
+    admin.remove_teacher(teacher_id)
+    return {"teacher_id": teacher_id}
+
+
+def list_teachers(school):
+    return [teacher_summary(teacher) for teacher in school.teachers.values()]
+
+
+def add_class(school, admin, class_no, incharge):
+    if class_no in school.classes:
+        raise OperationError("Class already exists.")
+    admin.add_class(Classroom(class_no, incharge))
+    return {"class_no": class_no, "incharge": incharge}
+
+
+def remove_class(school, admin, class_no):
+    _class(school, class_no)
+    admin.remove_class(class_no)
+    return {"class_no": class_no}
+
+
+def class_details(school, class_no, offset=0, limit=None):
+    classroom = _class(school, class_no)
+    count, mean, lowest, highest = school.class_stats(class_no)
+    return {
+        "class_no": class_no,
+        "incharge": classroom.incharge,
+        "teachers": [teacher_summary(school.teachers[teacher_id])
+                     for teacher_id in sorted(school.teachers_of(class_no))],
+        "students": [student_summary(student) for student in classroom.iter_students(offset, limit)],
+        "count": count,
+        "average_gpa": mean,
+        "lowest_gpa": lowest,
+        "highest_gpa": highest,
+    }
+
+
+def add_student(school, class_no, name, entry_number, password, subjects=None):
+    classroom = _class(school, class_no)
+    entry_number = _int(entry_number, "Invalid entry number.")
+    if not valid_entry_number(entry_number):
+        raise OperationError("Invalid entry number.")
+    if school.find_student(entry_number):
+        raise OperationError("Entry number already exists.")
+    if isinstance(subjects, dict):
+        subjects = subjects.items()
+    grades = [(subject, _grade(grade)) for subject, grade in subjects or []]
+    student = Student(name, class_no, entry_number, 0.0, password)
+    if grades:
+        student.add_subjects(grades)
+    classroom.add_student(student)
+    return student_summary(student)
+
+
+def list_students(school):
+    return {class_no: [student_summary(student) for student in classroom.iter_students()]
+            for class_no, classroom in school.classes.items() if classroom.students}
+
+
+def fee_records(school):
+    return {class_no: [{"entry_number": entry_number, "name": student.name, "fees": student.fees}
+                       for entry_number, student in classroom.students.items()]
+            for class_no, classroom in school.classes.items() if classroom.students}
+
+
+def update_fee(school, admin, entry_number, fee):
+    entry_number = _int(entry_number, "Invalid entry number.")
+    if not school.find_student(entry_number):
+        raise OperationError("Student not found.")
+    fee = _int(fee, "Invalid fee amount.")
+    if fee < 0:
+        raise OperationError("Invalid fee amount.")
+    if not admin.update_student_fee(entry_number, fee):
+        raise OperationError("Failed to update fee.")
+    return {"entry_number": entry_number, "fees": fee}
+
+
+def _amount(amount):
+    amount = _int(amount, "Invalid amount.")
+    if amount <= 0:
+        raise OperationError("Invalid amount.")
+    return amount
+
+
+def post_fee(school, entry_number, kind, amount, memo=""):
+    entry_number = _int(entry_number, "Invalid entry number.")
+    if not school.find_student(entry_number):
+        raise OperationError("Student not found.")
+    if kind not in KINDS or kind == ADJUSTMENT:
+        raise OperationError("Invalid transaction type.")
+    amount = _amount(amount)
+    balance = school.post_fee(entry_number, kind, amount, memo)
+    if balance is None:
+        raise OperationError("Failed to record transaction.")
+    return {"entry_number": entry_number, "kind": kind, "amount": amount, "balance": balance}
+
+
+def post_term_fee(school, amount, memo="", class_nos=None):
+    amount = _amount(amount)
+    if isinstance(class_nos, str):
+        class_nos = class_nos.split()
+    for class_no in class_nos or []:
+        _class(school, class_no)
+    posting_id, charged = school.post_term_fee(amount, memo, class_nos or None)
+    return {"posting_id": posting_id, "amount": amount, "students": charged}
+
+
+def outstanding_dues(school, more_than=0, limit=50):
+    more_than = _int(more_than, "Invalid amount.")
+    limit = _int(limit, "Invalid limit.")
+    return {
+        "count": school.ledger.count_owing_more_than(more_than),
+        "total_owed": school.ledger.owed_total,
+        "students": [dict(student_summary(student), class_no=student.class_, balance=balance)
+                     for student, balance in school.outstanding_dues(more_than, limit)],
+    }
+
+
+def top_students(school, limit=10, class_no=None):
+    limit = _int(limit, "Invalid limit.")
+    if class_no is not None:
+        _class(school, class_no)
+    return {"students": [dict(student_summary(student), class_no=student.class_, gpa=gpa)
+                         for student, gpa in school.top_students(limit, class_no)]}
+
+
+def attendance_report(school, class_no=None, below=DEFAULT_THRESHOLD, first=None, last=None):
+    # Attendance of the whole school or one class between the first and last dates, and the
+    # students whose rate is below the threshold
+    if class_no is not None:
+        _class(school, class_no)
+    try:
+        below = float(below)
+    except (TypeError, ValueError):
+        raise OperationError("Invalid percentage.")
+    first, last = _date(first), _date(last)
+    if class_no is not None:
+        present, marked = school.class_attendance(class_no, first, last)
+    else:
+        present, marked = school.attendance.totals(school.student_index, first, last)
+    return dict(_rate(present, marked), class_no=class_no,
+                students_below=[dict(student_summary(student), class_no=student.class_, rate=rate)
+                                for student, rate in school.low_attendance(below, class_no, first, last)])
+
+
+def search_names(school, query, limit=20):
+    limit = _int(limit, "Invalid limit.")
+    return {
+        "students": [dict(student_summary(student), class_no=student.class_)
+                     for student in school.search_students(query, limit)],
+        "teachers": [teacher_summary(teacher) for teacher in school.search_teachers(query, limit)],
+    }
+
+
+def change_admin_password(admin, current_password, new_password):
+    if not admin.authenticate("admin", current_password):
+        raise OperationError("Incorrect current password.")
+    admin.update_password(new_password)
+    return {}
+
+
+# Teacher operations
+
+def teacher_details(teacher):
+    details = teacher_summary(teacher)
+    details["classes"] = sorted(teacher.classes_to_teach)
+    return details
+
+
+def teacher_classes(school, teacher):
+    classes = []
+    for class_no in sorted(teacher.classes_to_teach):
+        if class_no in school.classes:
+            count, mean, lowest, highest = school.class_stats(class_no)
+            classes.append({"class_no": class_no, "incharge": school.classes[class_no].incharge,
+                            "count": count, "average_gpa": mean})
+    return classes
+
+
+def _taught_class(school, teacher, class_no):
+    if class_no not in teacher.classes_to_teach:
+        raise OperationError("You don't teach this class.")
+    if class_no not in school.classes:
+        raise OperationError("Class not found.")
+    return school.classes[class_no]
+
+
+def class_students(school, teacher, class_no, offset=0, limit=None):
+    classroom = _taught_class(school, teacher, class_no)
+    return [student_summary(student) for student in classroom.iter_students(offset, limit)]
+
+
+def update_grade(school, teacher, class_no, entry_number, grade):
+    classroom = _taught_class(school, teacher, class_no)
+    entry_number = _int(entry_number, "Invalid entry number.")
+    student = classroom.get_student(entry_number)
+    if not student:
+        raise OperationError("Student not found in this class.")
+    grade = _grade(grade)
+    student.add_subject(teacher.subject, grade)
+    return {"entry_number": entry_number, "subject": teacher.subject, "grade": grade, "gpa": student.gpa}
+
+
+def update_grades(school, teacher, class_no, grades):
+    # grades is a dict or list of [entry_number, grade]; all of them are applied or none
+    classroom = _taught_class(school, teacher, class_no)
+    if isinstance(grades, dict):
+        grades = grades.items()
+    errors = teacher.update_grades(classroom, grades)
+    if errors:
+        raise OperationError("; ".join(f"Entry Number {entry_number}: {message}" for entry_number, message in errors))
+    return {"class_no": class_no, "subject": teacher.subject, "average_gpa": classroom.class_average()}
+
+
+def mark_attendance(school, teacher, class_no, absent=(), day=None, period=None):
+    # Marks the whole class present for one period (1-based) or, without a period, the whole day,
+    # except the entry numbers in absent. The date defaults to today.
+    classroom = _taught_class(school, teacher, class_no)
+    day = _date(day) or date.today()
+    if period is not None and period != "":
+        period = _int(period, "Invalid period.") - 1
+        if not 0 <= period < school.attendance.periods:
+            raise OperationError("Invalid period.")
+    else:
+        period = None
+    errors = classroom.mark_attendance(day, period, absent)
+    if errors:
+        raise OperationError("; ".join(f"Entry Number {entry_number}: {message}" for entry_number, message in errors))
+    # Every entry number was accepted, so each is an int in the class; "7" and 7 are one student
+    absent = {int(entry_number) for entry_number in absent}
+    return {"class_no": class_no, "date": day.isoformat(), "period": None if period is None else period + 1,
+            "absent": len(absent), "present": len(classroom.roster) - len(absent)}
+
+
+def change_password(user, current_password, new_password):
+    if not user.update_password(current_password, new_password):
+        raise OperationError("Current password is incorrect.")
+    return {}
+
+
+# Student operations
+
+def student_info(student):
+    info = {
+        "name": student.name,
+        "class_no": student.class_,
+        "entry_number": student.entry_number,
+        "gpa": student.gpa,
+        "fees": student.fees,
+        "subjects": student.grades,
+    }
+    classroom = student.classroom
+    if classroom:
+        rank, count, percentile = classroom.rank_of(student)
+        info["class_rank"] = {"rank": rank, "of": count, "percentile": percentile}
+        if classroom.school:
+            rank, count, percentile = classroom.school.school_rank(student)
+            info["school_rank"] = {"rank": rank, "of": count, "percentile": percentile}
+            info["attendance"] = _rate(*classroom.school.attendance_rate(student.entry_number))
+    return info
+
+
+def fee_status(student):
+    return {"name": student.name, "class_no": student.class_, "entry_number": student.entry_number,
+            "fees": student.fees}
+
+
+def fee_statement(school, student):
+    statement = school.ledger.statement(student.entry_number)
+    opening, postings = statement if statement else (student.fees, [])
+    return {
+        "entry_number": student.entry_number,
+        "opening_balance": opening,
+        "transactions": [{"id": posting_id, "kind": kind, "amount": amount, "memo": memo, "posted_at": posted_at,
+                          "balance": balance}
+                         for (posting_id, kind, amount, memo, posted_at), balance in postings],
+        "balance": student.fees,
+    }
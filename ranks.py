@@ -0,0 +1,176 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from heapq import merge
+from itertools import islice
+
+# GPA ranks and percentiles, kept up to date as GPAs change instead of sorting on each request.
+#
+# GPAs are ranked to two decimal places, the precision they are shown with, so students whose GPAs
+# show the same share a rank. A GPA's key is its place in rank order: 0 for 100.00 up to TOP for
+# 0.00. Each Classroom keeps a ClassRanks array of its students in rank order. The School
+# keeps a SchoolRanks Fenwick tree counting students per key, which answers rank and percentile
+# in O(log TOP) steps however many students there are.
+
+SCALE = 100
+TOP = 100 * SCALE
+ENTRY_BITS = 40  # Entry numbers must be below 2 ** 40
+ENTRY_MASK = (1 << ENTRY_BITS) - 1
+REBUILD_FRACTION = 4  # A batch changing more than 1/4 of a class re-sorts its ranks instead
+
+
+def gpa_key(gpa):
+    key = TOP - round(gpa * SCALE)
+    return key if 0 <= key <= TOP else (0 if key < 0 else TOP)
+
+
+def key_gpa(key):
+    return (TOP - key) / SCALE
+
+
+def valid_entry_number(entry_number):
+    # An entry number is packed below the GPA key, so it must be an int that fits in ENTRY_BITS
+    return type(entry_number) is int and 0 <= entry_number <= ENTRY_MASK
+
+
+def _percentile(better, equal, count):
+    # Percentile rank: the share of students below, counting half of those level with the student
+    if not count:
+        return 0.0
+    return 100.0 * (count - better - equal + equal / 2) / count
+
+
+class ClassRanks:
+    # Classes hold hundreds of students, so a sorted array is quick to update. Each student is one
+    # 64-bit entry, key << ENTRY_BITS | entry_number, so the array is compact and a lookup does not
+    # chase pointers. Changes are made under the class lock; each is a single array operation, so
+    # readers always see a sorted array.
+    __slots__ = ("order",)
+
+    def __init__(self, students=()):
+        self.order = array("q", sorted(gpa_key(student.gpa) << ENTRY_BITS | student.entry_number
+                                       for student in students))
+
+    def __len__(self):
+        return len(self.order)
+
+    def add(self, entry_number, gpa):
+        insort(self.order, gpa_key(gpa) << ENTRY_BITS | entry_number)
+
+    def remove(self, entry_number, gpa):
+        self._remove(gpa_key(gpa) << ENTRY_BITS | entry_number)
+
+    def _remove(self, item):
+        order = self.order
+        i = bisect_left(order, item)
+        if i < len(order) and order[i] == item:
+            del order[i]
+
+    def move(self, entry_number, old_gpa, new_gpa):
+        old_key, new_key = gpa_key(old_gpa), gpa_key(new_gpa)
+        if old_key != new_key:
+            self._remove(old_key << ENTRY_BITS | entry_number)
+            insort(self.order, new_key << ENTRY_BITS | entry_number)
+
+    def rank(self, gpa):
+        # 1 + the number of students with a higher GPA
+        return bisect_left(self.order, gpa_key(gpa) << ENTRY_BITS) + 1
+
+    def percentile(self, gpa):
+        key = gpa_key(gpa)
+        better = bisect_left(self.order, key << ENTRY_BITS)
+        equal = bisect_left(self.order, (key + 1) << ENTRY_BITS) - better
+        return _percentile(better, equal, len(self.order))
+
+    def top(self, k=10):
+        # Returns [(entry_number, ranked GPA)] for the k best, best first
+        return [(item & ENTRY_MASK, key_gpa(item >> ENTRY_BITS)) for item in self.order[:k]]
+
+
+class SchoolRanks:
+    def __init__(self):
+        # Fenwick tree over keys, 1-based. Its size is a power of two so that the update paths of
+        # any two keys meet inside it.
+        self.tree = array("q", bytes(8 * ((1 << (TOP + 1).bit_length()) + 1)))
+        self.count = 0
+        self.lock = threading.Lock()  # Changes arrive from many classes at once
+
+    def __len__(self):
+        return self.count
+
+    def _add(self, key, delta):
+        tree = self.tree
+        i = key + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _before(self, key):
+        # Number of students whose key is below key, that is whose GPA ranks higher
+        tree = self.tree
+        total = 0
+        i = key
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, gpa):
+        with self.lock:
+            self._add(gpa_key(gpa), 1)
+            self.count += 1
+
+    def remove(self, gpa):
+        with self.lock:
+            self._add(gpa_key(gpa), -1)
+            self.count -= 1
+
+    def move(self, old_gpa, new_gpa):
+        # Takes one from the old key's counts and adds one to the new key's. The two update paths
+        # join at the first node covering both keys, and from there the changes cancel out, so
+        # a small change in GPA touches only a few nodes.
+        i, j = gpa_key(old_gpa) + 1, gpa_key(new_gpa) + 1
+        if i != j:
+            tree = self.tree
+            with self.lock:
+                while i != j:
+                    if i < j:
+                        tree[i] -= 1
+                        i += i & -i
+                    else:
+                        tree[j] += 1
+                        j += j & -j
+
+    def rank(self, gpa):
+        return self._before(gpa_key(gpa)) + 1
+
+    def percentile(self, gpa):
+        key = gpa_key(gpa)
+        with self.lock:
+            better = self._before(key)
+            equal = self._before(key + 1) - better
+            return _percentile(better, equal, self.count)
+
+    def gpa_at_rank(self, rank):
+        # The ranked GPA of the student in place `rank` (1 is the best), or None if there are fewer
+        # students; e.g. the cut-off for the top 10% is gpa_at_rank(ceil(count / 10))
+        with self.lock:
+            if not 1 <= rank <= self.count:
+                return None
+            tree = self.tree
+            position = 0
+            step = len(tree) - 1
+            while step:
+                following = position + step
+                if following < len(tree) and tree[following] < rank:
+                    position = following
+                    rank -= tree[following]
+                step >>= 1
+            return key_gpa(position)
+
+
+def top_of_classes(classrooms, k=10):
+    # Returns [(entry_number, ranked GPA)] for the k best students across classrooms, merging
+    # the classes' lists, which are already in rank order
+    merged = merge(*(classroom.ranks.order for classroom in classrooms))
+    return [(item & ENTRY_MASK, key_gpa(item >> ENTRY_BITS)) for item in islice(merged, k)]
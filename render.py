@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+
+# Terminal output for the menus. Each screen is built as a list of lines and written to the
+# terminal in one go, the screen is cleared with ANSI escape codes instead of running a
+# shell command, and listings longer than the terminal are shown a page at a time.
+
+CLEAR = "\033[2J\033[3J\033[H"  # Clear the screen and scrollback, then move to the top left
+MORE_PROMPT = "-- More: Enter for the next page, q to stop -- "
+
+_ansi_ready = False
+
+
+def _enable_ansi():
+    # Windows consoles only understand escape codes once virtual terminal processing is on
+    global _ansi_ready
+    if _ansi_ready:
+        return
+    _ansi_ready = True
+    if os.name == "nt":
+        try:
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.GetStdHandle(-11)  # STD_OUTPUT_HANDLE
+            mode = ctypes.c_uint32()
+            if kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+                kernel32.SetConsoleMode(handle, mode.value | 0x0004)  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+        except (AttributeError, OSError):
+            pass
+
+
+def _interactive(out):
+    return out.isatty() and sys.stdin.isatty()
+
+
+def write(lines, out=None, clear=False):
+    # Writes all the lines with a single write call, optionally clearing the screen first
+    out = out or sys.stdout
+    text = "\n".join(lines) + "\n" if lines else ""
+    if clear and out.isatty():
+        _enable_ansi()
+        text = CLEAR + text
+    out.write(text)
+    out.flush()
+
+
+def clear_screen(out=None):
+    write([], out, clear=True)
+
+
+def page(lines, out=None, page_size=None):
+    # Writes lines a terminal-full at a time, asking before each further page.
+    # Output that is not an interactive terminal is written in one piece.
+    out = out or sys.stdout
+    if page_size is None:
+        page_size = shutil.get_terminal_size().lines - 2 if _interactive(out) else 0
+    if page_size <= 0 or len(lines) <= page_size:
+        write(lines, out)
+        return
+    for start in range(0, len(lines), page_size):
+        write(lines[start:start + page_size], out)
+        if start + page_size < len(lines):
+            if input(MORE_PROMPT).strip().lower() == "q":
+                break
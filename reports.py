@@ -0,0 +1,262 @@
+import argparse
+import csv
+import html
+import io
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from main import Interface
+
+# Term-end report cards for every student, written as text, HTML or CSV files.
+#
+# The school is split into one shard per class. Each shard carries only what its report cards
+# need (no passwords), is rendered by a worker process, and is written to its own file in
+# 64 KB chunks: <class>.txt, <class>.html or <class>.csv, or one file per student with
+# per_student. Class and subject averages are worked out once per shard. Class and school ranks
+# and percentiles are read from the rank structures kept by Classroom and School as the shard is built.
+#
+# The parent builds each shard and sends it to a worker. Workers are started fresh (forkserver
+# where available, else spawn) rather than forked from this process, whose other threads may
+# hold locks that a forked child would find held forever.
+#
+#   python reports.py reports/ --format html --workers 4
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = {"text": ".txt", "html": ".html", "csv": ".csv"}
+CSV_FIELDS = ["class_no", "entry_number", "name", "subject", "grade", "class_subject_average", "gpa", "class_rank",
+              "class_size", "class_percentile", "school_rank", "school_size", "school_percentile",
+              "class_average_gpa", "fees"]
+
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ font-family: sans-serif; }}
+.card {{ page-break-after: always; margin-bottom: 2em; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #999; padding: 2px 8px; text-align: left; }}
+</style></head><body>
+"""
+HTML_TAIL = "</body></html>\n"
+
+
+def safe_name(name):
+    # Class numbers become file names, so a leading dot and any character outside letters, digits,
+    # "_", "." and "-" are written as %XX. No two class numbers get the same name: "10/A" is "10%2FA".
+    escaped = re.sub(r"^\.|[^\w.-]", lambda match: "".join(f"%{byte:02X}" for byte in match.group().encode()),
+                     str(name))
+    return escaped or "%"
+
+
+def class_shard(school, classroom):
+    # Returns the plain data a worker needs for one class's report cards
+    teachers = [(school.teachers[teacher_id].name, school.teachers[teacher_id].subject)
+                for teacher_id in sorted(school.teachers_of(classroom.class_no)) if teacher_id in school.teachers]
+    return {
+        "school_name": school.school_name,
+        "class_no": classroom.class_no,
+        "incharge": classroom.incharge,
+        "teachers": teachers,
+        # Each student also carries (rank, size, percentile) in the class and in the school
+        "students": [(student.entry_number, student.name, student.gpa, student.fees, dict(student.grades),
+                      classroom.rank_of(student), school.school_rank(student))
+                     for student in classroom.iter_students()],
+    }
+
+
+def class_context(shard):
+    # Class-level figures shared by every card of the shard: the class average and subject averages
+    students = shard["students"]
+    count = len(students)
+    average = sum(student[2] for student in students) / count if count else 0.0
+    totals = {}
+    for student in students:
+        for subject, grade in student[4].items():
+            total, n = totals.get(subject, (0.0, 0))
+            totals[subject] = (total + grade, n + 1)
+    subject_averages = {subject: total / n for subject, (total, n) in totals.items()}
+    return {"count": count, "average": average, "subject_averages": subject_averages}
+
+
+def rank_text(label, rank):
+    position, size, percentile = rank
+    return f"{label} Rank: {position} of {size} (Percentile: {percentile:.1f})"
+
+
+def text_card(shard, context, student):
+    entry_number, name, gpa, fees, grades, class_rank, school_rank = student
+    teachers = ", ".join(f"{teacher} ({subject})" for teacher, subject in shard["teachers"]) or "None"
+    lines = [
+        "========== REPORT CARD ==========",
+        f"School: {shard['school_name']}",
+        f"Name: {name}",
+        f"Class: {shard['class_no']} (Incharge: {shard['incharge']})",
+        f"Teachers: {teachers}",
+        f"Entry Number: {entry_number}",
+        f"GPA: {gpa:.2f}",
+        rank_text("Class", class_rank),
+        rank_text("School", school_rank),
+        f"Class Average GPA: {context['average']:.2f}",
+        f"Fees: ${fees}",
+        "Subjects: ",
+    ]
+    if not grades:
+        lines.append("  No subjects enrolled")
+    for subject, grade in grades.items():
+        lines.append(f"  {subject} - {grade:.2f} (class average {context['subject_averages'][subject]:.2f})")
+    lines.extend(["=================================", "", ""])
+    return "\n".join(lines)
+
+
+def html_card(shard, context, student):
+    entry_number, name, gpa, fees, grades, class_rank, school_rank = student
+    e = html.escape
+    teachers = ", ".join(f"{e(teacher)} ({e(subject)})" for teacher, subject in shard["teachers"]) or "None"
+    rows = "".join(f"<tr><td>{e(subject)}</td><td>{grade:.2f}</td>"
+                   f"<td>{context['subject_averages'][subject]:.2f}</td></tr>"
+                   for subject, grade in grades.items()) or '<tr><td colspan="3">No subjects enrolled</td></tr>'
+    return (f'<section class="card"><h1>{e(shard["school_name"])}</h1><h2>Report Card: {e(name)}</h2>'
+            f"<p>Class: {e(shard['class_no'])} (Incharge: {e(shard['incharge'])})<br>Teachers: {teachers}<br>"
+            f"Entry Number: {entry_number}<br>GPA: {gpa:.2f}<br>"
+            f"{rank_text('Class', class_rank)}<br>{rank_text('School', school_rank)}<br>"
+            f"Class Average GPA: {context['average']:.2f}<br>Fees: ${fees}</p>"
+            f"<table><tr><th>Subject</th><th>Grade</th><th>Class Average</th></tr>{rows}</table></section>\n")
+
+
+def csv_rows(shard, context, student):
+    # One row per subject (or one row with no subject), in CSV_FIELDS order
+    entry_number, name, gpa, fees, grades, class_rank, school_rank = student
+    head = [shard["class_no"], entry_number, name]
+    tail = [round(gpa, 2), class_rank[0], class_rank[1], round(class_rank[2], 1), school_rank[0], school_rank[1],
+            round(school_rank[2], 1), round(context["average"], 2), fees]
+    if not grades:
+        return [head + ["", "", ""] + tail]
+    subject_averages = context["subject_averages"]
+    return [head + [subject, grade, round(subject_averages[subject], 2)] + tail for subject, grade in grades.items()]
+
+
+class ChunkedWriter:
+    # Collects text and writes it to the file in chunks of about CHUNK_SIZE bytes
+    def __init__(self, path, fmt, title):
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.buffer = io.StringIO()
+        self.fmt = fmt
+        self.characters = 0
+        if fmt == "csv":
+            self.csv = csv.writer(self.buffer)
+            self.csv.writerow(CSV_FIELDS)
+        elif fmt == "html":
+            self.buffer.write(HTML_HEAD.format(title=html.escape(title)))
+
+    def write_card(self, shard, context, student):
+        if self.fmt == "csv":
+            self.csv.writerows(csv_rows(shard, context, student))
+        elif self.fmt == "html":
+            self.buffer.write(html_card(shard, context, student))
+        else:
+            self.buffer.write(text_card(shard, context, student))
+        if self.buffer.tell() >= CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        text = self.buffer.getvalue()
+        self.file.write(text)
+        self.characters += len(text)
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+    def close(self):
+        if self.fmt == "html":
+            self.buffer.write(HTML_TAIL)
+        self._flush()
+        self.file.close()
+
+
+def render_shard(shard, directory, fmt="text", per_student=False):
+    # Writes the report cards of one class; returns (class_no, cards written, characters written)
+    context = class_context(shard)
+    extension = FORMATS[fmt]
+    class_name = safe_name(shard["class_no"])
+    written = 0
+    if per_student:
+        class_directory = os.path.join(directory, class_name)
+        os.makedirs(class_directory, exist_ok=True)
+        for student in shard["students"]:
+            writer = ChunkedWriter(os.path.join(class_directory, f"{student[0]}{extension}"), fmt,
+                                   f"Report Card: {student[1]}")
+            writer.write_card(shard, context, student)
+            writer.close()
+            written += writer.characters
+    else:
+        writer = ChunkedWriter(os.path.join(directory, class_name + extension), fmt,
+                               f"Report Cards: Class {shard['class_no']}")
+        for student in shard["students"]:
+            writer.write_card(shard, context, student)
+        writer.close()
+        written = writer.characters
+    return shard["class_no"], len(shard["students"]), written
+
+
+def generate_reports(school, directory, fmt="text", workers=None, class_nos=None, per_student=False):
+    # Renders report cards for the given classes (default: all) with a pool of worker processes,
+    # one class per task. workers=1 renders in this process. Returns (students, characters, seconds).
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    classes = school.classes
+    classrooms = [classes[class_no] for class_no in (class_nos or list(classes)) if class_no in classes]
+    workers = workers or os.cpu_count() or 1
+    students = characters = 0
+    if workers == 1:
+        for classroom in classrooms:
+            _, count, written = render_shard(class_shard(school, classroom), directory, fmt, per_student)
+            students += count
+            characters += written
+        return students, characters, time.perf_counter() - start
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        # Tasks are submitted as workers free up, so only a few shards are in memory at once
+        pending = set()
+        remaining = iter(classrooms)
+        while True:
+            for classroom in remaining:
+                pending.add(pool.submit(render_shard, class_shard(school, classroom), directory, fmt, per_student))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _, count, written = future.result()
+                students += count
+                characters += written
+    return students, characters, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write report cards for every student.")
+    parser.add_argument("directory", help="Directory to write the report cards to")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="text")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--classes", nargs="+", help="Only these classes")
+    parser.add_argument("--per-student", action="store_true", help="One file per student instead of per class")
+    parser.add_argument("--data-dir", default=os.environ.get("SCHOLARSYNC_DATA", "scholarsync_data"))
+    args = parser.parse_args()
+
+    interface = Interface(args.data_dir)
+    try:
+        missing = [class_no for class_no in args.classes or [] if class_no not in interface.school.classes]
+        if missing:
+            parser.error(f"Class {missing[0]} does not exist.")
+        students, _, elapsed = generate_reports(interface.school, args.directory, args.format, args.workers,
+                                                args.classes, args.per_student)
+    finally:
+        interface.close()
+    print(f"Wrote {students} report cards to {args.directory} in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+
+# In-memory name search for students and teachers.
+#
+# Names are split into lowercase word tokens. Each token maps to the keys of the records that
+# contain it, and a sorted list of the distinct tokens answers prefix lookups with bisect. A
+# trigram index over the distinct tokens finds near-miss spellings when a query word matches
+# nothing exactly or by prefix. Records are added and removed one at a time as the school changes.
+
+TOKEN = re.compile(r"[^\W_]+")
+
+EXACT, PREFIX, FUZZY = 3, 2, 1  # Score of a query word matching a token exactly, by prefix or by spelling
+MIN_PREFIX = 2  # Shorter query words only match whole tokens, so "j" does not pull in every J name
+
+
+def tokenize(name):
+    return TOKEN.findall(name.lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(token):
+    # Short words allow one typo, long words two
+    if len(token) < 3:
+        return 0
+    return 1 if len(token) < 9 else 2
+
+
+def within_distance(a, b, limit):
+    # Edit distance check (a swap of two neighbouring letters counts as one edit) that gives up
+    # as soon as every path costs more than limit
+    if abs(len(a) - len(b)) > limit:
+        return False
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if before is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+class NameIndex:
+    def __init__(self):
+        self.names = {}  # Dict with record key as key and name as value
+        self.name_tokens = {}  # Dict with record key as key and tuple of its name's tokens as value
+        self.sort_names = {}  # Dict with record key as key and (lowercase name, key) as value, for ordering
+        self.postings = {}  # Dict with token as key and set of record keys as value
+        self.tokens = []  # Distinct tokens, kept in sorted order for prefix lookups
+        self.token_trigrams = {}  # Dict with trigram as key and set of tokens as value
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, key, name):
+        with self.lock:
+            if key in self.names:
+                self._remove(key)
+            tokens = tuple(tokenize(name))
+            self.names[key] = name
+            self.name_tokens[key] = tokens
+            self.sort_names[key] = (name.lower(), key)
+            for token in set(tokens):
+                keys = self.postings.get(token)
+                if keys is None:
+                    keys = self.postings[token] = set()
+                    insort(self.tokens, token)
+                    for trigram in trigrams(token):
+                        self.token_trigrams.setdefault(trigram, set()).add(token)
+                keys.add(key)
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        if self.names.pop(key, None) is None:
+            return
+        del self.sort_names[key]
+        for token in set(self.name_tokens.pop(key)):
+            keys = self.postings[token]
+            keys.discard(key)
+            if not keys:
+                del self.postings[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+                for trigram in trigrams(token):
+                    similar = self.token_trigrams[trigram]
+                    similar.discard(token)
+                    if not similar:
+                        del self.token_trigrams[trigram]
+
+    def _prefixed(self, prefix):
+        start = bisect_left(self.tokens, prefix)
+        for i in range(start, len(self.tokens)):
+            token = self.tokens[i]
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def _similar(self, word):
+        limit = max_edits(word)
+        if not limit:
+            return set()
+        shortest, longest = len(word) - limit, len(word) + limit
+        # Each edit changes at most three trigrams, so a close spelling shares at least `needed` of
+        # them and must turn up in at least one of the rarest len - needed + 1 trigram lists
+        lists = sorted((self.token_trigrams.get(trigram, ()) for trigram in trigrams(word)), key=len)
+        needed = len(lists) - 3 * limit
+        similar = set()
+        for tokens in lists[:len(lists) - max(needed, 1) + 1]:
+            for token in tokens:
+                if token in similar or not shortest <= len(token) <= longest:
+                    continue
+                if sum(token in other for other in lists) >= needed and within_distance(word, token, limit):
+                    similar.add(token)
+        # Two swapped letters can change four trigrams, so look those spellings up directly
+        for i in range(len(word) - 1):
+            swapped = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+            if swapped in self.postings:
+                similar.add(swapped)
+        return similar
+
+    def _matches(self, word, fuzzy):
+        # Yields (score, token) for the name tokens that word matches, best first: the word itself,
+        # then the tokens it starts in alphabetical order, then (only if there were none) close spellings
+        found = word in self.postings
+        if found:
+            yield EXACT, word
+        if len(word) >= MIN_PREFIX:
+            for token in self._prefixed(word):
+                if token != word:
+                    found = True
+                    yield PREFIX, token
+        if not found and fuzzy:
+            for token in sorted(self._similar(word)):
+                yield FUZZY, token
+
+    def _search_word(self, word, limit, kind, fuzzy):
+        # The matches come in rank order, so stop as soon as there are enough records
+        results = []
+        seen = set()
+        for _, token in self._matches(word, fuzzy):
+            group = [key for key in self.postings[token] if key not in seen and (kind is None or key[0] == kind)]
+            seen.update(group)
+            results.extend(heapq.nsmallest(limit - len(results), group, key=self.sort_names.__getitem__))
+            if len(results) >= limit:
+                break
+        return results
+
+    def search(self, query, limit=20, kind=None, fuzzy=True):
+        # Returns up to limit record keys whose names match every word of the query, best first.
+        # A one-word query ranks exact matches first, then completions of the word in alphabetical
+        # order, then close spellings. Longer queries add up each word's score and rank by the total.
+        words = sorted(set(tokenize(query)))
+        if not words:
+            return []
+        with self.lock:
+            if len(words) == 1:
+                return self._search_word(words[0], limit, kind, fuzzy)
+            postings = self.postings
+            name_tokens = self.name_tokens
+            matched = {word: list(self._matches(word, fuzzy)) for word in words}
+            if not all(matched.values()):
+                return []
+            # Start from the word with the fewest records and narrow down with the others. A word
+            # with many more records than are left is checked against each remaining name instead.
+            sizes = {word: sum(len(postings[token]) for _, token in matched[word]) for word in words}
+            candidates = None
+            for word in sorted(words, key=sizes.get):
+                if candidates is None:
+                    candidates = set().union(*(postings[token] for _, token in matched[word]))
+                elif sizes[word] > 4 * len(candidates):
+                    tokens = {token for _, token in matched[word]}
+                    candidates = {key for key in candidates if not tokens.isdisjoint(name_tokens[key])}
+                else:
+                    candidates.intersection_update(set().union(*(postings[token] for _, token in matched[word])))
+                if not candidates:
+                    return []
+            if kind is not None:
+                candidates = {key for key in candidates if key[0] == kind}
+
+            # Every candidate matches every word, so candidates differ only in how many words they
+            # contain exactly rather than as a prefix; rank by that, then alphabetically
+            bonus = {}
+            for word in words:
+                for key in candidates.intersection(postings.get(word, ())):
+                    bonus[key] = bonus.get(key, 0) + EXACT - PREFIX
+            groups = {0: candidates.difference(bonus)}
+            for key, extra in bonus.items():
+                groups.setdefault(extra, []).append(key)
+            results = []
+            for extra in sorted(groups, reverse=True):
+                results.extend(heapq.nsmallest(limit - len(results), groups[extra], key=self.sort_names.__getitem__))
+                if len(results) >= limit:
+                    break
+            return results
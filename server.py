@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import inspect
+import itertools
+import json
+import logging
+import os
+from functools import partial
+
+import operations
+from main import Interface
+from operations import OperationError
+
+# Multi-session server mode. Each client connection is one session speaking newline-delimited
+# JSON over TCP or a Unix socket:
+#
+#   -> {"id": 1, "op": "login", "role": "teacher", "teacher_id": 7, "password": "..."}
+#   <- {"id": 1, "ok": true, "result": {"role": "teacher", "name": "..."}}
+#   -> {"id": 2, "op": "update_grade", "args": {"class_no": "10A", "entry_number": 42, "grade": 91}}
+#   <- {"id": 2, "ok": true, "result": {...}}
+#
+# All sessions share one School. Most handlers run on the event loop thread and never await in
+# the middle of a change, so each operation is applied whole before the next one starts. Hashing
+# or checking a password is the one slow step: logins check on the credential thread pool, and
+# the operations in PASSWORD_OPERATIONS run whole on a worker thread, relying on the School's
+# locks as any other concurrent writer does.
+
+log = logging.getLogger("scholarsync.server")
+
+# Longest request line a session may send, and longest response line a Client accepts; a roster
+# or fee listing for a whole school can run to several megabytes
+MAX_REQUEST_BYTES = 1 << 20
+MAX_RESPONSE_BYTES = 1 << 28
+
+# Operations that hash a new password or check the current one, which takes tens of milliseconds
+PASSWORD_OPERATIONS = {"add_student", "add_teacher", "change_password"}
+
+# Arguments that must arrive as a list (or one of the other JSON types the operation accepts),
+# so that a string is not taken apart character by character
+LIST_ARGUMENTS = {
+    "absent": ((list,), "a list of entry numbers"),
+    "grades": ((list, dict), "a list of [entry_number, grade] pairs or an object"),
+    "subjects": ((list, dict, type(None)), "a list of [subject, grade] pairs or an object"),
+    "classes": ((list, str), "a list of class numbers"),
+    "class_nos": ((list, str, type(None)), "a list of class numbers"),
+}
+
+
+def admin_operations(school, admin):
+    return {
+        "school_details": partial(operations.school_details, school),
+        "add_teacher": partial(operations.add_teacher, school, admin),
+        "remove_teacher": partial(operations.remove_teacher, school, admin),
+        "list_teachers": partial(operations.list_teachers, school),
+        "add_class": partial(operations.add_class, school, admin),
+        "remove_class": partial(operations.remove_class, school, admin),
+        "class_details": partial(operations.class_details, school),
+        "add_student": partial(operations.add_student, school),
+        "list_students": partial(operations.list_students, school),
+        "fee_records": partial(operations.fee_records, school),
+        "update_fee": partial(operations.update_fee, school, admin),
+        "post_fee": partial(operations.post_fee, school),
+        "post_term_fee": partial(operations.post_term_fee, school),
+        "outstanding_dues": partial(operations.outstanding_dues, school),
+        "top_students": partial(operations.top_students, school),
+        "attendance_report": partial(operations.attendance_report, school),
+        "search": partial(operations.search_names, school),
+        "change_password": partial(operations.change_admin_password, admin),
+    }
+
+
+def teacher_operations(school, teacher):
+    return {
+        "details": partial(operations.teacher_details, teacher),
+        "classes": partial(operations.teacher_classes, school, teacher),
+        "class_students": partial(operations.class_students, school, teacher),
+        "update_grade": partial(operations.update_grade, school, teacher),
+        "update_grades": partial(operations.update_grades, school, teacher),
+        "mark_attendance": partial(operations.mark_attendance, school, teacher),
+        "change_password": partial(operations.change_password, teacher),
+    }
+
+
+def student_operations(school, student):
+    return {
+        "info": partial(operations.student_info, student),
+        "fee_status": partial(operations.fee_status, student),
+        "fee_statement": partial(operations.fee_statement, school, student),
+        "change_password": partial(operations.change_password, student),
+    }
+
+
+async def read_line(reader):
+    # Returns the next line, b"" at the end of the stream, or None for a line over the reader's
+    # limit. The whole of an overlong line is skipped, so its tail is not read as a request.
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    while True:
+        try:
+            await reader.readexactly(consumed)
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+
+
+class Session:
+    def __init__(self):
+        self.role = None
+        self.name = None
+        self.handlers = {}
+        self.signatures = {}  # Dict with op as key and the handler's inspect.Signature as value
+
+
+class SchoolServer:
+    def __init__(self, school, admin):
+        self.school = school
+        self.admin = admin
+        self.sessions = 0
+        self.requests = 0
+
+    async def login(self, session, request):
+        role = request.get("role")
+        password = request.get("password", "")
+        if role == "admin":
+            username = request.get("username", "")
+            ok = await asyncio.wrap_future(self.admin.authenticate_async(username, password))
+            if ok:
+                session.name = username
+                session.handlers = admin_operations(self.school, self.admin)
+        elif role == "teacher":
+            teacher = self.school.teachers.get(request.get("teacher_id"))
+            if not teacher:
+                raise OperationError("Teacher not found.")
+            ok = await asyncio.wrap_future(teacher.authenticate_async(password))
+            if ok:
+                session.name = teacher.name
+                session.handlers = teacher_operations(self.school, teacher)
+        elif role == "student":
+            student = self.school.find_student(request.get("entry_number"))
+            if not student:
+                raise OperationError("Student not found.")
+            ok = await asyncio.wrap_future(student.authenticate_async(password))
+            if ok:
+                session.name = student.name
+                session.handlers = student_operations(self.school, student)
+        else:
+            raise OperationError("Unknown role.")
+        if not ok:
+            raise OperationError("Invalid credentials.")
+        session.role = role
+        return {"role": role, "name": session.name}
+
+    async def handle_request(self, session, request):
+        op = request.get("op")
+        if op == "login":
+            return await self.login(session, request)
+        if op == "logout":
+            session.role, session.name, session.handlers, session.signatures = None, None, {}, {}
+            return {}
+        if session.role is None:
+            raise OperationError("Please log in first.")
+        handler = session.handlers.get(op)
+        if handler is None:
+            raise OperationError(f"Unknown operation for {session.role}: {op}")
+        args = request.get("args", {})
+        if not isinstance(args, dict):
+            raise OperationError(f"Invalid arguments for {op}: args must be an object")
+        # Arguments are checked against the handler's signature before the call, so a TypeError
+        # raised inside a handler is reported as the bug it is, not as bad arguments
+        signature = session.signatures.get(op)
+        if signature is None:
+            signature = session.signatures[op] = inspect.signature(handler)
+        try:
+            signature.bind(**args)
+        except TypeError as e:
+            raise OperationError(f"Invalid arguments for {op}: {e}")
+        for name, value in args.items():
+            if name in LIST_ARGUMENTS and not isinstance(value, LIST_ARGUMENTS[name][0]):
+                raise OperationError(f"Invalid arguments for {op}: {name} must be {LIST_ARGUMENTS[name][1]}")
+        if op in PASSWORD_OPERATIONS:
+            return await asyncio.get_running_loop().run_in_executor(None, partial(handler, **args))
+        return handler(**args)
+
+    async def handle_connection(self, reader, writer):
+        session = Session()
+        self.sessions += 1
+        try:
+            while True:
+                line = await read_line(reader)
+                if line == b"":
+                    break
+                self.requests += 1
+                request_id = None
+                try:
+                    request = json.loads(line) if line else None
+                except ValueError:
+                    request = None
+                try:
+                    if line is None:
+                        raise OperationError(f"Request too long; the limit is {MAX_REQUEST_BYTES} bytes.")
+                    if not isinstance(request, dict):
+                        raise OperationError("Invalid request.")
+                    request_id = request.get("id")
+                    response = {"id": request_id, "ok": True, "result": await self.handle_request(session, request)}
+                except OperationError as e:
+                    response = {"id": request_id, "ok": False, "error": str(e)}
+                except Exception:
+                    # The details stay in the server log; clients only learn that the request failed
+                    log.exception("Request %r failed in a %s session", request_id, session.role or "logged out")
+                    response = {"id": request_id, "ok": False, "error": "Internal error."}
+                writer.write(json.dumps(response, separators=(",", ":")).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.sessions -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_connection, path=unix_path, limit=MAX_REQUEST_BYTES)
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_REQUEST_BYTES)
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=8765, unix_path=None):
+        if unix_path:
+            reader, writer = await asyncio.open_unix_connection(unix_path, limit=MAX_RESPONSE_BYTES)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=MAX_RESPONSE_BYTES)
+        return cls(reader, writer)
+
+    async def request(self, op, **fields):
+        fields["op"] = op
+        fields["id"] = next(self.ids)
+        self.writer.write(json.dumps(fields, separators=(",", ":")).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        response = json.loads(await self.reader.readline())
+        if not response["ok"]:
+            raise OperationError(response["error"])
+        return response["result"]
+
+    async def call(self, op, **args):
+        return await self.request(op, args=args)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+async def serve(interface, host, port, unix_path):
+    server = await SchoolServer(interface.school, interface.admin).start(host, port, unix_path)
+    where = unix_path or f"{host}:{port}"
+    print(f"Serving {interface.school.school_name} on {where}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run ScholarSync as a multi-session server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument("--data-dir", default=os.environ.get("SCHOLARSYNC_DATA", "scholarsync_data"))
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    interface = Interface(args.data_dir)
+    try:
+        asyncio.run(serve(interface, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        interface.close()
+
+
+if __name__ == "__main__":
+    main()
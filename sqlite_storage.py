@@ -0,0 +1,251 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+from events import (ClassAdded, ClassRemoved, FeeUpdated, GradeChanged, SchoolReset, StudentEnrolled,
+                    StudentRemoved, TeacherAdded, TeacherAssigned, TeacherRemoved)
+
+# Optional SQLite storage for the School, used by open_storage for a path ending in one of
+# SQLITE_SUFFIXES. It keeps the same journal and snapshots as storage.Storage, as rows of one
+# database file, so the School, its objects and every front end work unchanged.
+#
+# It also keeps indexed tables of classes, students, grades and teachers, updated from the
+# School's change events, so that reports and outside tools can query the school in SQL.
+# Class averages and fee totals are computed there.
+#
+# Everything goes through one connection under one lock: a change, its journal record and any
+# query see the same data, and no reader ever waits on a database lock. Changes are committed in
+# batches, as Storage fsyncs in batches.
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (seq INTEGER PRIMARY KEY, record TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS snapshot (seq INTEGER PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS classes (class_no TEXT PRIMARY KEY, incharge TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS teachers (teacher_id INTEGER PRIMARY KEY, name TEXT NOT NULL, subject TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS teacher_classes (
+    teacher_id INTEGER NOT NULL,
+    class_no TEXT NOT NULL,
+    PRIMARY KEY (teacher_id, class_no)
+);
+CREATE INDEX IF NOT EXISTS teacher_classes_class_no ON teacher_classes(class_no);
+CREATE TABLE IF NOT EXISTS students (
+    entry_number INTEGER PRIMARY KEY,
+    class_no TEXT NOT NULL,
+    name TEXT NOT NULL,
+    fees INTEGER NOT NULL,
+    gpa REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS students_class_no ON students(class_no, entry_number);
+CREATE TABLE IF NOT EXISTS grades (
+    entry_number INTEGER NOT NULL,
+    subject TEXT NOT NULL,
+    grade REAL NOT NULL,
+    PRIMARY KEY (entry_number, subject)
+);
+"""
+
+# Statements are kept as constants so the connection reuses its compiled copy from sqlite3's
+# statement cache
+INSERT_RECORD = "INSERT INTO journal (seq, record) VALUES (?, ?)"
+SELECT_RECORDS = "SELECT record FROM journal WHERE seq > ? ORDER BY seq"
+INSERT_SNAPSHOT = "INSERT OR REPLACE INTO snapshot (seq, state) VALUES (?, ?)"
+SELECT_SNAPSHOT = "SELECT seq, state FROM snapshot ORDER BY seq DESC LIMIT 1"
+MIRROR_TABLES = ("classes", "teachers", "teacher_classes", "students", "grades")
+INSERT_CLASS = "INSERT OR REPLACE INTO classes (class_no, incharge) VALUES (?, ?)"
+DELETE_CLASS = "DELETE FROM classes WHERE class_no = ?"
+DELETE_CLASS_TEACHERS = "DELETE FROM teacher_classes WHERE class_no = ?"
+INSERT_TEACHER = "INSERT OR REPLACE INTO teachers (teacher_id, name, subject) VALUES (?, ?, ?)"
+DELETE_TEACHER = "DELETE FROM teachers WHERE teacher_id = ?"
+INSERT_TEACHER_CLASS = "INSERT OR IGNORE INTO teacher_classes (teacher_id, class_no) VALUES (?, ?)"
+DELETE_TEACHER_CLASS = "DELETE FROM teacher_classes WHERE teacher_id = ? AND class_no = ?"
+DELETE_TEACHER_CLASSES = "DELETE FROM teacher_classes WHERE teacher_id = ?"
+INSERT_STUDENT = "INSERT OR REPLACE INTO students (entry_number, class_no, name, fees, gpa) VALUES (?, ?, ?, ?, ?)"
+DELETE_STUDENT = "DELETE FROM students WHERE entry_number = ? AND class_no = ?"
+UPSERT_GRADE = """
+INSERT INTO grades (entry_number, subject, grade) VALUES (?, ?, ?)
+ON CONFLICT (entry_number, subject) DO UPDATE SET grade = excluded.grade
+"""
+DELETE_GRADE = "DELETE FROM grades WHERE entry_number = ? AND subject = ?"
+DELETE_GRADES = "DELETE FROM grades WHERE entry_number = ?"
+REFRESH_GPA = """
+UPDATE students SET gpa = COALESCE((SELECT AVG(grade) FROM grades WHERE entry_number = ?), 0.0)
+WHERE entry_number = ?
+"""
+UPDATE_FEE = "UPDATE students SET fees = ? WHERE entry_number = ?"
+SELECT_CLASS_AVERAGE = "SELECT COUNT(*), AVG(gpa) FROM students WHERE class_no = ?"
+SELECT_FEE_TOTAL = "SELECT COUNT(*), COALESCE(SUM(fees), 0) FROM students"
+SELECT_CLASS_FEE_TOTAL = "SELECT COUNT(*), COALESCE(SUM(fees), 0) FROM students WHERE class_no = ?"
+SELECT_ROSTER = "SELECT entry_number, name, fees, gpa FROM students WHERE class_no = ? ORDER BY entry_number"
+
+MIRROR_EVENTS = (ClassAdded, ClassRemoved, TeacherAdded, TeacherRemoved, TeacherAssigned, StudentEnrolled,
+                 StudentRemoved, GradeChanged, FeeUpdated, SchoolReset)
+
+
+class SqliteStorage:
+    # The same methods as storage.Storage, so School and open_storage can use either one
+    def __init__(self, path, sync_every=64, sync_interval=1.0, snapshot_every=50000):
+        self.path = path
+        self.sync_every = sync_every  # Commit after this many records...
+        self.sync_interval = sync_interval  # ...or after this many seconds, whichever comes first
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.snapshot_seq = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.school = None  # Set by mirror
+        self.lock_file = None  # Set by storage.open_storage
+        self.lock = threading.RLock()
+        # isolation_level=None leaves transactions to BEGIN and COMMIT here, so a batch spans many records
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None,
+                                          cached_statements=256)
+        if path != ":memory:":
+            self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = FULL")
+        self.connection.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def _execute(self, sql, params=()):
+        # Runs a change inside the current batch, starting one if needed; called with self.lock held
+        if not self.connection.in_transaction:
+            self.connection.execute("BEGIN")
+        return self.connection.execute(sql, params)
+
+    def load(self):
+        # Returns the newest snapshot (or None) and the journal records written after it
+        with self.lock:
+            snapshot = None
+            row = self.connection.execute(SELECT_SNAPSHOT).fetchone()
+            if row:
+                self.snapshot_seq, snapshot = row[0], json.loads(row[1])
+            records = [json.loads(record) for record, in self.connection.execute(SELECT_RECORDS, (self.snapshot_seq,))]
+            self.seq = records[-1]["seq"] if records else self.snapshot_seq
+            return snapshot, records
+
+    def append(self, record):
+        with self.lock:
+            self.seq += 1
+            record["seq"] = self.seq
+            self._execute(INSERT_RECORD, (self.seq, json.dumps(record, separators=(",", ":"))))
+            self.unsynced += 1
+            if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+                self.sync()
+
+    def sync(self):
+        with self.lock:
+            if self.connection and self.connection.in_transaction:
+                self.connection.execute("COMMIT")
+            self.unsynced = 0
+            self.last_sync = time.monotonic()
+
+    def snapshot_due(self):
+        return self.seq - self.snapshot_seq >= self.snapshot_every
+
+    def write_snapshot(self, state):
+        with self.lock:
+            self._execute(INSERT_SNAPSHOT, (self.seq, json.dumps(state, separators=(",", ":"))))
+            # Everything up to here is in the snapshot
+            self._execute("DELETE FROM journal WHERE seq <= ?", (self.seq,))
+            self._execute("DELETE FROM snapshot WHERE seq < ?", (self.seq,))
+            self.snapshot_seq = self.seq
+            self.sync()
+
+    def close(self):
+        with self.lock:
+            if self.school:
+                self.school.events.unsubscribe(self._on_event)
+                self.school = None
+            if self.connection:
+                self.sync()
+                self.connection.close()
+                self.connection = None
+            if self.lock_file:
+                self.lock_file.close()
+                self.lock_file = None
+
+    # Query tables
+
+    def mirror(self, school):
+        # Fills the query tables from school and keeps them up to date from its events
+        with self.lock:
+            self.school = school
+            for table in MIRROR_TABLES:
+                self._execute(f"DELETE FROM {table}")
+            for class_no, classroom in school.classes.items():
+                self._execute(INSERT_CLASS, (class_no, classroom.incharge))
+                for student in classroom.students.values():
+                    self._insert_student(class_no, student)
+            for teacher in school.teachers.values():
+                self._insert_teacher(teacher)
+            self.sync()
+            school.events.subscribe(self._on_event, *MIRROR_EVENTS)
+
+    def _insert_student(self, class_no, student):
+        entry_number = student.entry_number
+        self._execute(INSERT_STUDENT, (entry_number, class_no, student.name, student.fees, student.gpa))
+        self._execute(DELETE_GRADES, (entry_number,))
+        for subject, grade in list(student.grades.items()):
+            self._execute(UPSERT_GRADE, (entry_number, subject, grade))
+
+    def _insert_teacher(self, teacher):
+        self._execute(INSERT_TEACHER, (teacher.teacher_id, teacher.name, teacher.subject))
+        self._execute(DELETE_TEACHER_CLASSES, (teacher.teacher_id,))
+        for class_no in list(teacher.classes_to_teach):
+            self._execute(INSERT_TEACHER_CLASS, (teacher.teacher_id, class_no))
+
+    def _on_event(self, event):
+        with self.lock:
+            if self.connection is None:
+                return
+            kind = type(event)
+            if kind is GradeChanged:
+                if event.grade is None:
+                    self._execute(DELETE_GRADE, (event.entry_number, event.subject))
+                else:
+                    self._execute(UPSERT_GRADE, (event.entry_number, event.subject, event.grade))
+                self._execute(REFRESH_GPA, (event.entry_number, event.entry_number))
+            elif kind is FeeUpdated:
+                self._execute(UPDATE_FEE, (event.balance, event.entry_number))
+            elif kind is StudentEnrolled:
+                self._insert_student(event.class_no, event.student)
+            elif kind is StudentRemoved:
+                if self._execute(DELETE_STUDENT, (event.entry_number, event.class_no)).rowcount:
+                    self._execute(DELETE_GRADES, (event.entry_number,))
+            elif kind is ClassAdded:
+                classroom = self.school.classes.get(event.class_no)
+                if classroom:
+                    self._execute(INSERT_CLASS, (event.class_no, classroom.incharge))
+            elif kind is ClassRemoved:
+                self._execute(DELETE_CLASS, (event.class_no,))
+                self._execute(DELETE_CLASS_TEACHERS, (event.class_no,))
+            elif kind is TeacherAdded:
+                self._insert_teacher(event.teacher)
+            elif kind is TeacherRemoved:
+                self._execute(DELETE_TEACHER, (event.teacher_id,))
+                self._execute(DELETE_TEACHER_CLASSES, (event.teacher_id,))
+            elif kind is TeacherAssigned:
+                sql = INSERT_TEACHER_CLASS if event.teaching else DELETE_TEACHER_CLASS
+                self._execute(sql, (event.teacher_id, event.class_no))
+            elif kind is SchoolReset:
+                for table in MIRROR_TABLES:
+                    self._execute(f"DELETE FROM {table}")
+
+    def class_average(self, class_no):
+        with self.lock:
+            count, average = self.connection.execute(SELECT_CLASS_AVERAGE, (class_no,)).fetchone()
+        return average if count else 0.0
+
+    def fee_total(self, class_no=None):
+        # Returns (number of students, total fees), for one class or the whole school
+        with self.lock:
+            if class_no is None:
+                return self.connection.execute(SELECT_FEE_TOTAL).fetchone()
+            return self.connection.execute(SELECT_CLASS_FEE_TOTAL, (class_no,)).fetchone()
+
+    def roster(self, class_no):
+        # Returns [(entry_number, name, fees, gpa)] for a class in entry number order
+        with self.lock:
+            return self.connection.execute(SELECT_ROSTER, (class_no,)).fetchall()
@@ -0,0 +1,179 @@
+import atexit
+import json
+import os
+import time
+
+from sqlite_storage import SQLITE_SUFFIXES, SqliteStorage
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# On-disk layout inside the data directory:
+#   snapshot-<seq>.json  full school state after record <seq>
+#   journal-<seq>.log    one JSON record per line, starting after record <seq>
+#   lock                 locked by the process that has the school open
+
+
+class StorageLocked(Exception):
+    pass
+
+
+class Storage:
+    def __init__(self, directory, sync_every=64, sync_interval=1.0, snapshot_every=50000):
+        self.directory = directory
+        self.sync_every = sync_every  # fsync after this many records...
+        self.sync_interval = sync_interval  # ...or after this many seconds, whichever comes first
+        self.snapshot_every = snapshot_every  # Journal records between snapshots
+        self.seq = 0  # Sequence number of the last record written
+        self.snapshot_seq = 0
+        self.journal = None
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.lock_file = None  # Set by open_storage
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(self.close)
+
+    def _path(self, prefix, seq, suffix):
+        return os.path.join(self.directory, f"{prefix}-{seq:012d}{suffix}")
+
+    def _files(self, prefix, suffix):
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix + "-") and name.endswith(suffix):
+                try:
+                    found.append(int(name[len(prefix) + 1:-len(suffix)]))
+                except ValueError:
+                    pass
+        return sorted(found)
+
+    def load(self):
+        # Returns the newest snapshot (or None) and the journal records written after it
+        snapshot = None
+        snapshots = self._files("snapshot", ".json")
+        if snapshots:
+            self.snapshot_seq = snapshots[-1]
+            with open(self._path("snapshot", self.snapshot_seq, ".json"), encoding="utf-8") as f:
+                snapshot = json.load(f)
+        self.seq = self.snapshot_seq
+
+        records = []
+        for journal_seq in self._files("journal", ".log"):
+            path = self._path("journal", journal_seq, ".log")
+            good_bytes = 0
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    good_bytes += len(line)
+                    if record["seq"] > self.seq:
+                        records.append(record)
+                        self.seq = record["seq"]
+            if good_bytes < os.path.getsize(path):
+                # Cut off a torn write so later appends start on a clean line
+                with open(path, "r+b") as f:
+                    f.truncate(good_bytes)
+        return snapshot, records
+
+    def _open_journal(self):
+        self.journal = open(self._path("journal", self.seq, ".log"), "a", encoding="utf-8")
+
+    def append(self, record):
+        if self.journal is None:
+            self._open_journal()
+        self.seq += 1
+        record["seq"] = self.seq
+        self.journal.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.unsynced += 1
+        if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.journal and self.unsynced:
+            self.journal.flush()
+            os.fsync(self.journal.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def snapshot_due(self):
+        return self.seq - self.snapshot_seq >= self.snapshot_every
+
+    def write_snapshot(self, state):
+        self.sync()
+        path = self._path("snapshot", self.seq, ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.snapshot_seq = self.seq
+
+        # Everything up to here is in the snapshot, so start a fresh journal and drop the old files
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        for journal_seq in self._files("journal", ".log"):
+            if journal_seq < self.seq:
+                os.remove(self._path("journal", journal_seq, ".log"))
+        for snapshot_seq in self._files("snapshot", ".json"):
+            if snapshot_seq < self.seq:
+                os.remove(self._path("snapshot", snapshot_seq, ".json"))
+
+    def close(self):
+        if self.journal:
+            self.sync()
+            self.journal.close()
+            self.journal = None
+        if self.lock_file:
+            self.lock_file.close()
+            self.lock_file = None
+
+
+def lock_location(location):
+    # Takes an exclusive lock so that no other process opens the same school, whose changes would
+    # interleave in the journal. The lock lasts until the returned file is closed or the process ends.
+    if location.endswith(SQLITE_SUFFIXES):
+        path = location + ".lock"
+    else:
+        os.makedirs(location, exist_ok=True)
+        path = os.path.join(location, "lock")
+    lock_file = open(path, "a+b")
+    try:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        raise StorageLocked(f"{location} is already open in another ScholarSync process")
+    return lock_file
+
+
+def open_storage(school, location, **options):
+    # Loads the saved state into school and persists every later change to location: a directory,
+    # or an SQLite database file if the name ends in one of SQLITE_SUFFIXES
+    lock_file = lock_location(location)
+    try:
+        if location.endswith(SQLITE_SUFFIXES):
+            storage = SqliteStorage(location, **options)
+        else:
+            storage = Storage(location, **options)
+    except Exception:
+        lock_file.close()
+        raise
+    storage.lock_file = lock_file
+    snapshot, records = storage.load()
+    if snapshot:
+        school.restore(snapshot)
+    school.apply_all(records)
+    school.storage = storage
+    if storage.snapshot_due():
+        storage.write_snapshot(school.to_snapshot())
+    if isinstance(storage, SqliteStorage):
+        storage.mirror(school)
+    return storage
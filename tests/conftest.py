@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules live at the top of the repository; a low hash cost keeps the many test passwords quick
+os.environ.setdefault("SCHOLARSYNC_HASH_ITERATIONS", "1000")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+import pytest
+
+import operations
+from main import Classroom, OperationError, School, Student, Teacher
+
+
+def small_school():
+    school = School()
+    classroom = Classroom("10A", "Incharge")
+    school.add_class(classroom)
+    for entry_number in (1, 2, 3):
+        classroom.add_student(Student(f"Student {entry_number}", "10A", entry_number, password="pass"))
+    return school
+
+
+def test_class_and_student_marks():
+    school = small_school()
+    assert school.classes["10A"].mark_attendance("2026-09-01", None, [2]) == []
+    assert school.mark_attendance(2, "2026-09-01", 0, present=True)
+    assert school.attendance_rate(1) == (8, 8)
+    assert school.attendance_rate(2) == (1, 8)
+    assert school.class_attendance("10A") == (17, 24)
+    assert [student.entry_number for student, _ in school.low_attendance()] == [2]
+    assert not school.mark_attendance(99, "2026-09-01", 0)
+
+
+@pytest.mark.parametrize("day, period, message", [
+    ("2026-09-01", 8, "Invalid period."),
+    ("2026-09-01", -1, "Invalid period."),
+    ("2026-09-01", "1", "Invalid period."),
+    ("2026-13-01", 0, "Invalid date."),
+    (None, 0, "Invalid date."),
+])
+def test_student_mark_is_checked(day, period, message):
+    school = small_school()
+    school.classes["10A"].mark_attendance("2026-09-02", None)
+    with pytest.raises(OperationError, match=message):
+        school.mark_attendance(1, day, period, present=False)
+    # Nothing was marked, and in particular no bit landed in the next day's byte
+    assert school.attendance_rate(1) == (8, 8)
+    assert school.classes["10A"].mark_attendance("2026-09-01", 8) == [(None, "Invalid period.")]
+
+
+def test_replay_skips_an_invalid_student_mark():
+    school = small_school()
+    school.apply({"op": "mark_attendance", "entry_number": 1, "date": "2026-09-01", "period": 8, "present": False})
+    school.apply({"op": "mark_attendance", "entry_number": 1, "date": "not a date", "period": 0, "present": False})
+    school.apply({"op": "mark_attendance", "entry_number": 1, "date": "2026-09-01", "period": 3, "present": False})
+    assert school.attendance_rate(1) == (0, 1)
+
+
+def test_a_date_far_from_the_others_is_refused():
+    school = small_school()
+    classroom = school.classes["10A"]
+    assert classroom.mark_attendance("2026-09-01", None) == []
+    before = school.attendance.nbytes()
+    assert classroom.mark_attendance("2062-09-01", None) == [(None, "Date is too far from the other attendance marks.")]
+    with pytest.raises(OperationError, match="too far"):
+        school.mark_attendance(1, "1926-09-01", 0)
+    assert school.attendance.nbytes() == before
+    assert school.attendance.days == 1
+    # A full school year either side of the first mark is still fine
+    assert classroom.mark_attendance("2025-09-01", None) == []
+    assert classroom.mark_attendance("2027-06-30", None) == []
+    assert school.attendance_rate(1) == (24, 24)
+
+
+def test_counts_are_of_students_not_of_listed_numbers():
+    school = small_school()
+    teacher = Teacher("Mr. Rao", "Maths", ["10A"], "pass")
+    school.add_teacher(teacher)
+    result = operations.mark_attendance(school, teacher, "10A", ["2", "02", 2], "2026-09-01")
+    assert (result["absent"], result["present"]) == (1, 2)
+    assert school.class_attendance("10A") == (16, 24)
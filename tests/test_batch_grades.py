@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import operations
+from events import GradeChanged
+from main import Classroom, Interface, OperationError, School, Student, Teacher
+from storage import open_storage
+
+
+def class_with_teacher(directory=None):
+    school = School()
+    storage = open_storage(school, directory) if directory else None
+    classroom = Classroom("10A", "Incharge")
+    school.add_class(classroom)
+    classroom.add_students([Student(f"Student {n}", "10A", n, password="pass") for n in range(1, 6)])
+    for n in range(1, 6):
+        school.find_student(n).add_subject("Physics", 50)
+    teacher = Teacher("Mr. Rao", "Maths", ["10A"], "pass")
+    teacher.teacher_id = 7
+    school.add_teacher(teacher)
+    return school, classroom, teacher, storage
+
+
+def test_a_batch_sets_every_grade_and_the_class_figures():
+    school, classroom, teacher, _ = class_with_teacher()
+    changed = []
+    school.events.subscribe(changed.append, GradeChanged)
+    assert teacher.update_grades(classroom, [(1, 90), ("2", "70.5"), (3, 100)]) == []
+    assert [school.find_student(n).get_grade("Maths") for n in (1, 2, 3, 4)] == [90.0, 70.5, 100.0, None]
+    assert school.find_student(1).gpa == 70.0
+    assert classroom.gpa_total == pytest.approx(sum(student.gpa for student in classroom.students.values()))
+    assert classroom.top_students(1)[0][0].entry_number == 3
+    assert school.school_rank(school.find_student(3))[0] == 1
+    assert [(event.entry_number, event.grade) for event in changed] == [(1, 90.0), (2, 70.5), (3, 100.0)]
+    assert school.check_index() == []
+
+
+def test_a_batch_with_any_bad_row_changes_nothing():
+    school, classroom, teacher, _ = class_with_teacher()
+    errors = classroom.set_grades("Maths", [(1, 90), (99, 80), (2, 101), ("x", 50), (3, "A")])
+    assert errors == [(99, "Student not found in this class."), (2, "Invalid grade."),
+                      ("x", "Invalid entry number."), (3, "Invalid grade.")]
+    assert all(not school.find_student(n).has_subject("Maths") for n in range(1, 6))
+
+    other = Teacher("Ms. Iyer", "Maths", [], "pass")
+    assert other.update_grades(classroom, [(1, 90)]) == [(None, "You don't teach this class.")]
+    with pytest.raises(OperationError, match="Entry Number 99: Student not found"):
+        operations.update_grades(school, teacher, "10A", {99: 80})
+
+
+def test_a_batch_is_one_journal_record_and_replays(tmp_path):
+    school, classroom, teacher, storage = class_with_teacher(str(tmp_path))
+    assert operations.update_grades(school, teacher, "10A", [[4, 60], [5, 80]])["subject"] == "Maths"
+    storage.close()
+    records = [json.loads(line) for path in sorted(tmp_path.glob("journal-*.log")) for line in path.open()]
+    assert [record for record in records if record["op"] == "set_class_grades"] == [
+        {"op": "set_class_grades", "class_no": "10A", "subject": "Maths", "grades": [[4, 60.0], [5, 80.0]],
+         "seq": records[-1]["seq"]}]
+    loaded = School()
+    open_storage(loaded, str(tmp_path)).close()
+    assert loaded.find_student(5).grades == {"Physics": 50.0, "Maths": 80.0}
+    assert loaded.find_student(5).gpa == 65.0
+
+
+def test_grades_from_a_file_count_each_student_once(tmp_path, monkeypatch, capsys):
+    school, classroom, teacher, _ = class_with_teacher()
+    path = tmp_path / "maths.csv"
+    path.write_text("entry_number,grade\n1,60\n01,70\n2,80\n")
+    interface = Interface()
+    interface.school = school
+    answers = iter(["10A", str(path), ""])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    monkeypatch.setattr(interface, "clear_screen", lambda: None)
+    interface.update_grades_from_file(teacher)
+    assert "2 grades updated successfully." in capsys.readouterr().out
+    assert school.find_student(1).get_grade("Maths") == 70.0
@@ -0,0 +1,72 @@
+import io
+import json
+
+import operations
+from commands import read_commands, run_batch
+from main import Interface
+
+
+def run_lines(interface, text, stop_on_error=False):
+    out = io.StringIO()
+    failed = run_batch(interface, read_commands(io.StringIO(text)), out, stop_on_error)
+    responses = [json.loads(line) for line in out.getvalue().splitlines()]
+    return failed, responses[:-1], responses[-1]["summary"]
+
+
+def test_a_batch_runs_every_line_and_reports_failures(tmp_path):
+    interface = Interface(str(tmp_path))
+    failed, responses, summary = run_lines(interface, """
+        add-class 10A "Mrs Sharma"
+        # comments and blank lines are skipped
+
+        add-class 10A Again
+        add-student 10A "Asha Rao" 42 pass Maths=90
+        add-teacher 7 "Mr. Rao" Maths pass 10A
+        update-grade 7 10A 42 81
+        student-info 42
+        """)
+    interface.close()
+    assert failed == 1
+    assert [response["ok"] for response in responses] == [True, False, True, True, True, True]
+    assert responses[1] == {"line": 5, "command": "add-class", "ok": False, "ms": responses[1]["ms"],
+                            "error": "Class already exists."}
+    assert responses[-1]["result"]["gpa"] == 81.0
+    assert summary["commands"] == 6 and summary["ok"] == 5
+
+    # The changes were journaled
+    reopened = Interface(str(tmp_path))
+    assert reopened.school.find_student(42).get_grade("Maths") == 81.0
+    reopened.close()
+
+
+def test_help_and_unexpected_errors_fail_only_their_line(monkeypatch):
+    interface = Interface()
+
+    def broken(school):
+        raise RuntimeError("disk on fire")
+
+    monkeypatch.setattr(operations, "list_teachers", broken)
+    failed, responses, summary = run_lines(interface, "--help\nadd-class --help\nlist-teachers\n'unclosed\n"
+                                                      "add-class 10A Incharge\n")
+    assert failed == 4
+    assert responses[2]["error"] == "RuntimeError: disk on fire"
+    assert responses[3]["error"].startswith("Invalid command line")
+    assert responses[4]["ok"] and "10A" in interface.school.classes
+
+    failed, responses, _ = run_lines(interface, "nosuch\nlist-students\n", stop_on_error=True)
+    assert failed == 1 and len(responses) == 1
+
+
+def test_password_changes_need_the_current_password():
+    interface = Interface()
+    failed, responses, _ = run_lines(interface, """
+        add-class 10A Incharge
+        add-student 10A Asha 42 secret
+        change-student-password 42 wrong new
+        change-student-password 42 secret new
+        change-admin-password wrong new
+        change-admin-password admin123 new
+        """)
+    assert [response["ok"] for response in responses] == [True, True, False, True, False, True]
+    assert interface.school.find_student(42).authenticate("new")
+    assert interface.admin.authenticate("admin", "new")
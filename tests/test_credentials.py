@@ -0,0 +1,36 @@
+import pytest
+
+from credentials import Credential, hash_password, is_hash
+from main import Student
+
+
+def test_a_password_shaped_like_a_hash_is_still_hashed():
+    typed = "pbkdf2_sha256$1$00$00"
+    credential = Credential(typed)
+    assert credential.encoded != typed
+    assert credential.verify(typed)
+    assert not credential.verify("")
+
+
+def test_from_hash_keeps_a_stored_hash_and_rejects_anything_else():
+    encoded = hash_password("secret")
+    assert Credential.from_hash(encoded).encoded == encoded
+    assert Credential.from_hash(encoded).verify("secret")
+    with pytest.raises(ValueError):
+        Credential.from_hash("secret")
+
+
+def test_the_empty_default_is_hashed_only_when_saved():
+    credential = Credential()
+    assert credential._encoded is None
+    assert credential.verify("")
+    assert not credential.verify("x")
+    assert is_hash(credential.encoded)
+    assert credential.verify("")
+
+
+def test_a_student_record_round_trip_keeps_the_password():
+    student = Student("Asha", "10A", 1, password="pass")
+    restored = Student.from_record(student.to_record())
+    assert restored.authenticate("pass")
+    assert not restored.authenticate(student.to_record()["password"])
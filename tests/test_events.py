@@ -0,0 +1,78 @@
+import threading
+
+from events import Batch, ClassAdded, EventBus, GradeChanged, StudentEnrolled
+from main import Classroom, School, Student
+
+
+def test_subscribers_get_only_their_event_types():
+    bus = EventBus()
+    grades, everything = [], []
+    bus.subscribe(grades.append, GradeChanged)
+    callback = bus.subscribe(everything.append)
+    bus.publish(GradeChanged(1, "10A", "Maths", 90.0))
+    bus.publish(ClassAdded("10A"))
+    assert [type(event) for event in grades] == [GradeChanged]
+    assert [type(event) for event in everything] == [GradeChanged, ClassAdded]
+    bus.unsubscribe(callback)
+    bus.publish(ClassAdded("10B"))
+    assert len(everything) == 2 and ClassAdded not in bus.subscribers
+
+
+def test_a_failing_subscriber_does_not_undo_the_change():
+    school = School()
+    school.add_class(Classroom("10A", "Incharge"))
+    seen = []
+
+    def fail(event):
+        raise RuntimeError("subscriber bug")
+
+    school.events.subscribe(fail, GradeChanged)
+    school.events.subscribe(seen.append, GradeChanged)
+    student = Student("Asha", "10A", 1, password="pass")
+    school.classes["10A"].add_student(student)
+    student.add_subject("Maths", 80.0)
+    assert student.gpa == 80.0
+    assert [event.grade for event in seen] == [80.0]
+
+
+def test_class_added_comes_after_its_students_are_indexed():
+    school = School()
+    events = []
+
+    def on_event(event):
+        events.append((type(event), school.find_student(1) is not None))
+
+    school.events.subscribe(on_event, ClassAdded, StudentEnrolled)
+    classroom = Classroom("10A", "Incharge")
+    classroom.add_student(Student("Asha", "10A", 1, password="pass"))
+    school.add_class(classroom)
+    assert events == [(ClassAdded, True), (StudentEnrolled, True)]
+
+
+def test_batch_coalesces_and_delivers_at_max_size():
+    batches = []
+    batch = Batch(batches.append, max_size=3)
+    batch(GradeChanged(1, "10A", "Maths", 50.0))
+    batch(GradeChanged(1, "10A", "Maths", 60.0))
+    batch(GradeChanged(2, "10A", "Maths", 70.0))
+    assert batches == []
+    batch(GradeChanged(3, "10A", "Maths", 80.0))
+    assert [(event.entry_number, event.grade) for event in batches[0]] == [(1, 60.0), (2, 70.0), (3, 80.0)]
+    batch(ClassAdded("10B"))
+    batch.flush()
+    assert len(batches) == 2 and batch.received == 5 and batch.delivered == 4
+
+
+def test_batch_max_delay_delivers_without_another_event():
+    delivered = threading.Event()
+    batches = []
+
+    def handler(events):
+        batches.append(events)
+        delivered.set()
+
+    batch = Batch(handler, max_delay=0.05)
+    batch(ClassAdded("10A"))
+    assert delivered.wait(5)
+    assert [event.class_no for event in batches[0]] == ["10A"]
+    assert batch.timer is None and not batch.pending
@@ -0,0 +1,55 @@
+import csv
+import gzip
+import io
+import json
+
+import exporter
+import importer
+from ledger import CHARGE
+from main import Classroom, School, Student
+
+
+def graded_school(with_grades=True):
+    school = School()
+    for class_no, entry_numbers in (("10A", range(1, 40)), ("10B", range(40, 75))):
+        classroom = Classroom(class_no, "Incharge")
+        school.add_class(classroom)
+        students = []
+        for n in entry_numbers:
+            student = Student(f"Student, \"{n}\"", class_no, n, password="pass")
+            if with_grades:
+                student.add_subjects([("Maths", n % 101), ("Physics", (n * 7) % 101)])
+            students.append(student)
+        classroom.add_students(students)
+    return school
+
+
+def test_gradebook_csv_imports_back_to_the_same_grades(tmp_path):
+    school = graded_school()
+    path = tmp_path / "grades.csv"
+    # A tiny chunk size makes every row cross a chunk boundary
+    assert exporter.export(school, "gradebook", str(path), chunk_size=100) == 74 * 2
+    copy = graded_school(with_grades=False)
+    report = importer.import_grades(copy, str(path))
+    assert report.errors == [] and report.imported == 148
+    for entry_number, (student, _) in school.student_index.items():
+        assert copy.find_student(entry_number).grades == student.grades
+        assert copy.find_student(entry_number).gpa == student.gpa
+
+
+def test_compressed_jsonl_and_streams(tmp_path):
+    school = graded_school()
+    school.post_fee(3, CHARGE, 120)
+    path = tmp_path / "fees.jsonl.gz"
+    assert exporter.export(school, "fees", str(path)) == 74
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    assert rows[2] == {"class_no": "10A", "entry_number": 3, "name": 'Student, "3"',
+                       "fees": school.find_student(3).fees}
+    assert school.find_student(3).fees == school.find_student(4).fees + 120
+
+    out = io.BytesIO()
+    assert exporter.export(school, "roster", out, fmt="csv", chunk_size=64) == 74
+    rows = list(csv.DictReader(io.StringIO(out.getvalue().decode("utf-8"))))
+    assert [int(row["entry_number"]) for row in rows] == list(range(1, 75))
+    assert rows[0]["name"] == 'Student, "1"' and float(rows[0]["gpa"]) == school.find_student(1).gpa
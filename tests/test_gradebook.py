@@ -0,0 +1,44 @@
+import pytest
+
+import gradebook
+from main import Classroom, School, Student
+
+BACKENDS = ["python"] + (["numpy"] if gradebook.np is not None else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(gradebook, "np", None)
+    return request.param
+
+
+def tied_school():
+    # Many students share each average, so the top-n cut-off falls inside a tie
+    school = School()
+    classroom = Classroom("10A", "Incharge")
+    school.add_class(classroom)
+    students = []
+    for entry_number in range(200, 0, -1):
+        student = Student(f"Student {entry_number}", "10A", entry_number, password="pass")
+        student.add_subjects([("Maths", 90 - entry_number % 7), ("Physics", 80 + entry_number % 3)])
+        students.append(student)
+    classroom.add_students(students)
+    return school
+
+
+def test_top_students_breaks_ties_by_entry_number(backend):
+    school = tied_school()
+    book = gradebook.Gradebook.attach(school)
+    for n in (1, 5, 10, 29, 30, 31, 200, 500):
+        assert book.top_students(n) == gradebook.reference_top_students(school, n)
+
+
+def test_top_students_follows_grade_changes(backend):
+    school = tied_school()
+    book = gradebook.Gradebook.attach(school)
+    school.find_student(150).add_subject("Maths", 100)
+    school.find_student(7).remove_subject("Physics")
+    school.classes["10A"].remove_student(14)
+    assert book.top_students(25) == gradebook.reference_top_students(school, 25)
+    assert book.failing_students(85) == gradebook.reference_failing_students(school, 85)
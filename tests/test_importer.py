@@ -0,0 +1,113 @@
+import json
+
+import importer
+from importer import import_classes, import_grades, import_students, import_teachers
+from main import School
+from storage import open_storage
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+    return str(path)
+
+
+def school_with_classes(tmp_path):
+    school = School()
+    path = tmp_path / "classes.csv"
+    path.write_text("class_no,incharge\n10A,Mrs. Rao\n10B,Mr. Sen\n", encoding="utf-8")
+    assert import_classes(school, str(path)).imported == 2
+    return school
+
+
+def test_students_and_grades_round_trip(tmp_path):
+    school = school_with_classes(tmp_path)
+    students = tmp_path / "students.csv"
+    students.write_text("class_no,name,entry_number,password,subjects\n"
+                        "10A,Asha,1,pass,Maths=90;Art=70\n10A,Ravi,2,pass,\n10B,Meena,3,pass,Maths=60\n",
+                        encoding="utf-8")
+    assert import_students(school, str(students)).imported == 3
+    grades = write_jsonl(tmp_path / "grades.jsonl", [
+        {"entry_number": 1, "subject": "Physics", "grade": 80},
+        {"entry_number": 2, "subject": "Physics", "grade": 75},
+        {"entry_number": 3, "subject": "Physics", "grade": 65},
+        {"entry_number": "2", "subject": "Maths", "grade": "88.5"},
+        {"entry_number": 9, "subject": "Maths", "grade": 50},
+        {"entry_number": 1, "subject": "Maths", "grade": 101},
+    ])
+    report = import_grades(school, grades)
+    assert report.imported == 4
+    assert report.errors == [(5, "Student 9 not found"), (6, "Invalid grade for Maths")]
+    assert school.find_student(1).grades == {"Maths": 90.0, "Art": 70.0, "Physics": 80.0}
+    assert school.find_student(2).grades == {"Physics": 75.0, "Maths": 88.5}
+    assert school.find_student(2).authenticate("pass")
+    assert school.check_index() == []
+
+
+def test_grades_are_set_once_per_class_and_subject(tmp_path):
+    school = school_with_classes(tmp_path)
+    storage = open_storage(school, str(tmp_path / "data"))
+    students = write_jsonl(tmp_path / "students.jsonl", [
+        {"class_no": class_no, "name": f"Student {n}", "entry_number": n, "password": "pass"}
+        for n, class_no in ((1, "10A"), (2, "10A"), (3, "10B"))])
+    import_students(school, students)
+    grades = write_jsonl(tmp_path / "grades.jsonl", [
+        {"entry_number": n, "subject": subject, "grade": 70} for subject in ("Maths", "Art") for n in (1, 2, 3)])
+    assert import_grades(school, grades).imported == 6
+    storage.close()
+    records = [json.loads(line) for journal in (tmp_path / "data").glob("journal-*.log")
+               for line in journal.read_text(encoding="utf-8").splitlines()]
+    assert sorted((r["class_no"], r["subject"], len(r["grades"])) for r in records if r["op"] == "set_class_grades") == [
+        ("10A", "Art", 2), ("10A", "Maths", 2), ("10B", "Art", 1), ("10B", "Maths", 1)]
+
+
+def test_teacher_passwords_are_hashed_as_a_batch(tmp_path, monkeypatch):
+    school = school_with_classes(tmp_path)
+    batches = []
+    real_hash_many = importer.hash_many
+
+    def hash_many(passwords):
+        batches.append(list(passwords))
+        return real_hash_many(passwords)
+
+    monkeypatch.setattr(importer, "hash_many", hash_many)
+    teachers = tmp_path / "teachers.csv"
+    teachers.write_text("teacher_id,name,subject,classes,password\n"
+                        "1,Mr. Rao,Maths,10A 10B,one\n2,Ms. Sen,Art,10B,two\n1,Mr. Copy,Art,,three\n",
+                        encoding="utf-8")
+    report = import_teachers(school, str(teachers))
+    assert report.imported == 2
+    assert report.errors == [(4, "Teacher ID 1 already exists")]
+    assert batches == [["one", "two"]]
+    assert school.teachers_of("10B") == {1, 2}
+    assert school.teachers[2].authenticate("two")
+
+
+def test_fields_of_the_wrong_type_are_reported_per_row(tmp_path):
+    school = school_with_classes(tmp_path)
+    students = write_jsonl(tmp_path / "students.jsonl", [
+        {"class_no": "10A", "name": 5, "entry_number": 1},
+        {"class_no": ["10A"], "name": "Asha", "entry_number": 2},
+        {"class_no": "10A", "name": "Asha", "entry_number": {"n": 3}},
+        {"class_no": "10A", "name": "Asha", "entry_number": True},
+        {"class_no": "10A", "name": "Asha", "entry_number": 4, "password": 1234},
+        {"class_no": "10A", "name": "Asha", "entry_number": 5, "subjects": 90},
+        {"class_no": "10A", "name": "Asha", "entry_number": 6, "subjects": [["Maths"]]},
+        {"class_no": "10A", "name": "Asha", "entry_number": 7, "subjects": {"Maths": [90]}},
+        {"class_no": "10A", "name": "Ravi", "entry_number": 8, "subjects": {"Maths": 90}},
+    ])
+    report = import_students(school, students)
+    assert report.imported == 1
+    assert report.errors == [(1, "Invalid name"), (2, "Invalid class_no"), (3, "Invalid entry_number"),
+                             (4, "Invalid entry_number"), (5, "Invalid password"), (6, "Invalid subjects"),
+                             (7, "Invalid subjects"), (8, "Invalid grade for Maths")]
+    teachers = write_jsonl(tmp_path / "teachers.jsonl", [
+        {"teacher_id": 1, "name": "Mr. Rao", "subject": "Maths", "classes": {"10A": True}},
+        {"teacher_id": 2, "name": "Mr. Rao", "subject": "Maths", "classes": [10]},
+        {"teacher_id": 3, "name": "Mr. Rao", "subject": None},
+    ])
+    report = import_teachers(school, teachers)
+    assert report.errors == [(1, "Invalid classes"), (2, "Invalid classes"), (3, "Missing subject")]
+    grades = write_jsonl(tmp_path / "grades.jsonl", [{"entry_number": 8, "subject": ["Maths"], "grade": 90}])
+    assert import_grades(school, grades).errors == [(1, "Invalid subject")]
+    assert list(school.student_index) == [8]
+    assert school.check_index() == []
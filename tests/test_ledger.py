@@ -0,0 +1,69 @@
+import random
+
+import ledger
+from ledger import ADJUSTMENT, CHARGE, PAYMENT, WAIVER
+from main import Classroom, School, Student
+
+
+def fee_school(classes=4, students_per_class=60):
+    school = School()
+    entry_number = 1
+    for c in range(classes):
+        classroom = Classroom(f"9{chr(65 + c)}", "Incharge")
+        school.add_class(classroom)
+        classroom.add_students([Student(f"Student {n}", classroom.class_no, n, password="pass")
+                                for n in range(entry_number, entry_number + students_per_class)])
+        entry_number += students_per_class
+    return school
+
+
+def test_reports_match_the_reference_through_random_postings():
+    rng = random.Random(19)
+    school = fee_school()
+    next_entry = 1000
+    for step in range(600):
+        action = rng.random()
+        entry_number = rng.choice(list(school.student_index))
+        if action < 0.5:
+            kind = rng.choice([CHARGE, PAYMENT, WAIVER, ADJUSTMENT])
+            amount = rng.randint(-200, 200) if kind == ADJUSTMENT else rng.randint(1, 1500)
+            school.post_fee(entry_number, kind, amount)
+        elif action < 0.55:
+            school.post_term_fee(rng.randint(100, 900), "Term", rng.sample(sorted(school.classes), 2))
+        elif action < 0.7:
+            school.find_student_class(entry_number).remove_student(entry_number)
+        else:
+            classroom = rng.choice(list(school.classes.values()))
+            classroom.add_student(Student("New", classroom.class_no, next_entry, password="pass"))
+            next_entry += 1
+        if step % 50 == 0:
+            for amount in (-100, 0, 500, 2000):
+                assert school.ledger.owing_more_than(amount) == ledger.reference_owing_more_than(school, amount)
+                assert (school.ledger.owing_more_than(amount, 7)
+                        == ledger.reference_owing_more_than(school, amount, 7))
+                assert school.ledger.count_owing_more_than(amount) == len(
+                    ledger.reference_owing_more_than(school, amount))
+            for n in (1, 10, 100):
+                assert school.ledger.top_debtors(n) == ledger.reference_top_debtors(school, n)
+    owed = sum(student.fees for student, _ in school.student_index.values() if student.fees > 0)
+    assert school.ledger.owed_total == owed
+
+
+def test_postings_are_forgotten_with_the_last_student_holding_them():
+    school = fee_school(classes=2, students_per_class=3)
+    posting_id, charged = school.post_term_fee(500, "Term 1")
+    assert charged == 6
+    school.post_fee(1, PAYMENT, 200)
+    school.post_term_fee(300, "Trip", ["9A"])
+    assert len(school.ledger.postings) == 3
+    for entry_number in (1, 2, 3):
+        school.classes["9A"].remove_student(entry_number)
+    # Only the term fee, still held by 9B, remains
+    assert list(school.ledger.postings) == [posting_id]
+    assert school.ledger.refs == {posting_id: 3}
+
+    restored = School()
+    restored.restore(school.to_snapshot())
+    assert list(restored.ledger.postings) == [posting_id]
+    assert restored.ledger.refs == {posting_id: 3}
+    assert restored.ledger.statement(4) == school.ledger.statement(4)
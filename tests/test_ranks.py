@@ -0,0 +1,62 @@
+import pytest
+
+import operations
+from importer import import_students
+from main import Classroom, OperationError, School, Student
+from ranks import ENTRY_BITS
+
+LAST_ENTRY = 2 ** ENTRY_BITS - 1
+
+
+def ranked_school():
+    school = School()
+    classroom = Classroom("10A", "Incharge")
+    school.add_class(classroom)
+    for entry_number, grade in ((0, 70), (5, 80), (LAST_ENTRY, 90)):
+        student = Student(f"Student {entry_number}", "10A", entry_number, password="pass")
+        student.add_subject("Maths", grade)
+        classroom.add_student(student)
+    return school
+
+
+def test_the_lowest_and_highest_entry_numbers_rank_correctly():
+    school = ranked_school()
+    assert [(student.entry_number, gpa) for student, gpa in school.top_students()] == [
+        (LAST_ENTRY, 90.0), (5, 80.0), (0, 70.0)]
+    classroom = school.classes["10A"]
+    assert classroom.rank_of(school.find_student(0))[0] == 3
+    assert school.school_rank(school.find_student(LAST_ENTRY))[0] == 1
+    assert school.check_index() == []
+
+
+@pytest.mark.parametrize("entry_number", [-1, 2 ** ENTRY_BITS, 2 ** 63, True, "7"])
+def test_entry_numbers_the_ranks_cannot_hold_are_refused_before_any_change(entry_number):
+    school = ranked_school()
+    classroom = school.classes["10A"]
+    student = Student("Out of range", "10A", entry_number, password="pass")
+    with pytest.raises(OperationError):
+        classroom.add_student(student)
+    with pytest.raises(OperationError):
+        classroom.add_students([Student("Fine", "10A", 6, password="pass"), student])
+    other = Classroom("10B", "Incharge")
+    other.students[entry_number] = student
+    with pytest.raises(OperationError):
+        school.add_class(other)
+    assert sorted(school.student_index) == [0, 5, LAST_ENTRY]
+    assert "10B" not in school.classes
+    assert student.classroom is None
+    assert len(school.top_students()) == 3
+    assert school.check_index() == []
+
+
+def test_operations_and_the_importer_refuse_out_of_range_entry_numbers(tmp_path):
+    school = ranked_school()
+    with pytest.raises(OperationError, match="Invalid entry number."):
+        operations.add_student(school, "10A", "Ravi", -3, "pass")
+    path = tmp_path / "students.csv"
+    path.write_text("class_no,name,entry_number,password\n"
+                    f"10A,Ravi,{2 ** ENTRY_BITS},pass\n10A,Asha,-1,pass\n10A,Meena,6,pass\n", encoding="utf-8")
+    report = import_students(school, str(path))
+    assert report.imported == 1
+    assert report.errors == [(2, "Invalid entry_number"), (3, "Invalid entry_number")]
+    assert school.check_index() == []
@@ -0,0 +1,59 @@
+import io
+
+import render
+from main import Classroom, School, Student
+
+
+class Terminal(io.StringIO):
+    # Counts writes and can claim to be a terminal
+    def __init__(self, tty=False):
+        super().__init__()
+        self.tty = tty
+        self.writes = 0
+
+    def isatty(self):
+        return self.tty
+
+    def write(self, text):
+        self.writes += 1
+        return super().write(text)
+
+
+def test_a_screen_is_one_write_and_clears_only_a_terminal():
+    out = Terminal()
+    render.write(["one", "two"], out, clear=True)
+    assert out.getvalue() == "one\ntwo\n" and out.writes == 1
+    out = Terminal(tty=True)
+    render.write(["menu"], out, clear=True)
+    assert out.getvalue() == render.CLEAR + "menu\n" and out.writes == 1
+    render.clear_screen(out)
+    assert out.getvalue().endswith(render.CLEAR)
+
+
+def test_pages_stop_when_asked(monkeypatch):
+    lines = [f"line {n}" for n in range(10)]
+    answers = iter(["", "q"])
+    prompts = []
+    monkeypatch.setattr("builtins.input", lambda prompt: prompts.append(prompt) or next(answers))
+    out = Terminal()
+    render.page(lines, out, page_size=3)
+    assert out.getvalue().splitlines() == lines[:6]
+    assert out.writes == 2 and prompts == [render.MORE_PROMPT] * 2
+
+    # Output that is not a terminal is written whole, without asking
+    out = Terminal()
+    render.page(lines, out)
+    assert out.getvalue().splitlines() == lines and out.writes == 1
+
+
+def test_screens_are_built_as_lines(capsys):
+    school = School()
+    classroom = Classroom("10A", "Mrs Sharma")
+    school.add_class(classroom)
+    classroom.add_students([Student(f"Student {n}", "10A", n, password="pass") for n in (3, 1, 2)])
+    lines = classroom.student_lines()
+    assert lines == [f"  Name: Student {n}, Entry Number: {n}" for n in (1, 2, 3)]
+    assert classroom.student_lines(offset=1, limit=1) == ["  Name: Student 2, Entry Number: 2"]
+    classroom.view_class_details()
+    printed = capsys.readouterr().out
+    assert "Mrs Sharma" in printed and printed.index("Student 1") < printed.index("Student 3")
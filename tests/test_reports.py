@@ -0,0 +1,68 @@
+import csv
+import os
+
+import reports
+from main import Classroom, School, Student
+
+
+def ranked_school():
+    school = School()
+    for class_no, gpas in (("10A", [90, 80, 80, 70]), ("10B", [95, 80, 60])):
+        classroom = Classroom(class_no, "Incharge")
+        school.add_class(classroom)
+        for gpa in gpas:
+            entry_number = len(school.student_index) + 1
+            student = Student(f"Student {entry_number}", class_no, entry_number, password="pass")
+            classroom.add_student(student)
+            student.add_subject("Maths", gpa)
+    return school
+
+
+def test_text_card_shows_class_and_school_rank(tmp_path):
+    school = ranked_school()
+    reports.render_shard(reports.class_shard(school, school.classes["10A"]), str(tmp_path))
+    text = (tmp_path / "10A.txt").read_text()
+    # Entry 2 ties with entry 3 for second in the class, and with entry 6 too for third in the school
+    card = text.split("Entry Number: 2\n")[1]
+    assert "Class Rank: 2 of 4 (Percentile: 50.0)" in card
+    assert "School Rank: 3 of 7 (Percentile: 50.0)" in card
+
+
+def test_csv_rows_match_the_rank_structures(tmp_path):
+    school = ranked_school()
+    reports.render_shard(reports.class_shard(school, school.classes["10B"]), str(tmp_path), fmt="csv")
+    with open(os.path.join(tmp_path, "10B.csv"), newline="") as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        student = school.find_student(int(row["entry_number"]))
+        rank, size, percentile = school.school_rank(student)
+        assert (int(row["school_rank"]), int(row["school_size"]), float(row["school_percentile"])) == \
+            (rank, size, round(percentile, 1))
+        rank, size, percentile = school.classes["10B"].rank_of(student)
+        assert (int(row["class_rank"]), int(row["class_size"]), float(row["class_percentile"])) == \
+            (rank, size, round(percentile, 1))
+
+
+def test_file_names_are_distinct_and_safe():
+    names = ["10/A", "10_A", "10%2FA", "..", ".", "", "%", "10 A", "日本"]
+    safe = [reports.safe_name(name) for name in names]
+    assert len(set(safe)) == len(names)
+    assert safe[:2] == ["10%2FA", "10_A"]
+    for name in safe:
+        assert name not in (".", "..") and "/" not in name and "\\" not in name
+
+
+def test_worker_processes_write_the_same_files(tmp_path):
+    school = ranked_school()
+    school.add_class(Classroom("10/A", "Incharge"))
+    school.classes["10/A"].add_student(Student("Slash", "10/A", 99, password="pass"))
+    serial, pooled = tmp_path / "serial", tmp_path / "pooled"
+    for fmt in ("text", "csv"):
+        expected = reports.generate_reports(school, str(serial), fmt, workers=1)
+        result = reports.generate_reports(school, str(pooled), fmt, workers=2)
+        assert result[:2] == expected[:2] == (8, expected[1])
+    files = sorted(path.name for path in serial.iterdir())
+    assert files == sorted(path.name for path in pooled.iterdir())
+    assert "10%2FA.txt" in files
+    for name in files:
+        assert (serial / name).read_text() == (pooled / name).read_text()
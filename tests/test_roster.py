@@ -0,0 +1,51 @@
+import random
+
+import operations
+from main import Classroom, School, Student
+
+
+def shuffled_class(entry_numbers, seed=8):
+    school = School()
+    classroom = Classroom("10A", "Incharge")
+    school.add_class(classroom)
+    entry_numbers = list(entry_numbers)
+    random.Random(seed).shuffle(entry_numbers)
+    for entry_number in entry_numbers[:10]:
+        classroom.add_student(Student(f"Student {entry_number}", "10A", entry_number, password="pass"))
+    classroom.add_students([Student(f"Student {n}", "10A", n, password="pass") for n in entry_numbers[10:]])
+    return school, classroom
+
+
+def test_roster_stays_sorted_through_adds_and_removes():
+    school, classroom = shuffled_class(range(1, 200, 3))
+    rng = random.Random(1)
+    for _ in range(100):
+        if rng.random() < 0.5 and classroom.roster:
+            classroom.remove_student(rng.choice(classroom.roster))
+        else:
+            entry_number = rng.randint(1, 400)
+            classroom.add_student(Student("New", "10A", entry_number, password="pass"))
+        assert classroom.roster == sorted(classroom.students)
+    assert [student.entry_number for student in classroom.iter_students()] == classroom.roster
+
+
+def test_pages_cover_the_roster_once_in_order():
+    school, classroom = shuffled_class(range(1, 101))
+    pages = [[student.entry_number for student in classroom.iter_students(offset, 15)]
+             for offset in range(0, 100, 15)]
+    assert [len(page) for page in pages] == [15] * 6 + [10]
+    assert sum(pages, []) == list(range(1, 101))
+    assert list(classroom.iter_students(100, 15)) == []
+
+    # Cursor paging picks up after the last entry number seen, even if it has since left
+    first = [student.entry_number for student in classroom.iter_students(limit=20)]
+    classroom.remove_student(first[-1])
+    following = [student.entry_number for student in classroom.iter_students(limit=5, after=first[-1])]
+    assert following == [21, 22, 23, 24, 25]
+
+    assert [student.entry_number for student in classroom.students_in_range(95, 1000)] == [95, 96, 97, 98, 99, 100]
+    assert classroom.students_in_range(200, 300) == []
+
+    details = operations.class_details(school, "10A", offset=89, limit=50)
+    assert [student["entry_number"] for student in details["students"]] == list(range(91, 101))
+    assert details["count"] == 99
@@ -0,0 +1,172 @@
+import math
+import random
+import threading
+
+from events import TeacherAssigned
+from main import Classroom, School, Student, Teacher
+from ranks import SchoolRanks
+from storage import open_storage
+
+
+def build_school(classes=3, students_per_class=20):
+    school = School()
+    entry_number = 1
+    for c in range(classes):
+        classroom = Classroom(f"10{chr(65 + c)}", "Incharge")
+        school.add_class(classroom)
+        for _ in range(students_per_class):
+            classroom.add_student(Student(f"Student {entry_number}", classroom.class_no, entry_number,
+                                          password="pass"))
+            entry_number += 1
+    teacher = Teacher("Mr. Rao", "Maths", ["10A", "10B"], "pass")
+    teacher.teacher_id = 1
+    school.add_teacher(teacher)
+    return school
+
+
+def test_index_stays_consistent_through_changes():
+    school = build_school()
+    assert school.check_index() == []
+    rng = random.Random(3)
+    next_entry = 1000
+    for _ in range(200):
+        classroom = rng.choice(list(school.classes.values()))
+        action = rng.random()
+        if action < 0.3:
+            classroom.add_student(Student("New", classroom.class_no, next_entry, password="pass"))
+            next_entry += 1
+        elif action < 0.5 and classroom.roster:
+            classroom.remove_student(rng.choice(classroom.roster))
+        elif action < 0.7 and classroom.roster:
+            school.find_student(rng.choice(classroom.roster)).add_subject("Maths", rng.uniform(0, 100))
+        elif action < 0.75:
+            school.teachers[1].add_class_to_teach(classroom.class_no)
+        elif action < 0.85:
+            classroom.add_students([Student("Batch", classroom.class_no, next_entry + n, password="pass")
+                                    for n in range(5)])
+            next_entry += 5
+        else:
+            # Moving a student to another class must move their index entry with them
+            other = rng.choice(list(school.classes.values()))
+            if classroom.roster and other is not classroom:
+                student = classroom.students[rng.choice(classroom.roster)]
+                classroom.remove_student(student.entry_number)
+                other.add_student(student)
+        assert school.check_index() == []
+    school.remove_class("10A")
+    assert school.check_index() == []
+    assert all(school.find_student_class(entry_number) is not None for entry_number in school.student_index)
+    assert "10A" not in school.teachers[1].classes_to_teach
+
+
+def test_check_index_reports_drift():
+    school = build_school()
+    del school.student_index[1]
+    problems = school.check_index()
+    assert "Student 1 of class 10A is not indexed" in problems
+    assert any(problem.startswith("Index holds") for problem in problems)
+
+    school = build_school()
+    school.student_index[2] = (school.find_student(3), school.classes["10A"])
+    assert "Student 2 is indexed under the wrong record" in school.check_index()
+
+    school = build_school()
+    school.classes["10B"].school = None
+    assert "Class 10B is not attached to this school" in school.check_index()
+
+    school = build_school()
+    school.classes["10B"].roster = list(reversed(school.classes["10B"].roster))
+    assert "Roster of class 10B is out of order or out of sync" in school.check_index()
+
+    school = build_school()
+    school.class_teachers["10C"] = frozenset({1})
+    assert "Class to teacher index is out of sync with the teachers' classes" in school.check_index()
+
+    school = build_school()
+    student = school.find_student(5)
+    student._gpa = 50.0  # Bypasses the setter, so the ranks are not told
+    assert "Ranks of class 10A are out of sync with the students' GPAs" in school.check_index()
+
+
+def test_index_and_ranks_survive_concurrent_changes():
+    school = build_school(classes=4, students_per_class=50)
+    errors = []
+    stop = threading.Event()
+
+    def grade(class_no, seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(300):
+                classroom = school.classes.get(class_no)
+                if not classroom or not classroom.roster:
+                    continue
+                if rng.random() < 0.5:
+                    classroom.get_student(rng.choice(classroom.roster)).add_subject("Maths", rng.randint(0, 100))
+                else:
+                    classroom.set_grades("Physics", [(n, rng.randint(0, 100)) for n in classroom.roster[:10]])
+        except Exception as e:
+            errors.append(e)
+
+    def replace_class():
+        # Swaps 10D for a copy of itself, as replaying add_class does
+        try:
+            while not stop.is_set():
+                school.add_class(Classroom.from_record(school.classes["10D"].to_record()))
+                school.school_stats()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=grade, args=(class_no, seed))
+               for seed, class_no in enumerate(["10A", "10B", "10C", "10D"] * 2)]
+    replacer = threading.Thread(target=replace_class)
+    replacer.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    replacer.join()
+    assert errors == []
+    assert school.check_index() == []
+    expected = SchoolRanks()
+    for student, _ in school.student_index.values():
+        expected.add(student.gpa)
+    assert school.ranks.tree == expected.tree
+    gpas = [student.gpa for student, _ in school.student_index.values()]
+    count, mean, lowest, highest = school.school_stats()
+    assert (count, lowest, highest) == (len(gpas), min(gpas), max(gpas))
+    assert math.isclose(mean, sum(gpas) / len(gpas))
+
+
+def test_removing_a_class_or_teacher_cascades_through_the_teacher_index(tmp_path):
+    school = School()
+    storage = open_storage(school, str(tmp_path))
+    for class_no in ("10A", "10B", "10C"):
+        school.add_class(Classroom(class_no, "Incharge"))
+    for teacher_id, classes in ((1, ["10A", "10B"]), (2, ["10B", "10C"]), (3, ["10B"])):
+        teacher = Teacher(f"Teacher {teacher_id}", "Maths", classes, "pass")
+        teacher.teacher_id = teacher_id
+        school.add_teacher(teacher)
+    assert school.teachers_of("10B") == {1, 2, 3}
+    assigned = []
+    school.events.subscribe(assigned.append, TeacherAssigned)
+
+    school.remove_class("10B")
+    assert school.teachers_of("10B") == frozenset()
+    assert [school.teachers[n].classes_to_teach for n in (1, 2, 3)] == [{"10A"}, {"10C"}, set()]
+    assert sorted((event.teacher_id, event.class_no, event.teaching) for event in assigned) == [
+        (1, "10B", False), (2, "10B", False), (3, "10B", False)]
+    # A new class with the same number starts with no teachers
+    school.add_class(Classroom("10B", "Someone else"))
+    assert school.teachers_of("10B") == frozenset()
+
+    school.remove_teacher(2)
+    assert school.teachers_of("10C") == frozenset() and school.teachers_of("10A") == {1}
+    assert school.check_index() == []
+    storage.close()
+
+    loaded = School()
+    open_storage(loaded, str(tmp_path)).close()
+    assert loaded.class_teachers == school.class_teachers
+    assert {n: t.classes_to_teach for n, t in loaded.teachers.items()} == {1: {"10A"}, 3: set()}
+    assert loaded.check_index() == []
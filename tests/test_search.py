@@ -0,0 +1,80 @@
+import random
+
+from main import Classroom, School, Student, Teacher
+from search import MIN_PREFIX, NameIndex, max_edits, tokenize, within_distance
+
+FIRST = ["Asha", "Ashok", "Ravi", "Ravindra", "Meera", "Mira", "John", "Joan", "Priya", "Priyanka", "Sunil"]
+LAST = ["Sharma", "Sharman", "Rao", "Iyer", "Iyengar", "Khan", "Kapoor", "Singh", "Sinha", "Das"]
+
+
+def reference_keys(index, query, kind=None):
+    # Every record matching each query word exactly or by prefix or, if no token matches the word
+    # either way, by spelling
+    tokens = set(index.postings)
+    keys = set(index.names)
+    for word in set(tokenize(query)):
+        matching = {token for token in tokens if token == word or (len(word) >= MIN_PREFIX and token.startswith(word))}
+        if not matching:
+            matching = {token for token in tokens if max_edits(word) and within_distance(word, token, max_edits(word))}
+        keys = {key for key in keys if matching.intersection(index.name_tokens[key])}
+    return {key for key in keys if kind is None or key[0] == kind}
+
+
+def random_index(rng, size=300):
+    index = NameIndex()
+    for n in range(size):
+        kind = "teacher" if n % 5 == 0 else "student"
+        index.add((kind, n), f"{rng.choice(FIRST)} {rng.choice(LAST)}")
+    return index
+
+
+def test_search_finds_the_same_records_as_a_full_scan():
+    rng = random.Random(18)
+    index = random_index(rng)
+    for n in range(0, 300, 7):
+        index.remove(("student", n))
+        index.remove(("teacher", n))
+    queries = ["asha", "as", "sharma", "shar", "ravi", "ravi rao", "pri sin", "meera iyer", "sharam", "jhon",
+               "priyanak", "j", "zzz", "rao khan", "mira sharma"]
+    for query in queries:
+        for kind in (None, "teacher"):
+            assert set(index.search(query, limit=1000, kind=kind)) == reference_keys(index, query, kind), query
+
+
+def test_ranking_and_limits():
+    index = NameIndex()
+    for key, name in enumerate(["Sharman Das", "Asha Sharma", "Ravi Sharma", "Amit Shah", "Shar Khan"]):
+        index.add(("student", key), name)
+    # Exact matches first, then completions in name order
+    assert index.search("shar") == [("student", 4), ("student", 1), ("student", 2), ("student", 0)]
+    assert index.search("sharma", limit=1) == [("student", 1)]
+    # A one-letter word only matches whole words
+    assert index.search("s") == []
+    # Close spellings only when nothing matches exactly or by prefix
+    assert index.search("shrma") == [("student", 1), ("student", 2)]
+    assert index.search("sharma", fuzzy=False) == [("student", 1), ("student", 2), ("student", 0)]
+    # Both words must match; names with more exact words rank first
+    assert index.search("sharma ravi") == [("student", 2)]
+    assert index.search("shar a") == []
+
+    index.remove(("student", 4))
+    assert "shar" not in index.postings and "shar" not in index.tokens
+    assert index.search("shar")[0] == ("student", 1)
+
+
+def test_school_search_follows_changes():
+    school = School()
+    classroom = Classroom("10A", "Incharge")
+    school.add_class(classroom)
+    classroom.add_students([Student("Asha Sharma", "10A", 1, password="pass"),
+                            Student("Ravi Rao", "10A", 2, password="pass")])
+    teacher = Teacher("Sunil Sharma", "Maths", ["10A"], "pass")
+    teacher.teacher_id = 9
+    school.add_teacher(teacher)
+    assert [student.entry_number for student in school.search_students("sharma")] == [1]
+    assert [found.teacher_id for found in school.search_teachers("sharma")] == [9]
+    classroom.remove_student(1)
+    school.remove_teacher(9)
+    assert school.search_students("sharma") == [] and school.search_teachers("sunil") == []
+    school.remove_class("10A")
+    assert len(school.name_index) == 0
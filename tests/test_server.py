@@ -0,0 +1,174 @@
+import asyncio
+
+import pytest
+
+import operations
+from main import Admin, Classroom, School, Student, Teacher
+from operations import OperationError
+from server import MAX_REQUEST_BYTES, Client, SchoolServer
+
+
+def small_school():
+    school = School()
+    admin = Admin("admin", "admin123", school)
+    classroom = Classroom("10A", "Incharge")
+    school.add_class(classroom)
+    for entry_number in (1, 2, 3):
+        classroom.add_student(Student(f"Student {entry_number}", "10A", entry_number, password="pass"))
+    teacher = Teacher("Mr. Rao", "Maths", ["10A"], "pass")
+    teacher.teacher_id = 7
+    school.add_teacher(teacher)
+    return school, admin
+
+
+ADMIN_LOGIN = {"role": "admin", "username": "admin", "password": "admin123"}
+TEACHER_LOGIN = {"role": "teacher", "teacher_id": 7, "password": "pass"}
+
+
+def run_session(calls, login=TEACHER_LOGIN):
+    # Logs in and returns each call's result, or its error message
+    school, admin = small_school()
+
+    async def session():
+        server = await SchoolServer(school, admin).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        client = await Client.connect(port=port)
+        await client.request("login", **login)
+        results = []
+        for op, args in calls:
+            try:
+                results.append(await client.request(op, args=args))
+            except OperationError as e:
+                results.append(str(e))
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        return results
+
+    return school, asyncio.run(session())
+
+
+def test_arguments_are_checked_against_the_signature():
+    _, results = run_session([
+        ("update_grade", {"class_no": "10A", "entry_number": 1}),
+        ("update_grade", {"class_no": "10A", "entry_number": 1, "grade": 90, "school": None}),
+        ("update_grade", ["10A", 1, 90]),
+        ("update_grade", {"class_no": "10A", "entry_number": 1, "grade": 90}),
+    ])
+    assert results[0] == "Invalid arguments for update_grade: missing a required argument: 'grade'"
+    assert results[1] == "Invalid arguments for update_grade: got an unexpected keyword argument 'school'"
+    assert results[2] == "Invalid arguments for update_grade: args must be an object"
+    assert results[3]["grade"] == 90.0
+
+
+def test_list_arguments_are_type_checked():
+    school, results = run_session([
+        ("add_student", {"class_no": "10A", "name": "Ravi", "entry_number": 4, "password": "pass",
+                         "subjects": "Maths=90"}),
+        ("add_student", {"class_no": "10A", "name": "Ravi", "entry_number": 4, "password": "pass",
+                         "subjects": [["Maths", 90]]}),
+    ], login=ADMIN_LOGIN)
+    assert results[0].startswith("Invalid arguments for add_student: subjects must be")
+    assert school.find_student(4).grades == {"Maths": 90.0}
+
+    school, results = run_session([
+        ("update_grades", {"class_no": "10A", "grades": "1=90"}),
+        ("update_grades", {"class_no": "10A", "grades": [[1, 90], [2, 80]]}),
+        ("mark_attendance", {"class_no": "10A", "absent": "12", "day": "2026-09-01"}),
+        ("mark_attendance", {"class_no": "10A", "absent": [2], "day": "2026-09-01"}),
+    ])
+    assert results[0].startswith("Invalid arguments for update_grades: grades must be")
+    assert school.find_student(2).grades == {"Maths": 80.0}
+    assert results[2] == "Invalid arguments for mark_attendance: absent must be a list of entry numbers"
+    assert results[3]["absent"] == 1
+    assert school.attendance_rate(2) == (0, 8)
+
+
+def test_a_failing_handler_is_logged_and_not_reported_as_bad_arguments(monkeypatch, caplog):
+    def broken(teacher):
+        return len(None)  # A TypeError raised inside the handler
+
+    monkeypatch.setattr(operations, "teacher_details", broken)
+    _, results = run_session([("details", {})])
+    assert results == ["Internal error."]
+    assert "object of type 'NoneType' has no len()" in caplog.text
+
+
+@pytest.mark.parametrize("line", [b"not json\n", b"[1, 2]\n"])
+def test_malformed_requests(line):
+    school, admin = small_school()
+
+    async def send():
+        server = await SchoolServer(school, admin).start(port=0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(line)
+        await writer.drain()
+        response = await reader.readline()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response
+
+    assert asyncio.run(send()) == b'{"id":null,"ok":false,"error":"Invalid request."}\n'
+
+
+def test_password_operations_do_not_hold_up_other_sessions(monkeypatch):
+    school, admin = small_school()
+    loop = release = None
+    order = []
+
+    def slow_change_password(user, current_password, new_password):
+        # Stands in for the hash, blocking its thread until the other session has been served
+        loop.call_soon_threadsafe(order.append, "hashing")
+        assert asyncio.run_coroutine_threadsafe(release.wait(), loop).result(5)
+        return {}
+
+    monkeypatch.setattr(operations, "change_password", slow_change_password)
+
+    async def sessions():
+        nonlocal loop, release
+        loop, release = asyncio.get_running_loop(), asyncio.Event()
+        server = await SchoolServer(school, admin).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        teacher, student = await Client.connect(port=port), await Client.connect(port=port)
+        await teacher.request("login", **TEACHER_LOGIN)
+        await student.request("login", role="student", entry_number=1, password="pass")
+        changing = asyncio.ensure_future(teacher.call("change_password", current_password="pass",
+                                                      new_password="new"))
+        while not order:
+            await asyncio.sleep(0.01)
+        info = await student.call("info")
+        order.append("info")
+        release.set()
+        await changing
+        await teacher.close()
+        await student.close()
+        server.close()
+        await server.wait_closed()
+        return info
+
+    assert asyncio.run(sessions())["entry_number"] == 1
+    assert order == ["hashing", "info"]
+
+
+@pytest.mark.parametrize("size", [MAX_REQUEST_BYTES, 3 * MAX_REQUEST_BYTES])
+def test_an_overlong_request_is_refused_and_the_session_goes_on(size):
+    school, admin = small_school()
+    padding = b"a" * size
+
+    async def send():
+        server = await SchoolServer(school, admin).start(port=0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(b'{"id":1,"op":"logout","pad":"' + padding + b'"}\n{"id":2,"op":"logout"}\n')
+        await writer.drain()
+        responses = [await reader.readline(), await reader.readline()]
+        writer.close()
+        await writer.wait_closed()
+        server.close()
+        await server.wait_closed()
+        return responses
+
+    too_long, after = asyncio.run(send())
+    assert too_long == (b'{"id":null,"ok":false,"error":"Request too long; the limit is %d bytes."}\n'
+                        % MAX_REQUEST_BYTES)
+    assert after == b'{"id":2,"ok":true,"result":{}}\n'
@@ -0,0 +1,132 @@
+import math
+import sqlite3
+import threading
+import time
+
+from ledger import CHARGE, PAYMENT
+from main import Classroom, Interface, School, Student, Teacher
+from storage import open_storage
+
+
+def school_state(school):
+    return {entry_number: (classroom.class_no, student.fees, dict(student.grades))
+            for entry_number, (student, classroom) in school.student_index.items()}
+
+
+def roster_rows(school, class_no):
+    return [(s.entry_number, s.name, s.fees, s.gpa) for s in school.classes[class_no].iter_students()]
+
+
+def fill(school):
+    for class_no, entry_numbers in (("10A", (1, 2, 3)), ("10B", (4, 5))):
+        classroom = Classroom(class_no, "Incharge")
+        school.add_class(classroom)
+        classroom.add_students([Student(f"Student {n}", class_no, n, password="pass") for n in entry_numbers])
+    teacher = Teacher("Mr. Rao", "Maths", ["10A"], "pass")
+    teacher.teacher_id = 7
+    school.add_teacher(teacher)
+    school.find_student(1).add_subject("Maths", 90)
+    school.classes["10B"].set_grades("Physics", [(4, 70), (5, 65)])
+    school.post_fee(2, CHARGE, 250, "Trip")
+    school.post_fee(4, PAYMENT, 300)
+    school.classes["10A"].remove_student(3)
+
+
+def test_the_interface_keeps_its_school_in_an_sqlite_file(tmp_path):
+    path = str(tmp_path / "school.db")
+    interface = Interface(path)
+    fill(interface.school)
+    # Objects handed out by the school are the live ones, so changing one is saved
+    interface.school.find_student(5).remove_subject("Physics")
+    interface.school.teachers[7].add_class_to_teach("10B")
+    state = school_state(interface.school)
+    interface.close()
+
+    reopened = Interface(path)
+    assert school_state(reopened.school) == state
+    assert reopened.school.teachers[7].classes_to_teach == {"10A", "10B"}
+    assert reopened.school.find_student(1).authenticate("pass")
+    assert reopened.school.check_index() == []
+    reopened.close()
+    assert not list(tmp_path.glob("journal-*.log"))
+
+
+def test_snapshots_are_taken_inside_the_database(tmp_path):
+    path = str(tmp_path / "school.sqlite")
+    interface = Interface(path)
+    interface.storage.snapshot_every = 3
+    fill(interface.school)
+    state = school_state(interface.school)
+    assert interface.storage.snapshot_seq > 0
+    interface.close()
+    reopened = Interface(path)
+    assert school_state(reopened.school) == state
+    reopened.close()
+
+
+def test_query_tables_follow_the_school(tmp_path):
+    interface = Interface(str(tmp_path / "school.db"))
+    school, storage = interface.school, interface.storage
+    fill(school)
+    school.find_student(4).subjects = [("Art", 80)]
+    school.remove_class("10A")
+    school.add_class(Classroom("10C", "Incharge"))
+    school.classes["10C"].add_student(Student("Late", "10C", 9, password="pass"))
+
+    for class_no, classroom in school.classes.items():
+        assert math.isclose(storage.class_average(class_no), classroom.class_average())
+        assert storage.fee_total(class_no) == (len(classroom.students),
+                                              sum(s.fees for s in classroom.students.values()))
+        assert storage.roster(class_no) == roster_rows(school, class_no)
+    assert storage.fee_total() == (3, sum(student.fees for student, _ in school.student_index.values()))
+    interface.close()
+
+    # The tables are rebuilt from the saved school when it is opened again
+    reopened = Interface(str(tmp_path / "school.db"))
+    assert reopened.storage.roster("10B") == roster_rows(reopened.school, "10B")
+    reopened.close()
+
+
+def test_queries_run_while_other_threads_write(tmp_path):
+    interface = Interface(str(tmp_path / "school.db"))
+    school, storage = interface.school, interface.storage
+    fill(school)
+    errors = []
+
+    def write(entry_number):
+        try:
+            for grade in range(200):
+                school.find_student(entry_number).add_subject("Maths", grade % 100)
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            for _ in range(200):
+                storage.class_average("10B")
+                storage.fee_total()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in (1, 4, 5)] + [threading.Thread(target=read)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert math.isclose(storage.class_average("10B"), school.classes["10B"].class_average())
+    interface.close()
+
+
+def test_changes_are_committed_when_no_more_follow(tmp_path):
+    path = str(tmp_path / "school.db")
+    school = School()
+    open_storage(school, path, sync_every=1000, sync_interval=0.05)
+    school.add_class(Classroom("10A", "Incharge"))
+    reader = sqlite3.connect(path)
+    deadline = time.monotonic() + 5
+    while not reader.execute("SELECT COUNT(*) FROM journal").fetchone()[0] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert reader.execute("SELECT COUNT(*) FROM classes").fetchone()[0] == 1
+    reader.close()
+    school.storage.close()
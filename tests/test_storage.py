@@ -0,0 +1,142 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from events import FeeUpdated
+from ledger import CHARGE, PAYMENT
+from main import Classroom, School, Student, Teacher
+from storage import StorageLocked, open_storage
+
+
+def school_state(school):
+    return {entry_number: (student.fees, dict(student.grades), school.ledger.history.get(entry_number))
+            for entry_number, (student, _) in school.student_index.items()}
+
+
+def reopen(directory):
+    school = School()
+    open_storage(school, directory).close()
+    return school
+
+
+def two_class_school(directory, snapshot_every):
+    school = School()
+    open_storage(school, directory, snapshot_every=snapshot_every)
+    for class_no, entry_numbers in (("10A", (1, 2, 3)), ("10B", (4, 5))):
+        classroom = Classroom(class_no, "Incharge")
+        school.add_class(classroom)
+        classroom.add_students([Student(f"Student {n}", class_no, n, password="pass") for n in entry_numbers])
+    return school
+
+
+def test_journal_and_snapshots_replay_to_the_same_state(tmp_path):
+    school = two_class_school(str(tmp_path), snapshot_every=4)
+    school.find_student(1).add_subject("Maths", 90)
+    school.post_fee(2, CHARGE, 250, "Trip")
+    school.find_student(4).subjects = [("Physics", 70), ("Art", 65)]
+    school.classes["10B"].set_grades("Maths", [(4, 55), (5, 60)])
+    school.post_term_fee(500, "Term 1")
+    school.post_fee(4, PAYMENT, 300)
+    school.classes["10A"].remove_student(3)
+    school.find_student(4).remove_subject("Physics")
+    teacher = Teacher("Mr. Rao", "Maths", ["10A"], "pass")
+    teacher.teacher_id = 7
+    school.add_teacher(teacher)
+    teacher.add_class_to_teach("10B")
+    school.storage.close()
+    assert list(tmp_path.glob("snapshot-*.json"))
+    loaded = reopen(str(tmp_path))
+    assert school_state(loaded) == school_state(school)
+    assert loaded.teachers[7].classes_to_teach == {"10A", "10B"}
+    assert loaded.check_index() == []
+
+
+def test_a_torn_last_line_is_cut_off(tmp_path):
+    school = two_class_school(str(tmp_path), snapshot_every=1000)
+    school.find_student(1).add_subject("Maths", 90)
+    school.storage.close()
+    journal = next(tmp_path.glob("journal-*.log"))
+    with open(journal, "a", encoding="utf-8") as f:
+        f.write('{"op":"set_grade","entry_number":1,"sub')
+    loaded = School()
+    open_storage(loaded, str(tmp_path)).close()
+    assert loaded.find_student(1).grades == {"Maths": 90}
+    assert journal.read_text(encoding="utf-8").endswith("}\n")
+
+
+def test_snapshot_waits_for_a_change_that_is_not_journaled_yet(tmp_path):
+    # A fee posting is applied in memory and then journaled. A snapshot taken between the two
+    # would hold the posting and the journal would replay it on top, charging it twice.
+    school = two_class_school(str(tmp_path), snapshot_every=1000)
+    paused = threading.Event()
+    resume = threading.Event()
+
+    def pause_after_applying(event):
+        if event.entry_number == 1:
+            paused.set()
+            resume.wait(5)
+
+    school.events.subscribe(pause_after_applying, FeeUpdated)
+    poster = threading.Thread(target=school.post_fee, args=(1, CHARGE, 100))
+    poster.start()
+    assert paused.wait(5)
+    # A change to the other class makes a snapshot due while the posting is half done, and the
+    # posting's own record comes too soon after it to be due again
+    school.storage.snapshot_every = 2
+    school.find_student(4).add_subject("Maths", 80)
+    resume.set()
+    poster.join()
+    school.storage.close()
+    assert [path.name for path in tmp_path.glob("snapshot-*.json")] == ["snapshot-000000000006.json"]
+
+    loaded = reopen(str(tmp_path))
+    assert loaded.find_student(1).fees == 1100
+    assert school_state(loaded) == school_state(school)
+
+
+def test_changes_reach_the_disk_when_no_more_follow(tmp_path):
+    school = School()
+    open_storage(school, str(tmp_path), sync_every=1000, sync_interval=0.05)
+    school.add_class(Classroom("10A", "Incharge"))
+    journal = next(tmp_path.glob("journal-*.log"))
+    deadline = time.monotonic() + 5
+    while not journal.stat().st_size and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert b'"op":"add_class"' in journal.read_bytes()
+    school.storage.close()
+
+
+@pytest.mark.parametrize("name", ["data", "school.db"])
+def test_a_school_is_open_in_one_process_at_a_time(tmp_path, name):
+    location = str(tmp_path / name)
+    storage = open_storage(School(), location)
+    other = subprocess.run([sys.executable, "-c", "import sys; from main import School; from storage import "
+                            "open_storage; open_storage(School(), sys.argv[1])", location],
+                           cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           capture_output=True, text=True)
+    assert other.returncode == 1
+    assert f"StorageLocked: {location} is already open in another ScholarSync process" in other.stderr
+    with pytest.raises(StorageLocked):
+        open_storage(School(), location)
+    storage.close()
+    open_storage(School(), location).close()
+
+
+def test_runs_of_added_students_replay_as_one_batch():
+    records = [{"op": "add_class", "classroom": Classroom("10A", "Incharge").to_record()}]
+    for entry_number in (1, 2, 3, 2, 4):
+        student = Student(f"Student {entry_number}", "10A", entry_number, password="pass")
+        student.add_subject("Maths", entry_number * 10)
+        records.append({"op": "add_student", "class_no": "10A", "student": student.to_record()})
+    records.append({"op": "remove_student", "class_no": "10A", "entry_number": 3})
+    one_by_one, batched = School(), School()
+    for record in records:
+        one_by_one.apply(record)
+    batched.apply_all(records)
+    assert school_state(batched) == school_state(one_by_one)
+    assert batched.classes["10A"].roster == [1, 2, 4]
+    assert batched.check_index() == []
@@ -0,0 +1,88 @@
+import math
+import random
+
+import pytest
+
+from main import Classroom, School, Student, Teacher
+
+SUBJECTS = ["Maths", "Physics", "Chemistry", "Biology", "English", "History"]
+
+
+def check_totals(student):
+    # grade_total and the GPA must match a full recomputation from the grades
+    grades = list(student.grades.values())
+    assert math.isclose(student.grade_total, sum(grades), abs_tol=1e-9)
+    expected_gpa = sum(grades) / len(grades) if grades else 0.0
+    assert math.isclose(student.gpa, expected_gpa, abs_tol=1e-9)
+    assert math.isclose(student.calculate_gpa(), expected_gpa, abs_tol=1e-9)
+
+
+def random_steps(student, rng, steps):
+    for _ in range(steps):
+        action = rng.random()
+        subject = rng.choice(SUBJECTS)
+        if action < 0.5:
+            # Adds a new subject or replaces an existing grade
+            student.add_subject(subject, round(rng.uniform(0, 100), 2))
+        elif action < 0.75:
+            student.remove_subject(subject)
+        elif action < 0.9:
+            student.add_subjects((rng.choice(SUBJECTS), round(rng.uniform(0, 100), 2)) for _ in range(3))
+        else:
+            student.subjects = [(subject, round(rng.uniform(0, 100), 2)) for subject in rng.sample(SUBJECTS, 2)]
+        check_totals(student)
+
+
+def test_grade_total_matches_recomputation():
+    for seed in range(20):
+        student = Student("Asha", "10A", 1, password="pass")
+        random_steps(student, random.Random(seed), 300)
+
+
+def test_grade_total_matches_recomputation_in_a_school():
+    # The same steps through a classroom, which also keeps the class totals and ranks
+    school = School()
+    classroom = Classroom("10A", "Mr. Rao")
+    school.add_class(classroom)
+    rng = random.Random(7)
+    students = [Student(f"Student {n}", "10A", n, password="pass") for n in range(1, 6)]
+    for student in students:
+        classroom.add_student(student)
+    for _ in range(40):
+        random_steps(rng.choice(students), rng, 10)
+        assert math.isclose(classroom.gpa_total, sum(student.gpa for student in students), abs_tol=1e-6)
+    assert school.check_index() == []
+
+
+def test_removing_the_last_subject_resets_the_total():
+    student = Student("Asha", "10A", 1, password="pass")
+    student.add_subject("Maths", 0.1)
+    student.add_subject("Physics", 0.2)
+    student.remove_subject("Maths")
+    student.remove_subject("Physics")
+    assert student.grades == {}
+    assert student.grade_total == 0.0
+    assert student.gpa == 0.0
+
+
+def test_records_use_slots_and_share_repeated_strings():
+    # Strings built at run time, as from a file, so only _intern can make them the same object
+    subject, class_no = "".join(["Ma", "ths"]), "".join(["10", "A"])
+    first = Student("Asha", class_no, 1, password="pass")
+    second = Student.from_record(Student("Ravi", "".join(["10", "A"]), 2, password="pass").to_record())
+    first.add_subject(subject, 90)
+    second.add_subject("".join(["Ma", "ths"]), 80)
+    assert first.class_ is second.class_
+    assert next(iter(first.grades)) is next(iter(second.grades))
+    teacher = Teacher("Mr. Rao", "".join(["Ma", "ths"]), ["".join(["10", "A"])], "pass")
+    assert teacher.subject is next(iter(first.grades))
+    assert next(iter(teacher.classes_to_teach)) is first.class_
+    for record in (first, teacher, Classroom("10A", "Incharge")):
+        assert not hasattr(record, "__dict__")
+        with pytest.raises(AttributeError):
+            record.nickname = "x"
+
+    copy = Student.from_record(first.to_record())
+    assert (copy.name, copy.class_, copy.entry_number, copy.fees, copy.grades, copy.gpa) == \
+        ("Asha", "10A", 1, 1000, {"Maths": 90}, 90.0)
+    assert copy.authenticate("pass")
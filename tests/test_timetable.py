@@ -0,0 +1,74 @@
+import timetable
+from main import Classroom, School, Student, Teacher
+from timetable import Lesson, Timetable
+
+
+def busy_from_lessons(table):
+    # The bitsets rebuilt from the placed lessons alone
+    teachers, classes, rooms = {}, {}, {}
+    for lesson in table.lessons:
+        if lesson.slot is not None:
+            bit = 1 << lesson.slot
+            teachers[lesson.teacher_id] = teachers.get(lesson.teacher_id, 0) | bit
+            classes[lesson.class_no] = classes.get(lesson.class_no, 0) | bit
+            rooms[lesson.room] = rooms.get(lesson.room, 0) | bit
+    return teachers, classes, rooms
+
+
+def teaching_school():
+    school = School()
+    entry_number = 1
+    for class_no, size in (("9A", 30), ("9B", 25), ("10A", 35), ("10B", 20)):
+        classroom = Classroom(class_no, "Incharge")
+        school.add_class(classroom)
+        classroom.add_students([Student(f"Student {n}", class_no, n, password="pass")
+                                for n in range(entry_number, entry_number + size)])
+        entry_number += size
+    for teacher_id, (subject, classes) in enumerate((("Maths", ["9A", "9B", "10A"]), ("Physics", ["9A", "10A", "10B"]),
+                                                     ("English", ["9B", "10B", "10A"]), ("History", ["9A", "9B"])), 1):
+        teacher = Teacher(f"Teacher {teacher_id}", subject, classes)
+        teacher.teacher_id = teacher_id
+        school.add_teacher(teacher)
+    return school
+
+
+def test_a_solvable_school_gets_a_full_timetable_without_clashes():
+    table, _ = timetable.build_timetable(teaching_school(), days=5, periods=6, lessons_per_week=4)
+    assert len(table.lessons) == 44
+    assert table.unplaced == []
+    assert table.check() == []
+    teachers, classes, rooms = busy_from_lessons(table)
+    assert teachers == table.teacher_busy and classes == table.class_busy
+    assert [rooms.get(room, 0) for room in range(len(table.rooms))] == table.room_busy
+    # With 30 periods for at most 12 lessons a teacher, no class needs a subject twice in a day
+    assert table.penalties()["subject repeats"] == 0
+    assert len(list(table.rows())) == 44
+
+
+def test_an_over_constrained_teacher_leaves_lessons_unplaced():
+    school = teaching_school()
+    # Teacher 1 now has 4 lessons in each of 3 classes but only 2 x 4 = 8 periods in the week
+    table, _ = timetable.build_timetable(school, days=2, periods=4, lessons_per_week=4)
+    unplaced = table.unplaced
+    assert len([lesson for lesson in unplaced if lesson.teacher_id == 1]) >= 4
+    assert all(lesson.room is None for lesson in unplaced)
+    assert table.check() == []
+
+
+def test_classes_only_go_to_rooms_that_hold_them():
+    table = Timetable(days=1, periods=4, rooms=[("Hall", 40), ("Lab", 12), ("Room 1", 25)])
+    lessons = ([Lesson("Big", "Maths", 1) for _ in range(2)] + [Lesson("Big 2", "Physics", 2) for _ in range(2)]
+               + [Lesson("Small", "Art", 3) for _ in range(4)])
+    table.add_lessons(lessons, {"Big": 38, "Big 2": 36, "Small": 10})
+    assert table.solve() == []
+    assert table.check() == []
+    for lesson in lessons:
+        assert table.capacities[lesson.room] >= table.class_sizes[lesson.class_no]
+    # Only the hall holds either big class, so they never share a period
+    big_slots = [lesson.slot for lesson in lessons if lesson.class_no.startswith("Big")]
+    assert sorted(big_slots) == [0, 1, 2, 3]
+
+    # A class bigger than every room can never be placed
+    table = Timetable(days=1, periods=4, rooms=[("Lab", 12)])
+    table.add_lessons([Lesson("Huge", "Maths", 1)], {"Huge": 50})
+    assert len(table.solve()) == 1
@@ -0,0 +1,425 @@
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from bisect import bisect_left
+
+from main import Interface
+
+# Weekly timetable generation from the school's classes and teachers.
+#
+# Every teacher teaches their subject to each class in Teacher.classes_to_teach, lessons_per_week
+# times a week. Each lesson gets a period and a room so that no teacher, class or room is booked
+# twice in a period and every room holds the class taught in it. Those are the hard constraints.
+# Two soft constraints are counted and kept low: a class having the same subject twice in a day,
+# and a teacher left idle between two lessons of a day.
+#
+# The busy periods of each teacher, class and room are held as bitsets, one bit per period of the
+# week, so the periods open to a lesson are found with a few integer operations:
+#
+#   free = week & ~(teacher_busy | class_busy)
+#
+# Lessons are placed hardest first (busiest teacher, then busiest class) in the open period that
+# adds the least penalty. A lesson with no open period gets one by moving a lesson that blocks it.
+# Passes of local search then move lessons to periods with a lower penalty.
+#
+#   python timetable.py timetable.csv --days 5 --periods 8 --lessons-per-week 4 --rooms rooms.csv
+
+SPREAD_WEIGHT = 2  # Penalty for each repeat of a subject within a class's day
+GAP_WEIGHT = 1  # Penalty for each idle period between a teacher's lessons in a day
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def _popcount(bits):
+    return bin(bits).count("1")
+
+
+def _gaps(day_bits):
+    # Idle periods between the first and last lesson of a day
+    if not day_bits:
+        return 0
+    span = day_bits.bit_length() - ((day_bits & -day_bits).bit_length() - 1)
+    return span - _popcount(day_bits)
+
+
+class Lesson:
+    __slots__ = ("class_no", "subject", "teacher_id", "slot", "room")
+
+    def __init__(self, class_no, subject, teacher_id):
+        self.class_no = class_no
+        self.subject = subject
+        self.teacher_id = teacher_id
+        self.slot = None  # Period of the week, day * periods + period; None until placed
+        self.room = None  # Index into Timetable.rooms
+
+
+class Timetable:
+    def __init__(self, days=5, periods=8, rooms=None):
+        self.days = days
+        self.periods = periods
+        self.week = (1 << days * periods) - 1
+        self.rooms = sorted(rooms or [], key=lambda room: (room[1], room[0]))  # (name, capacity), smallest first
+        self.capacities = [capacity for _, capacity in self.rooms]
+        self.lessons = []
+        self.class_sizes = {}  # Dict with class_no as key and number of students as value
+        self.teacher_busy = {}  # Dict with teacher_id as key and bitset of busy periods as value
+        self.class_busy = {}  # Dict with class_no as key and bitset of busy periods as value
+        self.room_busy = [0] * len(self.rooms)
+        # Dict with ("teacher", teacher_id, slot), ("class", class_no, slot) or ("room", room, slot) as
+        # key and the Lesson booked there as value
+        self.slot_lessons = {}
+        self.subject_days = {}  # Dict with (class_no, subject) as key and list of lessons per day as value
+
+    @property
+    def unplaced(self):
+        return [lesson for lesson in self.lessons if lesson.slot is None]
+
+    # Bookkeeping. place and unplace keep every bitset and count in step with the lessons.
+
+    def place(self, lesson, slot, room):
+        bit = 1 << slot
+        lesson.slot = slot
+        lesson.room = room
+        self.teacher_busy[lesson.teacher_id] |= bit
+        self.class_busy[lesson.class_no] |= bit
+        self.room_busy[room] |= bit
+        self.slot_lessons[("teacher", lesson.teacher_id, slot)] = lesson
+        self.slot_lessons[("class", lesson.class_no, slot)] = lesson
+        self.slot_lessons[("room", room, slot)] = lesson
+        self.subject_days[(lesson.class_no, lesson.subject)][slot // self.periods] += 1
+
+    def unplace(self, lesson):
+        slot = lesson.slot
+        bit = 1 << slot
+        self.teacher_busy[lesson.teacher_id] &= ~bit
+        self.class_busy[lesson.class_no] &= ~bit
+        self.room_busy[lesson.room] &= ~bit
+        del self.slot_lessons[("teacher", lesson.teacher_id, slot)]
+        del self.slot_lessons[("class", lesson.class_no, slot)]
+        del self.slot_lessons[("room", lesson.room, slot)]
+        self.subject_days[(lesson.class_no, lesson.subject)][slot // self.periods] -= 1
+        lesson.slot = None
+        lesson.room = None
+
+    def _first_room(self, lesson):
+        # Index of the smallest room that holds the lesson's class
+        return bisect_left(self.capacities, self.class_sizes[lesson.class_no])
+
+    def _room_slots(self, lesson):
+        # Bitset of the periods in which some room big enough for the class is free
+        free = 0
+        week = self.week
+        for busy in self.room_busy[self._first_room(lesson):]:
+            free |= week & ~busy
+            if free == week:
+                break
+        return free
+
+    def _room_at(self, lesson, slot):
+        # Smallest free room at slot that holds the class, or None
+        bit = 1 << slot
+        room_busy = self.room_busy
+        for room in range(self._first_room(lesson), len(room_busy)):
+            if not room_busy[room] & bit:
+                return room
+        return None
+
+    def open_slots(self, lesson):
+        # Bitset of the periods where the lesson breaks no hard constraint
+        return (self.week & ~(self.teacher_busy[lesson.teacher_id] | self.class_busy[lesson.class_no])
+                & self._room_slots(lesson))
+
+    def fits(self, lesson, slot):
+        # True if the lesson breaks no hard constraint at slot; cheaper than open_slots for one period
+        bit = 1 << slot
+        return (not (self.teacher_busy[lesson.teacher_id] | self.class_busy[lesson.class_no]) & bit
+                and self._room_at(lesson, slot) is not None)
+
+    def cost(self, lesson, slot):
+        # Soft penalty added by placing an unplaced lesson at slot
+        day = slot // self.periods
+        penalty = SPREAD_WEIGHT * (self.subject_days[(lesson.class_no, lesson.subject)][day] > 0)
+        shift = day * self.periods
+        day_bits = (self.teacher_busy[lesson.teacher_id] >> shift) & ((1 << self.periods) - 1)
+        return penalty + GAP_WEIGHT * (_gaps(day_bits | 1 << (slot - shift)) - _gaps(day_bits))
+
+    def _best_slot(self, lesson, free):
+        best = None
+        best_cost = None
+        while free:
+            low = free & -free
+            free ^= low
+            slot = low.bit_length() - 1
+            cost = self.cost(lesson, slot)
+            if best is None or cost < best_cost:
+                best, best_cost = slot, cost
+                if cost <= 0:
+                    break
+        return best, best_cost
+
+    # Solving
+
+    def add_lessons(self, lessons, class_sizes):
+        self.class_sizes.update(class_sizes)
+        for lesson in lessons:
+            self.lessons.append(lesson)
+            self.teacher_busy.setdefault(lesson.teacher_id, 0)
+            self.class_busy.setdefault(lesson.class_no, 0)
+            self.subject_days.setdefault((lesson.class_no, lesson.subject), [0] * self.days)
+
+    def solve(self, improve_passes=2, seed=0):
+        # Places every lesson it can; returns the lessons left unplaced
+        teacher_load = {}
+        class_load = {}
+        for lesson in self.lessons:
+            teacher_load[lesson.teacher_id] = teacher_load.get(lesson.teacher_id, 0) + 1
+            class_load[lesson.class_no] = class_load.get(lesson.class_no, 0) + 1
+        order = sorted((lesson for lesson in self.lessons if lesson.slot is None),
+                       key=lambda lesson: (-teacher_load[lesson.teacher_id], -class_load[lesson.class_no],
+                                           -self.class_sizes[lesson.class_no], str(lesson.class_no),
+                                           str(lesson.teacher_id)))
+        for lesson in order:
+            slot, _ = self._best_slot(lesson, self.open_slots(lesson))
+            if slot is not None:
+                self.place(lesson, slot, self._room_at(lesson, slot))
+            else:
+                self._place_by_moving(lesson)
+        rng = random.Random(seed)
+        for _ in range(improve_passes):
+            if not self.improve(rng):
+                break
+        return self.unplaced
+
+    def _place_by_moving(self, lesson):
+        # Looks for a period where the lessons in the way (the teacher's, the class's, or one in a
+        # room big enough) can move to other open periods, moves them and places lesson there
+        for slot in range(self.days * self.periods):
+            bit = 1 << slot
+            moved = []
+            done = True
+            for key in (("teacher", lesson.teacher_id, slot), ("class", lesson.class_no, slot)):
+                blocker = self.slot_lessons.get(key)
+                if blocker is not None and not self._move_elsewhere(blocker, bit, moved):
+                    done = False
+                    break
+            if done and not self.fits(lesson, slot):
+                done = any(self._move_elsewhere(self.slot_lessons[("room", room, slot)], bit, moved)
+                           for room in range(self._first_room(lesson), len(self.rooms)))
+            if done and self.fits(lesson, slot):
+                self.place(lesson, slot, self._room_at(lesson, slot))
+                return True
+            # Undo the moves made for this period before trying the next
+            for blocker, old_slot, old_room in reversed(moved):
+                self.unplace(blocker)
+                self.place(blocker, old_slot, old_room)
+        return False
+
+    def _move_elsewhere(self, lesson, avoid, moved):
+        # Moves a placed lesson to its cheapest open period outside the avoid bitset, noting the
+        # move in moved; returns False, leaving it in place, if there is none
+        old_slot, old_room = lesson.slot, lesson.room
+        self.unplace(lesson)
+        slot, _ = self._best_slot(lesson, self.open_slots(lesson) & ~avoid)
+        if slot is None:
+            self.place(lesson, old_slot, old_room)
+            return False
+        self.place(lesson, slot, self._room_at(lesson, slot))
+        moved.append((lesson, old_slot, old_room))
+        return True
+
+    def improve(self, rng):
+        # One pass of local search. Each lesson that adds to the penalty, in random order, moves to
+        # its cheapest open period, or else swaps periods with another lesson of its class if that
+        # lowers the penalty. Returns True if the total penalty went down.
+        lessons = [lesson for lesson in self.lessons if lesson.slot is not None]
+        rng.shuffle(lessons)
+        improved = False
+        for lesson in lessons:
+            old_slot, old_room = lesson.slot, lesson.room
+            self.unplace(lesson)
+            old_cost = self.cost(lesson, old_slot)
+            if old_cost <= 0:
+                self.place(lesson, old_slot, old_room)
+                continue
+            slot, cost = self._best_slot(lesson, self.open_slots(lesson))
+            if cost is not None and cost < old_cost:
+                self.place(lesson, slot, self._room_at(lesson, slot))
+                improved = True
+            else:
+                self.place(lesson, old_slot, old_room)
+                improved = self._swap(lesson) or improved
+        return improved
+
+    def _swap(self, lesson):
+        # Tries swapping periods with each other lesson of the class; keeps the first swap that
+        # lowers the penalty and returns True, or leaves everything as it was and returns False
+        busy = self.class_busy[lesson.class_no] & ~(1 << lesson.slot)
+        while busy:
+            low = busy & -busy
+            busy ^= low
+            other = self.slot_lessons[("class", lesson.class_no, low.bit_length() - 1)]
+            if other.teacher_id == lesson.teacher_id:
+                continue
+            a_slot, a_room, b_slot, b_room = lesson.slot, lesson.room, other.slot, other.room
+            self.unplace(lesson)
+            self.unplace(other)
+            before = self.cost(lesson, a_slot)
+            self.place(lesson, a_slot, a_room)
+            before += self.cost(other, b_slot)
+            self.unplace(lesson)
+            if self.fits(lesson, b_slot):
+                after = self.cost(lesson, b_slot)
+                self.place(lesson, b_slot, self._room_at(lesson, b_slot))
+                if self.fits(other, a_slot):
+                    after += self.cost(other, a_slot)
+                    if after < before:
+                        self.place(other, a_slot, self._room_at(other, a_slot))
+                        return True
+                self.unplace(lesson)
+            self.place(lesson, a_slot, a_room)
+            self.place(other, b_slot, b_room)
+        return False
+
+    # Reporting
+
+    def penalties(self):
+        # Returns {"subject repeats": n, "teacher gaps": n}, counted from scratch
+        repeats = sum(max(0, count - 1) for counts in self.subject_days.values() for count in counts)
+        gaps = sum(_gaps((busy >> day * self.periods) & ((1 << self.periods) - 1))
+                   for busy in self.teacher_busy.values() for day in range(self.days))
+        return {"subject repeats": repeats, "teacher gaps": gaps}
+
+    def penalty(self):
+        counts = self.penalties()
+        return SPREAD_WEIGHT * counts["subject repeats"] + GAP_WEIGHT * counts["teacher gaps"]
+
+    def check(self):
+        # Returns a list of hard constraint problems, found from the lessons alone
+        problems = []
+        seen = {}
+        for lesson in self.lessons:
+            if lesson.slot is None:
+                continue
+            for key in (("Teacher", lesson.teacher_id), ("Class", lesson.class_no), ("Room", lesson.room)):
+                other = seen.get(key + (lesson.slot,))
+                if other:
+                    problems.append(f"{key[0]} {key[1]} is booked twice in {self.slot_name(lesson.slot)}")
+                seen[key + (lesson.slot,)] = lesson
+            if self.capacities[lesson.room] < self.class_sizes[lesson.class_no]:
+                problems.append(f"Room {self.rooms[lesson.room][0]} is too small for class {lesson.class_no}")
+        return problems
+
+    def slot_name(self, slot):
+        day, period = divmod(slot, self.periods)
+        day_name = DAY_NAMES[day] if day < len(DAY_NAMES) else f"Day {day + 1}"
+        return f"{day_name} P{period + 1}"
+
+    def rows(self):
+        # One row per placed lesson, by class, day and period
+        lessons = sorted((lesson for lesson in self.lessons if lesson.slot is not None),
+                         key=lambda lesson: (str(lesson.class_no), lesson.slot))
+        for lesson in lessons:
+            day, period = divmod(lesson.slot, self.periods)
+            yield [lesson.class_no, day + 1, period + 1, lesson.subject, lesson.teacher_id,
+                   self.rooms[lesson.room][0]]
+
+    def class_lines(self, class_no, teacher_names=None):
+        # A day by period grid of one class's week
+        grid = {lesson.slot: lesson for lesson in self.lessons
+                if lesson.class_no == class_no and lesson.slot is not None}
+        lines = [f"========== TIMETABLE: CLASS {class_no} =========="]
+        for day in range(self.days):
+            cells = []
+            for period in range(self.periods):
+                lesson = grid.get(day * self.periods + period)
+                if lesson:
+                    teacher = (teacher_names or {}).get(lesson.teacher_id, lesson.teacher_id)
+                    cells.append(f"P{period + 1} {lesson.subject} ({teacher}, {self.rooms[lesson.room][0]})")
+            day_name = DAY_NAMES[day] if day < len(DAY_NAMES) else f"Day {day + 1}"
+            lines.append(f"{day_name}: " + ("; ".join(cells) or "Free"))
+        lines.append("")
+        return lines
+
+
+def school_lessons(school, lessons_per_week=4):
+    # Returns ([Lesson], {class_no: number of students}) for every class each teacher teaches.
+    # lessons_per_week is a number, or a dict with subject as key and number as value.
+    classes = school.classes
+    lessons = []
+    for teacher_id, teacher in sorted(school.teachers.items()):
+        count = lessons_per_week.get(teacher.subject, 0) if isinstance(lessons_per_week, dict) else lessons_per_week
+        for class_no in sorted(teacher.classes_to_teach):
+            if class_no in classes:
+                lessons.extend(Lesson(class_no, teacher.subject, teacher_id) for _ in range(count))
+    return lessons, {class_no: len(classroom.students) for class_no, classroom in classes.items()}
+
+
+def home_rooms(school):
+    # One room per class, just big enough for it, for when no rooms are given
+    return [(f"Room {class_no}", len(classroom.students)) for class_no, classroom in school.classes.items()]
+
+
+def build_timetable(school, days=5, periods=8, lessons_per_week=4, rooms=None, improve_passes=2, seed=0):
+    # Returns (Timetable, seconds taken)
+    start = time.perf_counter()
+    timetable = Timetable(days, periods, rooms if rooms is not None else home_rooms(school))
+    timetable.add_lessons(*school_lessons(school, lessons_per_week))
+    timetable.solve(improve_passes, seed)
+    return timetable, time.perf_counter() - start
+
+
+def read_rooms(path):
+    # Reads rooms from a CSV file with "room" and "capacity" columns
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["room"].strip(), int(row["capacity"])) for row in csv.DictReader(f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a weekly timetable for every class.")
+    parser.add_argument("output", help="File to write the timetable to, or - for standard output")
+    parser.add_argument("--format", choices=["csv", "text"], default="csv")
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--periods", type=int, default=8, help="Periods per day")
+    parser.add_argument("--lessons-per-week", type=int, default=4, help="Lessons of each subject per class")
+    parser.add_argument("--rooms", help="CSV file of rooms with room and capacity columns (default: a room per class)")
+    parser.add_argument("--improve", type=int, default=2, help="Local search passes over the soft constraints")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.environ.get("SCHOLARSYNC_DATA", "scholarsync_data"))
+    args = parser.parse_args()
+
+    interface = Interface(args.data_dir)
+    try:
+        school = interface.school
+        rooms = read_rooms(args.rooms) if args.rooms else None
+        timetable, elapsed = build_timetable(school, args.days, args.periods, args.lessons_per_week, rooms,
+                                             args.improve, args.seed)
+        teacher_names = {teacher_id: teacher.name for teacher_id, teacher in school.teachers.items()}
+        f = open(args.output, "w", newline="", encoding="utf-8") if args.output != "-" else None
+        try:
+            out = f or sys.stdout
+            if args.format == "csv":
+                writer = csv.writer(out)
+                writer.writerow(["class_no", "day", "period", "subject", "teacher_id", "room"])
+                writer.writerows(timetable.rows())
+            else:
+                for class_no in sorted(school.classes):
+                    out.write("\n".join(timetable.class_lines(class_no, teacher_names)) + "\n")
+        finally:
+            if f:
+                f.close()
+    finally:
+        interface.close()
+    unplaced = timetable.unplaced
+    counts = timetable.penalties()
+    print(f"Placed {len(timetable.lessons) - len(unplaced)} of {len(timetable.lessons)} lessons in {elapsed:.2f}s "
+          f"({counts['subject repeats']} subject repeats, {counts['teacher gaps']} teacher gaps)")
+    for lesson in unplaced:
+        print(f"Could not place {lesson.subject} for class {lesson.class_no} (teacher {lesson.teacher_id})")
+    if unplaced:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()